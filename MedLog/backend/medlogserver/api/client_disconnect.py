@@ -0,0 +1,52 @@
+from typing import Awaitable, TypeVar
+import asyncio
+import contextlib
+from fastapi import Request
+
+from medlogserver.log import get_logger
+
+log = get_logger()
+
+T = TypeVar("T")
+
+# Non standard status code (from nginx) for responses nobody will receive, because the client closed the connection.
+HTTP_499_CLIENT_CLOSED_REQUEST = 499
+
+
+class ClientDisconnectedException(Exception):
+    pass
+
+
+async def _wait_for_disconnect(request: Request):
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def run_until_client_disconnects(request: Request, awaitable: Awaitable[T]) -> T:
+    """Await `awaitable`, but cancel it as soon as the client of `request` disconnects.
+    For expensive endpoints whose clients often give up early (e.g. typeahead searches superseded by the next keystroke).
+    Only for requests without a body to read, the disconnect is detected by reading the request messages.
+
+    Raises:
+        ClientDisconnectedException: the client disconnected before the result was ready
+    """
+    task = asyncio.ensure_future(awaitable)
+    disconnect_watcher = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait(
+            [task, disconnect_watcher], return_when=asyncio.FIRST_COMPLETED
+        )
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        disconnect_watcher.cancel()
+    if task in done:
+        return task.result()
+    log.debug(f"Client disconnected. Cancel request '{request.url.path}'")
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+    raise ClientDisconnectedException()
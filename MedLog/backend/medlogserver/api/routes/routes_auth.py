@@ -1,4 +1,4 @@
-from typing import Optional, Union, List, Annotated
+from typing import Optional, Union, List, Annotated, Literal
 from pydantic import BaseModel, Field, ValidationError
 from datetime import datetime
 from fastapi import FastAPI, Request, Depends, Response, HTTPException, status
@@ -11,6 +11,7 @@ from fastapi import (
     Body,
     Form,
     Path,
+    Request,
     Response,
     status,
 )
@@ -38,8 +39,14 @@ from medlogserver.config import Config
 
 
 from medlogserver.db.drug_data.drug import DrugCRUD
+from medlogserver.db.drug_data.drug_api_read_document import DrugAPIReadDocumentCRUD
 
 from medlogserver.api.base import HTTPMessage
+from medlogserver.api.client_disconnect import (
+    run_until_client_disconnects,
+    ClientDisconnectedException,
+    HTTP_499_CLIENT_CLOSED_REQUEST,
+)
 from medlogserver.api.paginator import (
     PaginatedResponse,
     create_query_params_class,
@@ -138,13 +145,20 @@ drug_search_query_model: type[BaseModel] = create_model(
 )
 
 
-from medlogserver.db.drug_data.drug_search._base import MedLogSearchEngineResult
+from medlogserver.db.drug_data.drug_search._base import (
+    MedLogSearchEngineResult,
+    DrugSearchResponse,
+)
 from medlogserver.db.drug_data.drug_search.search_interface import (
     get_drug_search,
     DrugSearch,
     SearchEngineNotConfiguredException,
     SearchEngineNotReadyException,
 )
+from medlogserver.db.drug_data.drug_search.suggest_index import DrugSuggestion
+from medlogserver.db.drug_data.drug_search.search_result_cache import (
+    DrugSearchResultCacheStats,
+)
 
 
 DrugQueryParams: Type[QueryParamsInterface] = create_query_params_class(DrugAPIRead)
@@ -167,7 +181,7 @@ class DrugAttrFieldDefinitionContainer(BaseModel):
 
 @fast_api_drug_router.get(
     "/drug/search",
-    response_model=PaginatedResponse[MedLogSearchEngineResult],
+    response_model=DrugSearchResponse,
     description=f"Search for drug in the drug database.",
     responses={
         status.HTTP_425_TOO_EARLY: {
@@ -179,9 +193,13 @@ class DrugAttrFieldDefinitionContainer(BaseModel):
         status.HTTP_500_INTERNAL_SERVER_ERROR: {
             "description": "Other Errors. </br>If anything else goes wrong on server side."
         },
+        HTTP_499_CLIENT_CLOSED_REQUEST: {
+            "description": "The client disconnected before the search was done. The search was aborted. Nobody will receive this response, it only shows up in access logs."
+        },
     },
 )
 async def search_drugs(
+    request: Request,
     search_term: Annotated[
         str,
         Query(
@@ -195,20 +213,35 @@ async def search_drugs(
             description="'null': List all drugs, 'true': List only drug that are currently available on the market. 'false': List only drugs that are not market accessable anymore.",
         ),
     ] = None,
+    facets: Annotated[
+        Optional[List[str]],
+        Query(
+            description=f"Reference fields to return facet counts for: The count of drugs in the whole search result per value of the field. Multiple fields can be passed repeated or comma separated. Possible fields: {', '.join(f'`{f.field_name}`' for f in drug_field_definitions['attrs_ref'] + drug_field_definitions['attrs_multi_ref'])}",
+        ),
+    ] = None,
     filter_params: drug_search_query_model = Depends(),
     user: User = Security(get_current_user),
     drug_search: DrugSearch = Depends(get_drug_search),
     pagination: QueryParamsInterface = Depends(DrugQueryParams),
-) -> PaginatedResponse[MedLogSearchEngineResult]:
+) -> DrugSearchResponse:
     try:
         log.debug(
             f"filter_params: `{type(filter_params)}`, `{filter_params}`, `{filter_params.model_dump()}`"
         )
-        search_results = await drug_search.search(
-            search_term=search_term,
-            market_accessable=market_accessable,
-            pagination=pagination,
-            **filter_params.model_dump(),
+        # typeahead clients drop most searches for the next keystroke. Do not finish searches nobody waits for.
+        search_results = await run_until_client_disconnects(
+            request,
+            drug_search.search(
+                search_term=search_term,
+                market_accessable=market_accessable,
+                pagination=pagination,
+                facets=(
+                    [f for entry in facets for f in entry.split(",") if f]
+                    if facets
+                    else None
+                ),
+                **filter_params.model_dump(),
+            ),
         )
     except SearchEngineNotReadyException as e:
         raise HTTPException(
@@ -220,10 +253,78 @@ async def search_drugs(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="The search index is not configured. Please contact the admin.",
         )
+    except ClientDisconnectedException:
+        raise HTTPException(
+            status_code=HTTP_499_CLIENT_CLOSED_REQUEST,
+            detail="The client closed the connection before the search was done.",
+        )
 
     return search_results
 
 
+@fast_api_drug_router.get(
+    "/drug/suggest",
+    response_model=List[DrugSuggestion],
+    description=f"Typeahead suggestions while typing a drug name or code: Trade names and drug codes (e.g. a PZN) starting with `prefix`, most relevant first. Answered from an in-memory index, meant to be called on every key stroke. Use `/drug/search` or `/drug/id/{{drug_id}}` for the full drug.",
+    responses={
+        status.HTTP_425_TOO_EARLY: {
+            "description": "Index in build up error </br>The suggestion index is still busy being build. </br>The Error detail message will be: `The suggestion index is not ready yet. Please try it later`"
+        },
+        status.HTTP_503_SERVICE_UNAVAILABLE: {
+            "description": "No search engine configured or the suggestion index is disabled. </br>The Error detail message will be: `The suggestion index is not configured. Please contact the admin.`"
+        },
+    },
+)
+async def suggest_drugs(
+    prefix: Annotated[
+        str,
+        Query(
+            description="Start of a trade name, of a word in a trade name or of a drug code. Case insensitive.",
+            min_length=1,
+        ),
+    ],
+    limit: Annotated[
+        int,
+        Query(description="Maximum count of suggestions.", ge=1, le=50),
+    ] = 10,
+    market_accessable: Annotated[
+        Optional[bool],
+        Query(
+            description="'null': Suggest all drugs, 'true': Suggest only drugs that are currently available on the market. 'false': Suggest only drugs that are not market accessable anymore.",
+        ),
+    ] = None,
+    user: User = Security(get_current_user),
+    drug_search: DrugSearch = Depends(get_drug_search),
+) -> List[DrugSuggestion]:
+    try:
+        return await drug_search.suggest(
+            prefix=prefix, limit=limit, market_accessable=market_accessable
+        )
+    except SearchEngineNotReadyException:
+        raise HTTPException(
+            status_code=status.HTTP_425_TOO_EARLY,
+            detail="The suggestion index is not ready yet. Please try it later",
+        )
+    except SearchEngineNotConfiguredException:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The suggestion index is not configured. Please contact the admin.",
+        )
+
+
+@fast_api_drug_router.get(
+    "/drug/search/cache",
+    response_model=DrugSearchResultCacheStats,
+    description=f"Hit/miss statistics of the drug search result cache of the answering MedLog process. {NEEDS_ADMIN_API_INFO}",
+)
+async def get_drug_search_cache_stats(
+    user: User = Security(get_current_user),
+    is_admin: bool = Security(user_is_admin),
+    drug_search: DrugSearch = Depends(get_drug_search),
+) -> DrugSearchResultCacheStats:
+    return drug_search.result_cache_stats()
+
+
 @fast_api_drug_router.get(
     "/drug/id/{drug_id}",
     response_model=DrugAPIRead | CustomDrugAPIRead,
@@ -232,16 +333,59 @@ async def search_drugs(
 async def get_drug(
     drug_id: uuid.UUID,
     user: User = Security(get_current_user),
-    drug_crud: DrugCRUD = Depends(DrugCRUD.get_crud),
+    drug_doc_crud: DrugAPIReadDocumentCRUD = Depends(DrugAPIReadDocumentCRUD.get_crud),
 ) -> DrugAPIRead:
-    drug_result: DrugData = await drug_crud.get(
+    return await drug_doc_crud.get(
         id_=drug_id,
         raise_exception_if_none=HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No drug with ID '{drug_id}' can be found",
         ),
     )
-    return await drug_to_drugAPI_obj(drug_result)
+
+
+@fast_api_drug_router.get(
+    "/drug/by_code/{code_system_id}/{code}",
+    response_model=DrugAPIRead | CustomDrugAPIRead,
+    description=f"Get a drug of the current drug dataset (or a custom drug) by an exact drug code. E.g. a PZN from a barcode scanner. If multiple drugs share the code, drugs from the drug dataset are preferred over custom drugs.",
+)
+async def get_drug_by_code(
+    code_system_id: Annotated[
+        str, Path(description="Id of the code system (see `/drug/code_def`)")
+    ],
+    code: str,
+    user: User = Security(get_current_user),
+    drug_dataset_crud: DrugDataSetVersionCRUD = Depends(
+        DrugDataSetVersionCRUD.get_crud
+    ),
+    drug_crud: DrugCRUD = Depends(DrugCRUD.get_crud),
+    drug_doc_crud: DrugAPIReadDocumentCRUD = Depends(DrugAPIReadDocumentCRUD.get_crud),
+) -> DrugAPIRead:
+    dataset_version_ids = [
+        dataset_version.id
+        for dataset_version in (
+            await drug_dataset_crud.get_current_active(),
+            await drug_dataset_crud.get_custom(),
+        )
+        if dataset_version is not None
+    ]
+    drug_ids = await drug_crud.get_ids_by_code(
+        code=code.strip(),
+        code_system_id=code_system_id,
+        dataset_version_ids=dataset_version_ids,
+    )
+    if not drug_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No drug with code '{code_system_id}':'{code}' can be found",
+        )
+    return await drug_doc_crud.get(
+        id_=drug_ids[0],
+        raise_exception_if_none=HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No drug with code '{code_system_id}':'{code}' can be found",
+        ),
+    )
 
 
 #############
@@ -478,6 +622,5 @@ async def create_custom_drug(
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
         )
-    await drug_search._preflight()
-    await drug_search.search_engine.insert_drug_to_index(new_custom_drug)
+    await drug_search.insert_drug_to_index(new_custom_drug)
     return await drug_to_drugAPI_obj(new_custom_drug)
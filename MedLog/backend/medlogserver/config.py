@@ -617,6 +617,63 @@ class Config(BaseSettings):
         ),
         examples=[50000, 100000, 200000],
     )
+    DRUG_IMPORTER_MEMORY_BUDGET_MB: int = Field(
+        default=1024,
+        description=(
+            "Memory budget in MB for the drug records of a 'MMIPharmindex1_32' drug import. The source files are streamed in batches, "
+            "and the batch size (see DRUG_IMPORTER_BATCH_SIZE) is reduced so one batch fits into this budget. "
+            "The per product lookup tables of the import come on top; they are small compared to the drug records."
+        ),
+        examples=[256, 1024, 4096],
+    )
+    DRUG_IMPORTER_VECTORIZED_TRANSFORM: bool = Field(
+        default=True,
+        description=(
+            "Transform the source data of the 'MMIPharmindex1_32' drug importer with vectorized polars expressions, one batch of "
+            "drug records at a time. Set to False to fall back to the previous row by row transformation."
+        ),
+        examples=[True, False],
+    )
+    DRUG_IMPORTER_PARALLEL_COPY_STREAMS: int = Field(
+        default=4,
+        description=(
+            "How many COPY streams a drug import writes the drug attribute, reference value and code rows with at the same time, "
+            "each on its own database connection. PostgreSQL only, SQLite allows only one writer at a time. "
+            "The import logs the throughput per table to tune this and DRUG_IMPORTER_BATCH_SIZE."
+        ),
+        examples=[1, 4, 8],
+    )
+    DRUG_IMPORTER_COPY_CHUNK_ROWS: Optional[int] = Field(
+        default=None,
+        description=(
+            "Split the rows a drug import writes to one table into COPY streams of at most this many rows, "
+            "so that large tables are written by several parallel streams (see DRUG_IMPORTER_PARALLEL_COPY_STREAMS). "
+            "Set to None (default) for one stream per table (per attribute field with DRUG_IMPORTER_VECTORIZED_TRANSFORM)."
+        ),
+        examples=[50000, 200000],
+    )
+
+    DRUG_IMPORTER_PG_COPY_FORMAT: Literal["binary", "text"] = Field(
+        default="text",
+        description=(
+            "COPY format a drug import uses to write the rows to PostgreSQL. "
+            "'text' writes tab separated text, which is also used for the rows of the row by row transformation. "
+            "'binary' streams typed values directly from the columns of the import frames (see DRUG_IMPORTER_VECTORIZED_TRANSFORM)."
+        ),
+        examples=["text", "binary"],
+    )
+
+    DRUG_IMPORTER_DEFER_INDEXES: bool = Field(
+        default=False,
+        description=(
+            "Load a new drug dataset version into the drug tables without their secondary indexes and foreign keys, "
+            "then build them again in one pass and ANALYZE the tables before the dataset is activated. "
+            "Speeds up large imports, but queries on the active dataset are slower while the import runs. "
+            "On SQLite, where foreign keys are not enforced, only the indexes are deferred. "
+            "If the import is interrupted before it builds them, they are restored on the next worker start or import."
+        ),
+        examples=[False, True],
+    )
 
     DRUG_IMPORTER_SOURCE_FTP_HOST: Optional[str] = Field(
         default=None,
@@ -669,13 +726,142 @@ class Config(BaseSettings):
         examples=["/tmp/medlog_drugdata", "/var/lib/medlog/drugdata"],
     )
 
-    DRUG_SEARCHENGINE_CLASS: Literal["GenericSQLDrugSearch"] = Field(
+    DRUG_SEARCHENGINE_CLASS: Literal[
+        "GenericSQLDrugSearch",
+        "MemoryIndexDrugSearch",
+        "SQLiteFTS5DrugSearch",
+        "PostgresTrgmDrugSearch",
+    ] = (
+        Field(
+            description=(
+                "Selects the search engine backend used to answer drug search requests. "
+                "'GenericSQLDrugSearch' scores every drug with SQL string matching and needs no additional resources. "
+                "'MemoryIndexDrugSearch' keeps an inverted index of the drug data in the memory of each MedLog process. "
+                "It answers searches on large drug datasets much faster, but needs additional RAM per process "
+                "and builds its index on the first search after a restart or a drug data update. "
+                "'SQLiteFTS5DrugSearch' (SQLite only) adds a FTS5 full text index with a trigram tokenizer "
+                "on top of the 'GenericSQLDrugSearch' data and ranks results with bm25. "
+                "'PostgresTrgmDrugSearch' (PostgreSQL only, needs the 'pg_trgm' and 'unaccent' extensions) "
+                "pre-filters matches with a GIN trigram index on a normalized, accent insensitive search document."
+            ),
+            default="GenericSQLDrugSearch",
+        )
+    )
+    DRUG_SEARCH_RESULT_CACHE_SIZE: int = Field(
+        default=1024,
+        description=(
+            "Maximum number of drug search results each MedLog process keeps in memory. "
+            "Repeated searches (same search term, filters and page) are answered from this cache. "
+            "Set to 0 to disable the cache."
+        ),
+        examples=[1024, 0],
+    )
+    DRUG_SEARCH_RESULT_CACHE_TTL_SEC: int = Field(
+        default=300,
+        description=(
+            "Seconds a cached drug search result stays valid. "
+            "The cache is cleared when the search index of the same process changes. "
+            "The TTL limits how long results can be stale after an index rebuild in another process (e.g. the background worker)."
+        ),
+        examples=[300, 60],
+    )
+    DRUG_SEARCH_ENGINE_STATE_TTL_SEC: int = Field(
+        default=10,
+        description=(
+            "Seconds each MedLog process reuses its knowledge of the active drug dataset version and the search index state, "
+            "instead of looking them up in the database on every search request. "
+            "Changes made by the same process are picked up immediately. "
+            "The TTL limits how long an index rebuild or dataset update in another process (e.g. the background worker) stays unnoticed."
+        ),
+        examples=[10, 0],
+    )
+    DRUG_SEARCH_FUZZY_MAX_EDIT_DISTANCE: int = Field(
+        default=2,
+        description=(
+            "Maximum number of typos (inserted, deleted, replaced or swapped chars) per word the typo-tolerant drug search corrects. "
+            "Words shorter than 6 chars are corrected by at most 1 typo. "
+            "The typo tolerance needs an in-memory index of all words of drug trade names and reference values per MedLog process. "
+            "Set to 0 to disable it."
+        ),
+        examples=[2, 1, 0],
+    )
+    DRUG_SEARCH_FUZZY_FALLBACK_BELOW_RESULT_COUNT: int = Field(
+        default=3,
+        description=(
+            "If a drug search finds fewer drugs than this, the search is repeated with typos in the search term corrected. "
+            "The corrected search is used if it finds more drugs."
+        ),
+        examples=[3, 1],
+    )
+    DRUG_SEARCH_FACET_INDEX_ENABLED: bool = Field(
+        default=True,
+        description=(
+            "Keep an in-memory bitmap index of the reference values (e.g. dispensing type) of all drugs per MedLog process. "
+            "It speeds up drug searches with reference value filters and is needed for facet counts in drug search results. "
+            "Without it, filters are applied in the database and no facet counts are returned."
+        ),
+    )
+    DRUG_SEARCH_FACET_FILTER_MAX_DRUG_IDS: int = Field(
+        default=10000,
+        description=(
+            "If the reference value filters of a drug search match at most this many drugs, the search engine only scores these drugs (by their ids). "
+            "Broader filters are applied by the search engine itself."
+        ),
+        examples=[10000, 1000],
+    )
+    DRUG_SEARCH_SUGGEST_INDEX_ENABLED: bool = Field(
+        default=True,
+        description=(
+            "Keep an in-memory sorted prefix index of the trade names and codes of all drugs per MedLog process. "
+            "It answers the typeahead endpoint `/drug/suggest` without querying the database. "
+            "If disabled, `/drug/suggest` responds with HTTP 503."
+        ),
+    )
+    DRUG_SEARCH_PREFIX_REFINEMENT_MAX_DRUG_IDS: int = Field(
+        default=2000,
+        description=(
+            "Each MedLog process remembers the ids of all drugs a search found for a short time, if they are not more than this. "
+            "A following search that only narrows the search term down (e.g. typing 'metf' after 'met') scores only these drugs "
+            "instead of searching all drugs again. "
+            "Set to 0 to disable it."
+        ),
+        examples=[2000, 0],
+    )
+    DRUG_SEARCH_PREFIX_REFINEMENT_TTL_SEC: int = Field(
+        default=60,
+        description=(
+            "Seconds the drug ids of a search stay available for narrowed down follow-up searches (see `DRUG_SEARCH_PREFIX_REFINEMENT_MAX_DRUG_IDS`)."
+        ),
+        examples=[60, 10],
+    )
+    DRUG_SEARCH_INDEX_SNAPSHOT_DIR: Optional[str] = Field(
+        default="./search_index_snapshots",
+        description=(
+            "Directory where the 'MemoryIndexDrugSearch' engine stores a snapshot file of its index per drug dataset version. "
+            "Other MedLog processes map the file read only instead of building the index again, and share its memory pages. "
+            "Only one process at a time builds the index and writes its snapshot (lock file in the directory), the others wait and map it. "
+            "The directory is created automatically if it does not exist. "
+            "Set to an empty value to disable snapshots, every process builds its own index then."
+        ),
+        examples=["./search_index_snapshots", "/var/lib/medlog/search_index_snapshots"],
+    )
+    DRUG_SEARCH_INDEX_BUILD_PARTITIONS: int = Field(
+        default=1,
+        description=(
+            "Number of drug id ranges the search index of the SQL based search engines is aggregated in. "
+            "Each range is aggregated and written in its own transaction on its own database connection, "
+            "and the build progress is reported per range. "
+            "1 aggregates all drugs with one statement in one transaction."
+        ),
+        examples=[1, 16],
+    )
+    DRUG_SEARCH_INDEX_BUILD_PARALLEL_CONNECTIONS: int = Field(
+        default=4,
         description=(
-            "Selects the search engine backend used to answer drug search requests. "
-            "Currently only 'GenericSQLDrugSearch' is available, which uses SQL-based full-text search. "
-            "This field exists as an extension point for future alternative search backends."
+            "How many drug id ranges (see `DRUG_SEARCH_INDEX_BUILD_PARTITIONS`) are aggregated at the same time. "
+            "PostgreSQL only, with SQLite the ranges are aggregated one after the other (SQLite allows only one writer at a time)."
         ),
-        default="GenericSQLDrugSearch",
+        examples=[4, 8],
     )
     DRUG_TABLE_PROVISIONING_SOURCE_DIR: Optional[str] = Field(
         description=(
@@ -142,7 +142,7 @@ async def reset_stuck_drugsearchindex_build_ups():
     ]
     search_engine = search_engine_class()
 
-    if search_engine_class == GenericSQLDrugSearchEngine:
+    if issubclass(search_engine_class, GenericSQLDrugSearchEngine):
         search_engine: GenericSQLDrugSearchEngine = search_engine
         state = await search_engine._get_state()
         if state.index_build_up_in_process:
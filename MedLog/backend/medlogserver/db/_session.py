@@ -1,16 +1,21 @@
 import os
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
+import asyncio
 import contextlib
 
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import text
+from sqlalchemy import text, event
 
 from medlogserver.config import Config
+from medlogserver.utils import normalize_search_text
 
 config = Config()
 
+# SQL name of `normalize_search_text()` on SQLite connections
+SQLITE_NORMALIZE_SEARCH_TEXT_FUNCTION = "medlog_normalize_search_text"
+
 # Global state
 _db_engine: AsyncEngine | None = None
 _async_session_factory: sessionmaker | None = None
@@ -28,10 +33,41 @@ def _get_engine() -> AsyncEngine:
             echo=config.DEBUG_SQL,
             future=True,
         )
+        if _db_engine.dialect.driver == "aiosqlite":
+            event.listen(
+                _db_engine.sync_engine.pool,
+                "invalidate",
+                _interrupt_sqlite_statement_on_cancel,
+            )
+            event.listen(
+                _db_engine.sync_engine, "connect", _register_sqlite_functions
+            )
         _engine_pid = current_pid
     return _db_engine
 
 
+def _interrupt_sqlite_statement_on_cancel(
+    dbapi_connection, connection_record, exception: Optional[BaseException]
+):
+    """Abort the running statement, if the task awaiting it was cancelled (e.g. the client of a drug search disconnected).
+    SQLAlchemy invalidates the connection and waits for it to close. aiosqlite runs the statement in a thread that would
+    otherwise keep going until the statement is done.
+    psycopg needs no help, it cancels the statement on the Postgres server by itself when its task is cancelled.
+    """
+    if isinstance(exception, asyncio.CancelledError):
+        dbapi_connection.await_(dbapi_connection.driver_connection.interrupt())
+
+
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    """SQLite's LOWER() only handles ASCII chars. Provide the python search text normalization (e.g. for the drug search index build)."""
+    dbapi_connection.create_function(
+        SQLITE_NORMALIZE_SEARCH_TEXT_FUNCTION,
+        1,
+        normalize_search_text,
+        deterministic=True,
+    )
+
+
 def _get_session_factory() -> sessionmaker:
     global _async_session_factory
 
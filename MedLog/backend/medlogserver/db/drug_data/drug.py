@@ -30,6 +30,7 @@ from sqlmodel import (
     and_,
 )
 from sqlmodel.sql import expression as sqlEpression
+import datetime
 import uuid
 from uuid import UUID
 from sqlalchemy.orm import selectinload
@@ -202,6 +203,56 @@ class DrugCRUD(
         # Just return the items as returned by the query
         return results.all()
 
+    async def get_ids_by_code(
+        self,
+        code: str,
+        dataset_version_ids: List[UUID],
+        code_system_id: Optional[str] = None,
+        market_accessable: Optional[bool] = None,
+    ) -> List[UUID]:
+        """Exact lookup of drugs by a drug code (e.g. a scanned PZN). Uses the `(code_system_id, code)` index of `drug_code`.
+
+        Args:
+            code (str): The exact code
+            dataset_version_ids (List[UUID]): Only drugs of these dataset versions (e.g. the current active and the custom drugs dataset)
+            code_system_id (Optional[str], optional): The code system of the code. If None, only code systems with unique codes are looked up. Defaults to None.
+            market_accessable (Optional[bool], optional): Same as the drug search filter. Defaults to None.
+
+        Returns:
+            List[UUID]: Ids of the matching drugs. Drugs from the drug dataset first, custom drugs last.
+        """
+        if code_system_id is None:
+            code_system_ids = select(DrugCodeSystem.id).where(
+                DrugCodeSystem.unique == True
+            )
+        else:
+            code_system_ids = [code_system_id]
+        query = (
+            select(DrugCode.drug_id)
+            .join(DrugData, DrugData.id == DrugCode.drug_id)
+            .where(col(DrugCode.code_system_id).in_(code_system_ids))
+            .where(DrugCode.code == code)
+            .where(col(DrugData.source_dataset_id).in_(dataset_version_ids))
+        )
+        if market_accessable == True:
+            query = query.where(
+                or_(
+                    col(DrugData.market_exit_date).is_(None),
+                    DrugData.market_exit_date > datetime.date.today(),
+                )
+            )
+        if market_accessable == False:
+            query = query.where(
+                and_(
+                    col(DrugData.market_exit_date).is_not(None),
+                    DrugData.market_exit_date < datetime.date.today(),
+                )
+            )
+        query = query.order_by(DrugData.is_custom_drug, DrugData.trade_name)
+        results = await self.session.exec(statement=query)
+        # a drug can have the same code in multiple code systems
+        return list(dict.fromkeys(results.all()))
+
     async def create_custom(
         self, drug_create: DrugCustomCreate, custom_drug_dataset: DrugDataSetVersion, user_id: Optional[UUID] = None
     ) -> DrugData:
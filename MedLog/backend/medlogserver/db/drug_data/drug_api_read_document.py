@@ -0,0 +1,142 @@
+from typing import Dict, List, Sequence
+import hashlib
+import json
+import uuid
+from pydantic import ValidationError
+from sqlmodel import select, delete, col, and_, exists
+
+from medlogserver.config import Config
+from medlogserver.log import get_logger
+from medlogserver.db._base_crud import DatabaseInteractionBase
+from medlogserver.db.drug_data.drug import DrugCRUD
+from medlogserver.model.drug_data.drug import DrugData
+from medlogserver.model.drug_data.drug_api_read_document import DrugAPIReadDocument
+from medlogserver.model.drug_data.api_drug_model_factory import (
+    DrugAPIRead,
+    CustomDrugAPIRead,
+    drug_to_drugAPI_obj,
+)
+
+log = get_logger()
+config = Config()
+
+# The drug API models are generated from the field definitions of the drug importer.
+# If they change, all stored documents are outdated.
+DRUG_API_READ_SCHEMA_HASH = hashlib.sha1(
+    json.dumps(
+        [DrugAPIRead.model_json_schema(), CustomDrugAPIRead.model_json_schema()],
+        sort_keys=True,
+    ).encode()
+).hexdigest()[:16]
+
+
+class DrugAPIReadDocumentCRUD(DatabaseInteractionBase):
+    """Read and maintain the precomputed `DrugAPIRead`/`CustomDrugAPIRead` documents of drugs.
+
+    Drugs without an up to date document are converted from the drug tables on the fly (`drug_to_drugAPI_obj`).
+    """
+
+    async def get_multiple(
+        self, ids: Sequence[uuid.UUID]
+    ) -> Dict[uuid.UUID, DrugAPIRead | CustomDrugAPIRead]:
+        """Returns the API objects of all existing drugs in `ids` keyed by drug id."""
+        if not ids:
+            return {}
+        query = select(
+            DrugAPIReadDocument.drug_id,
+            DrugAPIReadDocument.is_custom_drug,
+            DrugAPIReadDocument.document,
+        ).where(
+            and_(
+                col(DrugAPIReadDocument.drug_id).in_(ids),
+                DrugAPIReadDocument.schema_hash == DRUG_API_READ_SCHEMA_HASH,
+            )
+        )
+        results = await self.session.exec(query)
+        drug_api_objs: Dict[uuid.UUID, DrugAPIRead | CustomDrugAPIRead] = {}
+        for drug_id, is_custom_drug, document in results.all():
+            api_read_class = CustomDrugAPIRead if is_custom_drug else DrugAPIRead
+            try:
+                drug_api_objs[drug_id] = api_read_class.model_validate_json(document)
+            except ValidationError as err:
+                # the document is just a cache. Fall back to the drug tables.
+                log.warning(f"Invalid drug API document of drug '{drug_id}': {err}")
+        missing_ids = [drug_id for drug_id in ids if drug_id not in drug_api_objs]
+        if missing_ids:
+            async with DrugCRUD.crud_context(session=self.session) as drug_crud:
+                drug_crud: DrugCRUD = drug_crud  # typing hint help
+                for drug in await drug_crud.get_multiple(
+                    ids=missing_ids, keep_result_in_ids_order=False
+                ):
+                    drug_api_objs[drug.id] = await drug_to_drugAPI_obj(drug)
+        return drug_api_objs
+
+    async def get(
+        self, id_: uuid.UUID, raise_exception_if_none: Exception | None = None
+    ) -> DrugAPIRead | CustomDrugAPIRead | None:
+        drug_api_obj = (await self.get_multiple([id_])).get(id_)
+        if drug_api_obj is None and raise_exception_if_none:
+            raise raise_exception_if_none
+        return drug_api_obj
+
+    async def upsert(self, drugs: List[DrugData], skip_commit: bool = False):
+        """(Re)build the documents of `drugs`. The drugs need to be loaded with all their attributes."""
+        if not drugs:
+            return
+        documents = [
+            DrugAPIReadDocument(
+                drug_id=drug.id,
+                is_custom_drug=drug.is_custom_drug,
+                schema_hash=DRUG_API_READ_SCHEMA_HASH,
+                # only what was set. Some defaults of the custom drug model would not pass validation when loading the document.
+                document=(await drug_to_drugAPI_obj(drug)).model_dump_json(
+                    exclude_unset=True
+                ),
+            )
+            for drug in drugs
+        ]
+        await self.session.exec(
+            delete(DrugAPIReadDocument).where(
+                col(DrugAPIReadDocument.drug_id).in_([drug.id for drug in drugs])
+            )
+        )
+        self.session.add_all(documents)
+        if not skip_commit:
+            await self.session.commit()
+
+    async def build_missing(
+        self, dataset_version_ids: List[uuid.UUID], batch_size: int = 1000
+    ) -> int:
+        """Build documents for all drugs of the given dataset versions that have none or an outdated one.
+
+        Returns:
+            int: Count of built documents
+        """
+        built_count = 0
+        while True:
+            query = (
+                select(DrugData.id)
+                .where(col(DrugData.source_dataset_id).in_(dataset_version_ids))
+                .where(
+                    ~exists().where(
+                        and_(
+                            DrugAPIReadDocument.drug_id == DrugData.id,
+                            DrugAPIReadDocument.schema_hash
+                            == DRUG_API_READ_SCHEMA_HASH,
+                        )
+                    )
+                )
+                .limit(batch_size)
+            )
+            drug_ids = (await self.session.exec(query)).all()
+            if not drug_ids:
+                break
+            async with DrugCRUD.crud_context(session=self.session) as drug_crud:
+                drug_crud: DrugCRUD = drug_crud  # typing hint help
+                drugs = await drug_crud.get_multiple(
+                    ids=drug_ids, keep_result_in_ids_order=False
+                )
+            await self.upsert(drugs)
+            built_count += len(drugs)
+            log.debug(f"Built {built_count} drug API documents...")
+        return built_count
@@ -4,7 +4,19 @@ from medlogserver.db.drug_data.drug_search.search_module_generic_sql import (
     GenericSQLDrugSearchCache,
     GenericSQLDrugSearchEngine,
 )
+from medlogserver.db.drug_data.drug_search.search_module_memory_index import (
+    MemoryIndexDrugSearchEngine,
+)
+from medlogserver.db.drug_data.drug_search.search_module_sqlite_fts5 import (
+    SQLiteFTS5DrugSearchEngine,
+)
+from medlogserver.db.drug_data.drug_search.search_module_postgres_trgm import (
+    PostgresTrgmDrugSearchEngine,
+)
 
 SEARCH_ENGINES: Dict[str, Type[MedLogDrugSearchEngineBase]] = {
-    "GenericSQLDrugSearch": GenericSQLDrugSearchEngine
+    "GenericSQLDrugSearch": GenericSQLDrugSearchEngine,
+    "MemoryIndexDrugSearch": MemoryIndexDrugSearchEngine,
+    "SQLiteFTS5DrugSearch": SQLiteFTS5DrugSearchEngine,
+    "PostgresTrgmDrugSearch": PostgresTrgmDrugSearchEngine,
 }
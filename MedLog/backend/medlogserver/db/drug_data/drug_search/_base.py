@@ -1,10 +1,16 @@
-from typing import Any, List, Dict, Optional
+from typing import Any, Hashable, List, Dict, Optional, Sequence, Tuple
 from typing_extensions import Unpack
 import uuid
+import shlex
 from pydantic import BaseModel, Field
-from medlogserver.db._session import AsyncSession, get_async_session
+from medlogserver.db._session import (
+    AsyncSession,
+    get_async_session,
+    get_async_session_context,
+)
 from medlogserver.api.paginator import QueryParamsInterface, PaginatedResponse
 from medlogserver.model.drug_data.drug import DrugData
+from medlogserver.db.drug_data.drug_api_read_document import DrugAPIReadDocumentCRUD
 from medlogserver.model.drug_data.api_drug_model_factory import (
     DrugAPIRead,
     CustomDrugAPIRead,
@@ -17,11 +23,88 @@ class MedLogSearchEngineResult(BaseModel):
     drug: DrugAPIRead | CustomDrugAPIRead
 
 
+def tokenize_search_term(search_term: str) -> Tuple[str, List[str]]:
+    """Normalize all kind of quotes in the search term to `"` and split it into search tokens.
+    Quoted parts stay together as one token. Tokens with less than 3 chars are dropped.
+
+    Returns:
+        Tuple[str, List[str]]: The quote normalized search term and the search tokens
+    """
+    if search_term is None:
+        search_term = ""
+    search_term = (
+        search_term.replace("'", '"')
+        .replace("`", '"')
+        .replace("´", '"')
+        .replace("„", '"')
+        .replace("“", '"')
+        .replace("‘", '"')
+    )
+    try:
+        search_term_tokens = shlex.split(search_term)
+    except ValueError:
+        # Unbalanced quotes, fixing
+        # ValueError("No closing quotation")
+        # auto-close the last quote type being used
+        if search_term.count('"') % 2 != 0:
+            search_term += '"'
+        search_term_tokens = shlex.split(search_term)
+    search_term_tokens = [token for token in search_term_tokens if len(token) > 2]
+    return search_term, search_term_tokens
+
+
+def search_term_refines(previous_search_term: str, search_term: str) -> bool:
+    """True if every drug `search_term` finds is also found by `previous_search_term`, e.g. "metf" -> "metfo" while typing.
+
+    All search engines match a drug if it contains the whole search term or any of its tokens (case-insensitive).
+    That is narrowed down if each token grows in place and the whole term still contains the previous one.
+    A new token widens the search. So does a search term without tokens, it matches the drug content only, not the drug codes.
+    """
+    previous_search_term, previous_tokens = tokenize_search_term(previous_search_term)
+    search_term, search_term_tokens = tokenize_search_term(search_term)
+    if not previous_tokens or len(previous_tokens) != len(search_term_tokens):
+        return False
+    if previous_search_term.replace('"', "") not in search_term.replace('"', ""):
+        return False
+    return all(
+        previous_token in token
+        for previous_token, token in zip(previous_tokens, search_term_tokens)
+    )
+
+
+def drug_code_from_search_term(search_term: str) -> Optional[str]:
+    """If the search term is a single drug code like a PZN (e.g. from a barcode scanner), return the code.
+
+    Codes consist of letters and digits, with at least one digit. A leading `-` is dropped (PZN barcodes are prefixed with it).
+    """
+    if search_term is None:
+        return None
+    code = search_term.strip().strip("\"'`´„“‘").strip()
+    if code.startswith("-"):
+        code = code[1:]
+    if len(code) < 3 or not code.isalnum() or not code.isascii():
+        return None
+    if not any(char.isdigit() for char in code):
+        return None
+    return code
+
+
+class DrugSearchResponse(PaginatedResponse[MedLogSearchEngineResult]):
+    facets: Optional[Dict[str, Dict[str, int]]] = Field(
+        default=None,
+        description="If facets were requested: Count of drugs in the whole search result per value of each requested reference field (`field name -> value -> count`).",
+        examples=[{"dispensingtype": {"0": 120, "2": 14}}],
+    )
+
+
 class MedLogDrugSearchEngineBase:
     description: str = (
         "A short descriptionn how this search engine works and what it needs to run"
     )
     user_hint: str = "A hint for the user like 'You can quote string to find drugs with this exact quote: `'vitamin C' aspirin'`"
+    # Engines that score every drug on each search get faster if a narrowed down search term only scores the drugs
+    # found by the previous search term (see `DrugSearchCandidateCache`). Engines with an index that pre-filters candidates do not.
+    prefix_refinement: bool = False
 
     def __init__(self, engine_config: Dict = None):
         self.engine_config = engine_config
@@ -60,15 +143,99 @@ class MedLogDrugSearchEngineBase:
         """This should be a low cost function. It should return False if the index is not existent or in the process of build up."""
         raise NotImplementedError()
 
+    async def index_generation(self) -> Optional[Hashable]:
+        """A low cost value that changes whenever a new index generation goes live (e.g. the dataset version and build time of the index).
+        Cached search results are only reused for the same generation. `None` if the engine can not tell."""
+        return None
+
     async def search(
         self,
         search_term: str = None,
         market_accessable: Optional[bool] = None,
         pagination: Optional[QueryParamsInterface] = None,
         filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
     ) -> PaginatedResponse[MedLogSearchEngineResult]:
+        """Search drugs. `filter_ref_vals` are reference field name/value pairs a drug must have.
+        If `drug_ids` is given, only these drugs are candidates (e.g. the drugs matching the filters, looked up in the facet index).
+        """
+        raise NotImplementedError()
+
+    async def search_with_drug_ids(
+        self,
+        search_term: str = None,
+        market_accessable: Optional[bool] = None,
+        pagination: Optional[QueryParamsInterface] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+        max_result_drug_ids: int = 0,
+    ) -> Tuple[PaginatedResponse[MedLogSearchEngineResult], Optional[List[uuid.UUID]]]:
+        """Like `search()`, but also returns the ids of all drugs found, if they are not more than `max_result_drug_ids`.
+        Otherwise the ids are `None`. Engines should override this if they can collect the ids cheaply while searching.
+        """
+        search_results = await self.search(
+            search_term=search_term,
+            market_accessable=market_accessable,
+            pagination=pagination,
+            filter_ref_vals=filter_ref_vals,
+            drug_ids=drug_ids,
+        )
+        result_drug_ids = None
+        if (
+            search_results.total_count == len(search_results.items)
+            and search_results.total_count <= max_result_drug_ids
+        ):
+            # the page holds the whole result
+            result_drug_ids = [item.drug_id for item in search_results.items]
+        return search_results, result_drug_ids
+
+    async def search_drug_ids(
+        self,
+        search_term: str = None,
+        market_accessable: Optional[bool] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+    ) -> List[uuid.UUID]:
+        """The ids of all drugs `search()` finds with these parameters. Unordered and without pagination or drug objects."""
         raise NotImplementedError()
 
     async def total_item_count(self) -> int:
         # count of all items that are in the index.
         raise NotImplementedError()
+
+    async def _hydrate_search_results(
+        self,
+        drug_ids_with_score: List[Tuple[uuid.UUID, float]],
+        total_count: int,
+        offset: int = 0,
+    ) -> PaginatedResponse[MedLogSearchEngineResult]:
+        """Load the full drug objects for a page of scored drug ids and wrap them into a search result response.
+
+        Args:
+            drug_ids_with_score (List[Tuple[uuid.UUID, float]]): drug ids with their relevance score, in result order
+            total_count (int): count of all matches of the search (not only the page)
+            offset (int, optional): Offset of the page. Defaults to 0.
+        """
+        async with get_async_session_context() as session:
+            async with DrugAPIReadDocumentCRUD.crud_context(
+                session=session
+            ) as drug_doc_crud:
+                drug_doc_crud: DrugAPIReadDocumentCRUD = drug_doc_crud  # typing hint help
+                drug_api_objs = await drug_doc_crud.get_multiple(
+                    ids=[item[0] for item in drug_ids_with_score]
+                )
+        search_result_objs = [
+            MedLogSearchEngineResult(
+                drug_id=drug_id,
+                drug=drug_api_objs[drug_id],
+                relevance_score=score,
+            )
+            for drug_id, score in drug_ids_with_score
+            if drug_id in drug_api_objs
+        ]
+        return PaginatedResponse(
+            total_count=total_count,
+            count=len(drug_ids_with_score),
+            offset=offset,
+            items=search_result_objs,
+        )
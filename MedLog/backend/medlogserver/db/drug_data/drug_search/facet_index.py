@@ -0,0 +1,374 @@
+from typing import List, Dict, Optional, Set, Tuple, Iterable, Sequence, Union
+from array import array
+from collections import Counter
+from itertools import chain
+from operator import attrgetter, itemgetter
+import asyncio
+import time
+import uuid
+from sqlmodel import select, col
+
+from medlogserver.db._session import get_async_session_context
+from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
+from medlogserver.model.drug_data.drug import DrugData
+from medlogserver.model.drug_data.drug_attr import DrugValRef, DrugValMultiRef
+from medlogserver.config import Config
+from medlogserver.log import get_logger
+
+log = get_logger(modulename="DRUG_SEARCH_INDEX")
+config = Config()
+
+# Facets of results with more than 1/n of all drugs are counted with the bitsets
+FACET_COUNT_BITMAP_MIN_RESULT_SHARE = 4
+# Values of more than 1/n of all drugs are stored as bitset, the others as array of document numbers.
+# Below 1/32 the 4 byte document numbers take less memory than a bit for every drug.
+FACET_POSTINGS_BITMAP_MIN_DRUG_SHARE = 32
+
+# The drugs having a reference value: A bitset (python int) or a sorted array('I') of document numbers.
+Postings = Union[int, array]
+
+
+def drug_ref_field_name_from_filter(filter_name: str) -> str:
+    """The search API names reference field filters `filter_<field_name>`. Returns the plain field name."""
+    return filter_name.removeprefix("filter_")
+
+
+class DrugFacetIndex:
+    """Index of the reference values (LOV values) of all drugs: `field name -> value -> postings of the drugs`.
+
+    Every drug gets a document number. The postings of common values are a bitset, a python int with the bit of the
+    document number set for every drug having the value. Filtering by those is an AND of bitsets, counting them in a
+    search result (facets) an AND with the bitset of the result plus a popcount. Both run in C on whole machine words.
+    Rare values (e.g. most manufacturers or ICD-10 codes) are stored as sorted array of document numbers, a bitset per
+    value would take the memory of a bit for every drug for each of them.
+    """
+
+    def __init__(self, generation: Tuple):
+        self.generation = generation
+        # The document number is the list index.
+        self.drug_ids: List[uuid.UUID] = []
+        # keyed by `UUID.int`. Hashing an UUID runs in python, hashing an int in C. Matters when mapping large results.
+        self.doc_no_by_drug_int: Dict[int, int] = {}
+        self.postings: Dict[str, Dict[str, Postings]] = {}
+        # field name -> values of each drug by document number. Counts the facets of small results without touching every bitset.
+        self.doc_values: Dict[str, List[Optional[Tuple[str, ...]]]] = {}
+        # all drugs with the same values share one tuple
+        self._value_tuples: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self.drug_ids)
+
+    def doc_no(self, drug_id: uuid.UUID) -> int:
+        doc_no = self.doc_no_by_drug_int.get(drug_id.int)
+        if doc_no is None:
+            doc_no = len(self.drug_ids)
+            self.drug_ids.append(drug_id)
+            self.doc_no_by_drug_int[drug_id.int] = doc_no
+        return doc_no
+
+    def contains(self, drug_id: uuid.UUID) -> bool:
+        return drug_id.int in self.doc_no_by_drug_int
+
+    def doc_nos_of_drug_ids(self, drug_ids: Iterable[uuid.UUID]) -> List[int]:
+        """Document numbers of the drugs in `drug_ids` that are in the index."""
+        return [
+            doc_no
+            for doc_no in map(
+                self.doc_no_by_drug_int.get, map(attrgetter("int"), drug_ids)
+            )
+            if doc_no is not None
+        ]
+
+    def add_ref_val(self, drug_id: uuid.UUID, field_name: str, value: str):
+        field_postings = self.postings.setdefault(field_name, {})
+        value = str(value)
+        doc_no = self.doc_no(drug_id)
+        field_postings[value] = self._merge_postings(
+            field_postings.get(value), [doc_no]
+        )
+        self._add_doc_value(field_name, doc_no, value)
+
+    def _add_doc_value(self, field_name: str, doc_no: int, value: str):
+        values_by_doc_no = self.doc_values.setdefault(field_name, [])
+        if len(values_by_doc_no) <= doc_no:
+            values_by_doc_no.extend([None] * (doc_no + 1 - len(values_by_doc_no)))
+        values = values_by_doc_no[doc_no] or ()
+        if value not in values:
+            values = values + (value,)
+            values_by_doc_no[doc_no] = self._value_tuples.setdefault(values, values)
+
+    def add_ref_vals(self, ref_vals: Iterable[Tuple[uuid.UUID, str, str]]):
+        """Bulk version of `add_ref_val`."""
+        doc_nos_by_ref_val: Dict[Tuple[str, str], List[int]] = {}
+        for drug_id, field_name, value in ref_vals:
+            if value is not None:
+                doc_no = self.doc_no(drug_id)
+                value = str(value)
+                doc_nos_by_ref_val.setdefault((field_name, value), []).append(doc_no)
+                self._add_doc_value(field_name, doc_no, value)
+        # All drugs have their document number now, the postings can pick their representation for the final drug count.
+        for (field_name, value), doc_nos in doc_nos_by_ref_val.items():
+            field_postings = self.postings.setdefault(field_name, {})
+            field_postings[value] = self._merge_postings(
+                field_postings.get(value), doc_nos
+            )
+
+    def _merge_postings(
+        self, postings: Optional[Postings], doc_nos: Sequence[int]
+    ) -> Postings:
+        """`postings` with the drugs `doc_nos` added. A bitset stays a bitset, an array turns into one if the value got common."""
+        if isinstance(postings, int):
+            return postings | self._bitmap_of_doc_nos(doc_nos)
+        doc_nos = set(doc_nos) if postings is None else set(postings).union(doc_nos)
+        if len(doc_nos) * FACET_POSTINGS_BITMAP_MIN_DRUG_SHARE > len(self):
+            return self._bitmap_of_doc_nos(doc_nos)
+        return array("I", sorted(doc_nos))
+
+    def add_drug(self, drug: DrugData):
+        for attr_ref in drug.attrs_ref:
+            if attr_ref.value is not None:
+                self.add_ref_val(drug.id, attr_ref.field_name, attr_ref.value)
+        for attr_multi_ref in drug.attrs_multi_ref:
+            if attr_multi_ref.value is not None:
+                self.add_ref_val(
+                    drug.id, attr_multi_ref.field_name, attr_multi_ref.value
+                )
+
+    def filter(self, filter_ref_vals: Dict[str, int | str | bool]) -> Postings:
+        """Postings of all drugs having all the reference values of `filter_ref_vals` (field name -> value)."""
+        all_postings = [
+            self.postings.get(field_name, {}).get(str(value), 0)
+            for field_name, value in filter_ref_vals.items()
+        ]
+        doc_no_arrays = [p for p in all_postings if not isinstance(p, int)]
+        if not doc_no_arrays:
+            result = None
+            for bitmap in all_postings:
+                result = bitmap if result is None else result & bitmap
+                if not result:
+                    return 0
+            return result if result is not None else 0
+        # At least one rare value: Check the few drugs of the rarest one against the other values.
+        doc_no_arrays.sort(key=len)
+        doc_nos = set(doc_no_arrays[0])
+        for doc_no_array in doc_no_arrays[1:]:
+            doc_nos.intersection_update(doc_no_array)
+        for bitmap in all_postings:
+            if not doc_nos:
+                break
+            if isinstance(bitmap, int):
+                bits = bitmap.to_bytes((len(self) + 7) >> 3, "little")
+                doc_nos = {
+                    doc_no for doc_no in doc_nos if bits[doc_no >> 3] >> (doc_no & 7) & 1
+                }
+        return array("I", sorted(doc_nos))
+
+    def count(self, postings: Postings) -> int:
+        """Count of the drugs in `postings`."""
+        if isinstance(postings, int):
+            return postings.bit_count()
+        return len(postings)
+
+    def drug_ids_of_postings(self, postings: Postings) -> List[uuid.UUID]:
+        if isinstance(postings, int):
+            return self.drug_ids_of_bitmap(postings)
+        if not postings:
+            return []
+        drug_ids = itemgetter(*postings)(self.drug_ids)
+        return [drug_ids] if len(postings) == 1 else list(drug_ids)
+
+    def bitmap_of_drug_ids(self, drug_ids: Iterable[uuid.UUID]) -> int:
+        return self._bitmap_of_doc_nos(self.doc_nos_of_drug_ids(drug_ids))
+
+    def _bitmap_of_doc_nos(self, doc_nos: Iterable[int]) -> int:
+        # Setting bits one by one in an int copies the whole int every time. Collect them in a byte array first.
+        bits = bytearray((len(self.drug_ids) + 7) >> 3)
+        for doc_no in doc_nos:
+            bits[doc_no >> 3] |= 1 << (doc_no & 7)
+        return int.from_bytes(bits, "little")
+
+    def drug_ids_of_bitmap(self, bitmap: int) -> List[uuid.UUID]:
+        # find() on the (reversed) binary string walks the bits in C
+        bits = bin(bitmap)[:1:-1]
+        drug_ids = []
+        doc_no = bits.find("1")
+        while doc_no != -1:
+            drug_ids.append(self.drug_ids[doc_no])
+            doc_no = bits.find("1", doc_no + 1)
+        return drug_ids
+
+    def facet_counts(
+        self, drug_ids: Sequence[uuid.UUID], field_names: Sequence[str]
+    ) -> Dict[str, Dict[str, int]]:
+        """Count of the drugs in `drug_ids` per value of the reference fields `field_names`. Values without drugs are left out."""
+        doc_nos = self.doc_nos_of_drug_ids(drug_ids)
+        # A small result is counted drug by drug. A large one with one AND and popcount per common value.
+        large_result = len(doc_nos) * FACET_COUNT_BITMAP_MIN_RESULT_SHARE > len(self)
+        bitmap: Optional[int] = None
+        doc_no_set: Optional[Set[int]] = None
+        facets: Dict[str, Dict[str, int]] = {}
+        for field_name in field_names:
+            counts: Dict[str, int] = {}
+            field_postings = self.postings.get(field_name, {})
+            # The rare values are counted by checking their drugs against the result.
+            # If they have more drugs than the result, counting the values of the result drug by drug is cheaper.
+            if large_result and sum(
+                len(postings)
+                for postings in field_postings.values()
+                if not isinstance(postings, int)
+            ) < len(doc_nos):
+                if bitmap is None:
+                    bitmap = self._bitmap_of_doc_nos(doc_nos)
+                for value, postings in field_postings.items():
+                    if isinstance(postings, int):
+                        count = (postings & bitmap).bit_count()
+                    else:
+                        if doc_no_set is None:
+                            doc_no_set = set(doc_nos)
+                        # the intersection iterates the array in C
+                        count = len(doc_no_set.intersection(postings))
+                    if count:
+                        counts[value] = count
+            elif doc_nos and field_name in self.doc_values:
+                values_by_doc_no = self.doc_values[field_name]
+                if len(values_by_doc_no) < len(self):
+                    values_by_doc_no.extend(
+                        [None] * (len(self) - len(values_by_doc_no))
+                    )
+                # itemgetter and Counter loop in C
+                doc_values = itemgetter(*doc_nos)(values_by_doc_no)
+                if len(doc_nos) == 1:
+                    doc_values = (doc_values,)
+                counts = Counter(chain.from_iterable(filter(None, doc_values)))
+            facets[field_name] = dict(
+                sorted(counts.items(), key=lambda item: item[1], reverse=True)
+            )
+        return facets
+
+
+class _FacetIndexHolder:
+    # The index lives on module level and is shared by all requests of the process.
+    index: Optional[DrugFacetIndex] = None
+    build_in_process: bool = False
+    background_task: Optional[asyncio.Task] = None
+
+
+_holder = _FacetIndexHolder()
+
+
+def get_facet_index(generation: Optional[Tuple] = None) -> Optional[DrugFacetIndex]:
+    """The current facet index. None if it is not built (yet) or disabled.
+    With `generation`, also None if the index was built for another search index generation (e.g. while a new one builds after an import)."""
+    if generation is not None and (
+        _holder.index is None or _holder.index.generation != generation
+    ):
+        return None
+    return _holder.index
+
+
+def ensure_facet_index(
+    generation: Tuple,
+    dataset_version: DrugDataSetVersion,
+    custom_dataset_version: Optional[DrugDataSetVersion],
+):
+    """Start a background build of the facet index, if there is none for the search index `generation`.
+    The previous index keeps answering until the new one is complete.
+    If the index is current, custom drugs created by other MedLog processes are added to it."""
+    if not config.DRUG_SEARCH_FACET_INDEX_ENABLED:
+        _holder.index = None
+        return
+    if _holder.build_in_process:
+        return
+    if _holder.index is not None and _holder.index.generation == generation:
+        if custom_dataset_version is not None:
+            _holder.build_in_process = True
+            _holder.background_task = asyncio.create_task(
+                _sync_custom_drugs_in_background(
+                    _holder.index, custom_dataset_version.id
+                )
+            )
+        return
+    dataset_version_ids = [dataset_version.id]
+    if custom_dataset_version is not None:
+        dataset_version_ids.append(custom_dataset_version.id)
+    _holder.build_in_process = True
+    # keep a reference to the task, otherwise it may be garbage collected while running
+    _holder.background_task = asyncio.create_task(
+        _build_facet_index_in_background(generation, dataset_version_ids)
+    )
+
+
+async def _build_facet_index_in_background(
+    generation: Tuple, dataset_version_ids: List[uuid.UUID]
+):
+    try:
+        _holder.index = await build_facet_index(generation, dataset_version_ids)
+    except Exception:
+        log.exception("Building drug facet index failed")
+    finally:
+        _holder.build_in_process = False
+
+
+async def _sync_custom_drugs_in_background(
+    index: DrugFacetIndex, custom_dataset_version_id: uuid.UUID
+):
+    try:
+        # custom drugs are few, loading all their reference values is cheap
+        ref_vals = await _load_ref_vals([custom_dataset_version_id])
+        missing_ref_vals = [
+            ref_val
+            for ref_val in ref_vals
+            if not index.contains(ref_val[0])
+        ]
+        if missing_ref_vals:
+            index.add_ref_vals(missing_ref_vals)
+    except Exception:
+        log.exception("Syncing custom drugs into drug facet index failed")
+    finally:
+        _holder.build_in_process = False
+
+
+async def _load_ref_vals(
+    dataset_version_ids: List[uuid.UUID],
+) -> List[Tuple[uuid.UUID, str, str]]:
+    """All `(drug id, field name, value)` of the single and multi reference values of the drugs in the dataset versions."""
+    # Not filtered by the `drug_dataset_version_fk` of the values. Custom drugs reference the values of the active dataset version.
+    drug_ids_query = select(DrugData.id).where(
+        col(DrugData.source_dataset_id).in_(dataset_version_ids)
+    )
+    async with get_async_session_context() as session:
+        result = await session.exec(
+            select(DrugValRef.drug_id, DrugValRef.field_name, DrugValRef.value).where(
+                col(DrugValRef.drug_id).in_(drug_ids_query)
+            )
+        )
+        ref_vals = list(result.all())
+        result = await session.exec(
+            select(
+                DrugValMultiRef.drug_id,
+                DrugValMultiRef.field_name,
+                DrugValMultiRef.value,
+            ).where(col(DrugValMultiRef.drug_id).in_(drug_ids_query))
+        )
+        ref_vals.extend(result.all())
+    return ref_vals
+
+
+async def build_facet_index(
+    generation: Tuple, dataset_version_ids: List[uuid.UUID]
+) -> DrugFacetIndex:
+    log.info("Build drug facet index...")
+    start_time = time.monotonic()
+    ref_vals = await _load_ref_vals(dataset_version_ids)
+
+    def _fill_index() -> DrugFacetIndex:
+        index = DrugFacetIndex(generation=generation)
+        index.add_ref_vals(ref_vals)
+        return index
+
+    # Filling the index is pure python work. Keep the event loop responsive for other requests meanwhile.
+    index = await asyncio.to_thread(_fill_index)
+    log.info(
+        f"...building drug facet index done. Indexed {len(index)} drugs with {sum(len(values) for values in index.postings.values())} reference values in {time.monotonic() - start_time:.1f}s."
+    )
+    return index
@@ -0,0 +1,324 @@
+from typing import List, Dict, Optional, Set, Tuple, Iterable
+import asyncio
+import re
+import time
+import uuid
+from sqlmodel import select, col
+
+from medlogserver.db._session import get_async_session_context
+from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
+from medlogserver.model.drug_data.drug import DrugData
+from medlogserver.model.drug_data.drug_attr_field_lov_item import DrugAttrFieldLovItem
+from medlogserver.config import Config
+from medlogserver.log import get_logger
+
+log = get_logger(modulename="DRUG_SEARCH_INDEX")
+config = Config()
+
+# Only the first and the last chars of a word are used to generate its deletes. Keeps the index small, the edit distance is always checked on the whole word.
+AFFIX_LENGTH = 7
+# Shorter words are not corrected. Too many other words are in reach of a typo.
+MIN_WORD_LENGTH = 4
+WORD_PATTERN = re.compile(r"[^\W\d_]\w+")
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Damerau-Levenshtein distance (optimal string alignment) of a and b.
+    Stops early and returns `max_distance + 1` if the distance is larger than `max_distance`."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    # common prefixes and suffixes do not change the distance. Candidates of the index mostly share their beginning with the word.
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while (
+        end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]
+    ):
+        end += 1
+    a = a[start : len(a) - end]
+    b = b[start : len(b) - end]
+    if not a or not b:
+        return max(len(a), len(b))
+    previous_previous_row: List[int] = []
+    previous_row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            row[j] = min(
+                previous_row[j] + 1,  # deletion
+                row[j - 1] + 1,  # insertion
+                previous_row[j - 1] + cost,  # substitution
+            )
+            if (
+                i > 1
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                row[j] = min(row[j], previous_previous_row[j - 2] + 1)  # transposition
+        if min(row) > max_distance:
+            return max_distance + 1
+        previous_previous_row, previous_row = previous_row, row
+    return previous_row[-1]
+
+
+class DrugNameFuzzyIndex:
+    """Symmetric delete index (as in SymSpell) over the words of drug trade names and reference value (LOV) displays.
+
+    Every dictionary word is stored under all strings that can be created by deleting up to `max_edit_distance` chars of it.
+    A misspelled word has to share one of these deletes with its correction. A lookup therefore only generates the deletes
+    of the search token and checks the few candidate words behind them, independent of the dictionary size.
+
+    To keep the index small, deletes are only generated for the beginning and the end of a word (`AFFIX_LENGTH` chars).
+    A candidate has to share a delete of its beginning and of its end with the search token. Many words share their beginning
+    (e.g. "Metformin", "Metoprolol"), the second condition keeps the number of candidates to check low.
+    """
+
+    def __init__(self, generation: Tuple, max_edit_distance: int = 2):
+        self.generation = generation
+        self.max_edit_distance = max_edit_distance
+        # The word id is the list index.
+        self.words: List[str] = []
+        self.word_frequencies: List[int] = []
+        self.word_ids: Dict[str, int] = {}
+        # delete of the beginning/end of words -> word ids
+        self.prefix_deletes: Dict[str, List[int]] = {}
+        self.suffix_deletes: Dict[str, List[int]] = {}
+        # custom drugs are synced from other MedLog processes repeatedly, their trade names must only be counted once
+        self.custom_drug_ids: Set[uuid.UUID] = set()
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    @staticmethod
+    def split_words(text: str) -> Iterable[str]:
+        for word in WORD_PATTERN.findall(text.casefold()):
+            if len(word) >= MIN_WORD_LENGTH:
+                yield word
+
+    def _deletes_of(self, word: str, max_edit_distance: int) -> Set[str]:
+        deletes = {word}
+        current = {word}
+        for _ in range(max_edit_distance):
+            current = {
+                variant[:i] + variant[i + 1 :]
+                for variant in current
+                if len(variant) > 1
+                for i in range(len(variant))
+            }
+            deletes.update(current)
+        return deletes
+
+    def add_text(self, text: str):
+        for word in self.split_words(text):
+            self.add_word(word)
+
+    def add_custom_drug(self, drug_id: uuid.UUID, trade_name: str):
+        """Add the trade name of a custom drug, if the custom drug is not in the index yet."""
+        if drug_id in self.custom_drug_ids:
+            return
+        self.custom_drug_ids.add(drug_id)
+        self.add_text(trade_name)
+
+    def add_word(self, word: str):
+        word_id = self.word_ids.get(word)
+        if word_id is not None:
+            self.word_frequencies[word_id] += 1
+            return
+        word_id = len(self.words)
+        self.words.append(word)
+        self.word_frequencies.append(1)
+        self.word_ids[word] = word_id
+        for delete in self._deletes_of(word[:AFFIX_LENGTH], self.max_edit_distance):
+            self.prefix_deletes.setdefault(delete, []).append(word_id)
+        for delete in self._deletes_of(word[-AFFIX_LENGTH:], self.max_edit_distance):
+            self.suffix_deletes.setdefault(delete, []).append(word_id)
+
+    def max_edit_distance_for(self, word: str) -> int:
+        # one typo in a short word is already a large part of it
+        if len(word) < 6:
+            return min(1, self.max_edit_distance)
+        return self.max_edit_distance
+
+    def lookup(self, word: str) -> List[Tuple[str, int, int]]:
+        """Dictionary words within the allowed edit distance of `word`.
+
+        Returns:
+            List[Tuple[str, int, int]]: (word, edit distance, frequency), closest and most frequent first
+        """
+        word = word.casefold()
+        max_edit_distance = self.max_edit_distance_for(word)
+        candidate_word_ids: Set[int] = set()
+        for delete in self._deletes_of(word[:AFFIX_LENGTH], max_edit_distance):
+            candidate_word_ids.update(self.prefix_deletes.get(delete, ()))
+        if not candidate_word_ids:
+            return []
+        suffix_candidate_word_ids: Set[int] = set()
+        for delete in self._deletes_of(word[-AFFIX_LENGTH:], max_edit_distance):
+            suffix_candidate_word_ids.update(self.suffix_deletes.get(delete, ()))
+        candidate_word_ids &= suffix_candidate_word_ids
+        matches = []
+        for word_id in candidate_word_ids:
+            candidate = self.words[word_id]
+            distance = edit_distance(word, candidate, max_edit_distance)
+            if distance <= max_edit_distance:
+                matches.append((candidate, distance, self.word_frequencies[word_id]))
+        matches.sort(key=lambda match: (match[1], -match[2]))
+        return matches
+
+    def correct_search_term(self, search_term: str) -> Optional[str]:
+        """Replace unknown words of the search term by their closest dictionary word.
+        Everything else (quotes, numbers, dosages, short words) stays as it is.
+
+        Returns:
+            Optional[str]: The corrected search term. None if no word of the search term could be corrected.
+        """
+        corrected_words = 0
+
+        def _correct_word(match: re.Match) -> str:
+            nonlocal corrected_words
+            word = match.group(0)
+            word_folded = word.casefold()
+            if (
+                len(word_folded) < MIN_WORD_LENGTH
+                or any(char.isdigit() for char in word_folded)
+                or word_folded in self.word_ids
+            ):
+                return word
+            matches = self.lookup(word_folded)
+            if not matches:
+                return word
+            corrected_words += 1
+            return matches[0][0]
+
+        corrected_search_term = re.sub(r"\w+", _correct_word, search_term or "")
+        if not corrected_words:
+            return None
+        return corrected_search_term
+
+
+class _FuzzyIndexHolder:
+    # The index lives on module level and is shared by all requests of the process.
+    index: Optional[DrugNameFuzzyIndex] = None
+    build_in_process: bool = False
+    background_task: Optional[asyncio.Task] = None
+
+
+_holder = _FuzzyIndexHolder()
+
+
+def get_fuzzy_index(generation: Optional[Tuple] = None) -> Optional[DrugNameFuzzyIndex]:
+    """The current fuzzy index. None if it is not built (yet) or disabled.
+    With `generation`, also None if the index was built for another search index generation (e.g. while a new one builds after an import)."""
+    if generation is not None and (
+        _holder.index is None or _holder.index.generation != generation
+    ):
+        return None
+    return _holder.index
+
+
+def ensure_fuzzy_index(
+    generation: Tuple,
+    dataset_version: DrugDataSetVersion,
+    custom_dataset_version: Optional[DrugDataSetVersion],
+):
+    """Start a background build of the fuzzy index, if there is none for the search index `generation`.
+    The previous index keeps answering until the new one is complete.
+    If the index is current, custom drugs created by other MedLog processes are added to it."""
+    if config.DRUG_SEARCH_FUZZY_MAX_EDIT_DISTANCE <= 0:
+        _holder.index = None
+        return
+    if _holder.build_in_process:
+        return
+    if _holder.index is not None and _holder.index.generation == generation:
+        if custom_dataset_version is not None:
+            _holder.build_in_process = True
+            _holder.background_task = asyncio.create_task(
+                _sync_custom_drugs_in_background(
+                    _holder.index, custom_dataset_version.id
+                )
+            )
+        return
+    dataset_version_ids = [dataset_version.id]
+    if custom_dataset_version is not None:
+        dataset_version_ids.append(custom_dataset_version.id)
+    _holder.build_in_process = True
+    # keep a reference to the task, otherwise it may be garbage collected while running
+    _holder.background_task = asyncio.create_task(
+        _build_fuzzy_index_in_background(generation, dataset_version_ids)
+    )
+
+
+async def _build_fuzzy_index_in_background(
+    generation: Tuple, dataset_version_ids: List[uuid.UUID]
+):
+    try:
+        _holder.index = await build_fuzzy_index(generation, dataset_version_ids)
+    except Exception:
+        log.exception("Building fuzzy drug name index failed")
+    finally:
+        _holder.build_in_process = False
+
+
+async def _sync_custom_drugs_in_background(
+    index: DrugNameFuzzyIndex, custom_dataset_version_id: uuid.UUID
+):
+    try:
+        # custom drugs are few, loading all their trade names is cheap
+        async with get_async_session_context() as session:
+            result = await session.exec(
+                select(DrugData.id, DrugData.trade_name).where(
+                    DrugData.source_dataset_id == custom_dataset_version_id
+                )
+            )
+            custom_drugs = result.all()
+        for drug_id, trade_name in custom_drugs:
+            index.add_custom_drug(drug_id, trade_name)
+    except Exception:
+        log.exception("Syncing custom drugs into fuzzy drug name index failed")
+    finally:
+        _holder.build_in_process = False
+
+
+async def build_fuzzy_index(
+    generation: Tuple, dataset_version_ids: List[uuid.UUID]
+) -> DrugNameFuzzyIndex:
+    log.info("Build fuzzy drug name index...")
+    start_time = time.monotonic()
+    async with get_async_session_context() as session:
+        result = await session.exec(
+            select(DrugData.id, DrugData.trade_name, DrugData.is_custom_drug).where(
+                col(DrugData.source_dataset_id).in_(dataset_version_ids)
+            )
+        )
+        drugs = result.all()
+        result = await session.exec(
+            select(DrugAttrFieldLovItem.display)
+            .where(col(DrugAttrFieldLovItem.drug_dataset_version_fk).in_(dataset_version_ids))
+            .distinct()
+        )
+        lov_displays = result.all()
+
+    def _fill_index() -> DrugNameFuzzyIndex:
+        index = DrugNameFuzzyIndex(
+            generation=generation,
+            max_edit_distance=config.DRUG_SEARCH_FUZZY_MAX_EDIT_DISTANCE,
+        )
+        for drug_id, trade_name, is_custom_drug in drugs:
+            if is_custom_drug:
+                index.add_custom_drug(drug_id, trade_name)
+            else:
+                index.add_text(trade_name)
+        for text in lov_displays:
+            if text is not None:
+                index.add_text(text)
+        return index
+
+    # Filling the index is pure python work. Keep the event loop responsive for other requests meanwhile.
+    index = await asyncio.to_thread(_fill_index)
+    log.info(
+        f"...building fuzzy drug name index done. Indexed {len(index)} words ({len(index.prefix_deletes) + len(index.suffix_deletes)} deletes) in {time.monotonic() - start_time:.1f}s."
+    )
+    return index
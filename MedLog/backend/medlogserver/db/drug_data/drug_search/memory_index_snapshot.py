@@ -0,0 +1,254 @@
+from typing import Any, Callable, Dict, Generic, Iterator, List, Optional, Sequence, Set, Tuple, TypeVar
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+import itertools
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+# File format and read only containers of the on-disk snapshot of the `DrugMemoryIndex`.
+# A snapshot file is mmap'ed read only. Its sections are used in place as typed memoryviews, so the pages are backed
+# by the file and shared between all MedLog processes (and forked workers) that map it, instead of every process
+# building the index into its own heap.
+# Layout: magic | header length (uint64 LE) | JSON header | sections, each 8 byte aligned.
+SNAPSHOT_MAGIC = b"MLDMIDX1"
+SECTION_ALIGNMENT = 8
+
+T = TypeVar("T")
+
+
+def _padded(length: int) -> int:
+    return -(-length // SECTION_ALIGNMENT) * SECTION_ALIGNMENT
+
+
+def write_snapshot_file(path: Path, meta: Dict[str, Any], sections: Dict[str, bytes | array]):
+    """Write the sections atomically to `path`. Processes that mapped a previous file at this path keep their (unlinked) copy."""
+    section_table = {}
+    position = 0
+    for name, data in sections.items():
+        view = memoryview(data)
+        section_table[name] = [position, view.nbytes, view.format]
+        position += _padded(view.nbytes)
+    header = json.dumps(
+        {"meta": meta, "byteorder": sys.byteorder, "sections": section_table}
+    ).encode()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, tmp_path = tempfile.mkstemp(
+        dir=path.parent, prefix=path.name, suffix=".tmp"
+    )
+    try:
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(SNAPSHOT_MAGIC + struct.pack("<Q", len(header)) + header)
+            file.write(b"\0" * (_padded(file.tell()) - file.tell()))
+            for data in sections.values():
+                view = memoryview(data)
+                file.write(view)
+                file.write(b"\0" * (_padded(view.nbytes) - view.nbytes))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def open_snapshot_file(path: Path) -> Tuple[Dict[str, Any], Dict[str, memoryview]]:
+    """Map a snapshot file read only. Returns its meta data and its sections as typed views into the mapping.
+
+    Raises:
+        ValueError: The file is no snapshot or was written on a platform with another byte order.
+    """
+    with open(path, "rb") as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    # The views keep the mapping alive. It is unmapped when the last view is garbage collected.
+    view = memoryview(mapping)
+    if bytes(view[: len(SNAPSHOT_MAGIC)]) != SNAPSHOT_MAGIC:
+        raise ValueError(f"'{path}' is no drug search index snapshot")
+    header_start = len(SNAPSHOT_MAGIC) + 8
+    (header_length,) = struct.unpack("<Q", view[len(SNAPSHOT_MAGIC) : header_start])
+    header = json.loads(bytes(view[header_start : header_start + header_length]))
+    if header["byteorder"] != sys.byteorder:
+        raise ValueError(f"'{path}' was written with byte order {header['byteorder']}")
+    data_start = _padded(header_start + header_length)
+    sections = {
+        name: view[data_start + offset : data_start + offset + length].cast(format)
+        for name, (offset, length, format) in header["sections"].items()
+    }
+    return header["meta"], sections
+
+
+def pack_strings(values: Sequence[str]) -> Tuple[bytes, array]:
+    """UTF-8 blob of all strings and the offsets (`len(values) + 1`) of each string in it."""
+    encoded = [value.encode() for value in values]
+    offsets = array("Q", [0])
+    offsets.extend(itertools.accumulate(len(value) for value in encoded))
+    return b"".join(encoded), offsets
+
+
+def pack_postings(postings: Sequence[Sequence[int]]) -> Tuple[array, array]:
+    """All posting lists concatenated and the offsets (`len(postings) + 1`) of each list in it."""
+    offsets = array("Q", [0])
+    offsets.extend(itertools.accumulate(len(posting) for posting in postings))
+    values = array("I")
+    for posting in postings:
+        values.extend(posting)
+    return values, offsets
+
+
+class MappedSequence(Generic[T]):
+    """List like sequence. The first items are read from the snapshot, items appended later (e.g. custom drugs) live in memory."""
+
+    def __init__(self, base_length: int, get_base_item: Callable[[int], T]):
+        self._base_length = base_length
+        self._get_base_item = get_base_item
+        self._appended: List[T] = []
+
+    def __len__(self) -> int:
+        return self._base_length + len(self._appended)
+
+    def __getitem__(self, i: int) -> T:
+        if i < self._base_length:
+            return self._get_base_item(i)
+        return self._appended[i - self._base_length]
+
+    def __iter__(self) -> Iterator[T]:
+        for i in range(self._base_length):
+            yield self._get_base_item(i)
+        yield from self._appended
+
+    def append(self, value: T):
+        self._appended.append(value)
+
+    @classmethod
+    def of_strings(cls, blob: memoryview, offsets: memoryview) -> "MappedSequence[str]":
+        return cls(
+            len(offsets) - 1, lambda i: str(blob[offsets[i] : offsets[i + 1]], "utf-8")
+        )
+
+
+class MappedDict(Generic[T]):
+    """Dict like lookup. The snapshot part is a sorted sequence of keys searched by bisection,
+    keys set later live in memory."""
+
+    def __init__(
+        self,
+        sorted_keys: Sequence[Any],
+        get_base_value: Callable[[int], T],
+        encode_key: Callable[[Any], Any] = lambda key: key,
+    ):
+        self._sorted_keys = sorted_keys
+        self._get_base_value = get_base_value
+        self._encode_key = encode_key
+        self._added: Dict[Any, T] = {}
+
+    def _base_position(self, key) -> Optional[int]:
+        encoded_key = self._encode_key(key)
+        position = bisect_left(self._sorted_keys, encoded_key)
+        if position < len(self._sorted_keys) and self._sorted_keys[position] == encoded_key:
+            return position
+        return None
+
+    def get(self, key, default: Optional[T] = None) -> Optional[T]:
+        if key in self._added:
+            return self._added[key]
+        position = self._base_position(key)
+        if position is None:
+            return default
+        return self._get_base_value(position)
+
+    def __getitem__(self, key) -> T:
+        position = None if key in self._added else self._base_position(key)
+        if position is not None:
+            return self._get_base_value(position)
+        return self._added[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._added or self._base_position(key) is not None
+
+    def __setitem__(self, key, value: T):
+        self._added[key] = value
+
+    def __len__(self) -> int:
+        return len(self._sorted_keys) + len(self._added)
+
+
+class MappedPostingList:
+    """One posting list of `MappedPostingLists`. Appended values are kept in memory."""
+
+    def __init__(self, posting_lists: "MappedPostingLists", list_no: int):
+        self._posting_lists = posting_lists
+        self._list_no = list_no
+
+    def _parts(self) -> Tuple[Sequence[int], Optional[array]]:
+        return (
+            self._posting_lists._base_list(self._list_no),
+            self._posting_lists._appended.get(self._list_no),
+        )
+
+    def __iter__(self) -> Iterator[int]:
+        base, appended = self._parts()
+        if appended is None:
+            return iter(base)
+        return itertools.chain(base, appended)
+
+    def __len__(self) -> int:
+        base, appended = self._parts()
+        return len(base) + (len(appended) if appended is not None else 0)
+
+    def append(self, value: int):
+        self._posting_lists._appended.setdefault(self._list_no, array("I")).append(value)
+
+
+class MappedPostingLists:
+    """List like sequence of posting lists (e.g. word id -> document numbers), stored as one value array and offsets."""
+
+    def __init__(self, values: memoryview, offsets: memoryview):
+        self._values = values
+        self._offsets = offsets
+        self._base_length = len(offsets) - 1
+        self._appended: Dict[int, array] = {}
+        self._length = self._base_length
+
+    def _base_list(self, list_no: int) -> Sequence[int]:
+        if list_no >= self._base_length:
+            return ()
+        return self._values[self._offsets[list_no] : self._offsets[list_no + 1]]
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, list_no: int) -> MappedPostingList:
+        if list_no >= self._length:
+            raise IndexError(list_no)
+        return MappedPostingList(self, list_no)
+
+    def append(self, posting: Sequence[int]):
+        if len(posting):
+            self._appended[self._length] = array("I", posting)
+        self._length += 1
+
+
+class MappedSetDict:
+    """Dict like lookup of document number sets (e.g. ref value -> document numbers).
+    `get()` returns a new set, documents are added via `setdefault(key, set()).add(doc_no)`."""
+
+    def __init__(
+        self,
+        sorted_keys: Sequence[str],
+        postings: MappedPostingLists,
+        encode_key: Callable[[Any], str],
+    ):
+        self._lookup = MappedDict(sorted_keys, lambda position: position, encode_key)
+        self._postings = postings
+        self._added: Dict[Any, Set[int]] = {}
+
+    def get(self, key, default: Optional[Set[int]] = None) -> Optional[Set[int]]:
+        position = self._lookup.get(key)
+        if position is None:
+            return self._added[key] if key in self._added else default
+        return set(self._postings[position]) | self._added.get(key, set())
+
+    def setdefault(self, key, default: Set[int]) -> Set[int]:
+        return self._added.setdefault(key, default)
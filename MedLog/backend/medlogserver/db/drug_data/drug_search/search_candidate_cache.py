@@ -0,0 +1,76 @@
+from typing import Hashable, List, Optional, Tuple
+from collections import OrderedDict
+import time
+import uuid
+
+from medlogserver.config import Config
+from medlogserver.log import get_logger
+from medlogserver.db.drug_data.drug_search._base import search_term_refines
+
+log = get_logger()
+config = Config()
+
+# Entries are looked up by every prefix of a new search term. Enough for typeahead sessions of many users.
+MAX_CANDIDATE_SETS = 256
+
+
+class DrugSearchCandidateCache:
+    """Process local, short-lived cache of the ids of all drugs a search term found (for small results only).
+
+    While a user types, each keystroke usually narrows the previous search down ("met" -> "metf" -> "metfo").
+    If a new search term refines a recently served one with the same parameters (see `search_term_refines()`),
+    the search engine only has to score the drugs found before, instead of all drugs.
+
+    `params_key` must contain everything besides the search term that changes the result (dataset version, index generation, filters).
+    """
+
+    def __init__(self, max_drug_ids: int, ttl_sec: int, max_size: int = MAX_CANDIDATE_SETS):
+        self.max_drug_ids = max_drug_ids
+        self.ttl_sec = ttl_sec
+        self.max_size = max_size
+        self._entries: OrderedDict[
+            Tuple[Hashable, str], Tuple[float, List[uuid.UUID]]
+        ] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_drug_ids > 0 and self.ttl_sec > 0
+
+    def get(self, params_key: Hashable, search_term: str) -> Optional[List[uuid.UUID]]:
+        """The drug ids found by the longest recently served prefix of `search_term` that `search_term` refines.
+        `None` if there is none, then the whole index has to be searched."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        for prefix_length in range(len(search_term) - 1, 0, -1):
+            key = (params_key, search_term[:prefix_length])
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            if now > entry[0]:
+                del self._entries[key]
+                continue
+            if not search_term_refines(key[1], search_term):
+                continue
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, params_key: Hashable, search_term: str, drug_ids: List[uuid.UUID]):
+        if not self.enabled or len(drug_ids) > self.max_drug_ids:
+            return
+        key = (params_key, search_term)
+        self._entries[key] = (time.monotonic() + self.ttl_sec, drug_ids)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+drug_search_candidate_cache = DrugSearchCandidateCache(
+    max_drug_ids=config.DRUG_SEARCH_PREFIX_REFINEMENT_MAX_DRUG_IDS,
+    ttl_sec=config.DRUG_SEARCH_PREFIX_REFINEMENT_TTL_SEC,
+)
@@ -6,22 +6,51 @@ from typing import (
     Sequence,
     Annotated,
     Dict,
+    Hashable,
     Tuple,
 )
 from typing_extensions import Unpack
 from fastapi import Depends, HTTPException, status
+import asyncio
 import contextlib
+import time
+import uuid
 
 from sqlmodel.ext.asyncio.session import AsyncSession
 from medlogserver.db.drug_data.drug_search import SEARCH_ENGINES
 
-from medlogserver.db._session import get_async_session
+from medlogserver.db._session import get_async_session, get_async_session_context
 from medlogserver.config import Config
 from medlogserver.log import get_logger
 from medlogserver.api.paginator import QueryParamsInterface, PaginatedResponse
 
 from medlogserver.db.drug_data.drug_search._base import (
     MedLogDrugSearchEngineBase,
+    DrugSearchResponse,
+    tokenize_search_term,
+    drug_code_from_search_term,
+)
+from medlogserver.db.drug_data.drug_search.search_result_cache import (
+    drug_search_result_cache,
+    DrugSearchResultCacheStats,
+)
+from medlogserver.db.drug_data.drug_search.search_candidate_cache import (
+    drug_search_candidate_cache,
+)
+from medlogserver.db.drug_data.drug_search.fuzzy_index import (
+    ensure_fuzzy_index,
+    get_fuzzy_index,
+)
+from medlogserver.db.drug_data.drug_search.facet_index import (
+    ensure_facet_index,
+    get_facet_index,
+    drug_ref_field_name_from_filter,
+)
+from medlogserver.db.drug_data.drug_search.suggest_index import (
+    ensure_suggest_index,
+    get_suggest_index,
+    suggest_drug_of,
+    DrugSuggestion,
 )
 from medlogserver.db.drug_data.drug_search.search_module_generic_sql import (
     GenericSQLDrugSearchEngine,
@@ -30,12 +59,18 @@ from medlogserver.db.drug_data.drug_search.search_module_generic_sql import (
 from medlogserver.db.drug_data.drug_dataset_version import (
     DrugDataSetVersionCRUD,
 )
+from medlogserver.db.drug_data.drug_api_read_document import DrugAPIReadDocumentCRUD
+from medlogserver.db.drug_data.drug import DrugCRUD
 
 from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
+from medlogserver.model.drug_data.drug import DrugData
 
 log = get_logger()
 config = Config()
 
+# relevance score of drugs found by an exact drug code match
+DRUG_CODE_MATCH_SCORE = 10.0
+
 
 class SearchEngineNotReadyException(Exception):
     pass
@@ -45,6 +80,112 @@ class SearchEngineNotConfiguredException(Exception):
     pass
 
 
+class _DrugSearchEngineRegistry:
+    """Process wide search engine instance with its cached readiness state.
+
+    Looking up the active dataset version and the index state costs several queries.
+    The registry does this at most once per `DRUG_SEARCH_ENGINE_STATE_TTL_SEC` instead of on every search request.
+    Index changes of the same process invalidate the search result cache (`drug_search_result_cache.invalidations`),
+    which also makes the registry refresh on the next request.
+    """
+
+    def __init__(self, ttl_sec: int):
+        self.ttl_sec = ttl_sec
+        self.search_engine: Optional[MedLogDrugSearchEngineBase] = None
+        self.dataset_version: Optional[DrugDataSetVersion] = None
+        self.custom_dataset_version: Optional[DrugDataSetVersion] = None
+        self.index_generation: Optional[Hashable] = None
+        self._refreshed_at: Optional[float] = None
+        self._result_cache_invalidations: Optional[int] = None
+        self._refresh_lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return (
+            self.search_engine is not None
+            and self._refreshed_at is not None
+            and time.monotonic() - self._refreshed_at < self.ttl_sec
+            and self._result_cache_invalidations
+            == drug_search_result_cache.invalidations
+        )
+
+    def invalidate(self):
+        self._refreshed_at = None
+
+    async def get_ready_engine(
+        self,
+    ) -> Tuple[MedLogDrugSearchEngineBase, DrugDataSetVersion, Optional[Hashable]]:
+        """Returns the search engine, the active drug dataset version and the current index generation.
+
+        Raises:
+            SearchEngineNotConfiguredException: `DRUG_SEARCHENGINE_CLASS` does not name a search engine
+            SearchEngineNotReadyException: the search index is not (yet) build
+        """
+        if not self._is_fresh():
+            async with self._refresh_lock:
+                # concurrent requests waited for the same refresh
+                if not self._is_fresh():
+                    await self._refresh()
+        return self.search_engine, self.dataset_version, self.index_generation
+
+    async def _refresh(self):
+        try:
+            search_engine_class = SEARCH_ENGINES[config.DRUG_SEARCHENGINE_CLASS]
+        except KeyError:
+            raise SearchEngineNotConfiguredException(
+                "Could not find a valid drug search engine configuration. Search will not work."
+            )
+        result_cache_invalidations = drug_search_result_cache.invalidations
+        async with get_async_session_context() as session:
+            async with DrugDataSetVersionCRUD.crud_context(
+                session
+            ) as dataset_version_crud:
+                dataset_version_crud: DrugDataSetVersionCRUD = dataset_version_crud
+                dataset_version = await dataset_version_crud.get_current_active()
+                custom_dataset_version = await dataset_version_crud.get_custom()
+        search_engine = self.search_engine
+        if (
+            search_engine is None
+            or type(search_engine) is not search_engine_class
+            or self.dataset_version is None
+            or dataset_version is None
+            or self.dataset_version.id != dataset_version.id
+        ):
+            # engines cache dataset specific data. Start with a fresh instance for a new dataset version.
+            search_engine = search_engine_class(dataset_version)
+        if not await search_engine.index_ready():
+            # Not cached. We want to know as soon as the index is ready.
+            self.search_engine = None
+            raise SearchEngineNotReadyException(
+                "The search index is still building or warming up. Please try again in a little bit."
+            )
+        self.index_generation = await search_engine.index_generation()
+        ensure_fuzzy_index(
+            generation=(dataset_version.id, self.index_generation),
+            dataset_version=dataset_version,
+            custom_dataset_version=custom_dataset_version,
+        )
+        ensure_facet_index(
+            generation=(dataset_version.id, self.index_generation),
+            dataset_version=dataset_version,
+            custom_dataset_version=custom_dataset_version,
+        )
+        ensure_suggest_index(
+            generation=(dataset_version.id, self.index_generation),
+            dataset_version=dataset_version,
+            custom_dataset_version=custom_dataset_version,
+        )
+        self.search_engine = search_engine
+        self.dataset_version = dataset_version
+        self.custom_dataset_version = custom_dataset_version
+        self._result_cache_invalidations = result_cache_invalidations
+        self._refreshed_at = time.monotonic()
+
+
+drug_search_engine_registry = _DrugSearchEngineRegistry(
+    ttl_sec=config.DRUG_SEARCH_ENGINE_STATE_TTL_SEC
+)
+
+
 # TODO: define as  Abstract Base Classes to be more of an correct interface
 # at the moment its a "stub"-class (for lack of a better word)
 class DrugSearch:
@@ -52,6 +193,7 @@ class DrugSearch:
         self.session = session
         self._current_dataset_version: DrugDataSetVersion = None
         self.search_engine: MedLogDrugSearchEngineBase = None
+        self._index_generation: Optional[Hashable] = None
 
     async def get_current_dataset_version(
         self,
@@ -69,24 +211,15 @@ class DrugSearch:
 
     async def _preflight(self):
         if self.search_engine is None:
-            try:
-                search_engine_class = SEARCH_ENGINES[config.DRUG_SEARCHENGINE_CLASS]
-            except KeyError:
-                raise SearchEngineNotConfiguredException(
-                    "Could not find a valid drug search engine configuration. Search will not work."
-                )
+            (
+                self.search_engine,
+                self._current_dataset_version,
+                self._index_generation,
+            ) = await drug_search_engine_registry.get_ready_engine()
 
-            search_engine = search_engine_class(
-                await self.get_current_dataset_version()
-            )
-            index_ready = await search_engine.index_ready()
-            if index_ready:
-                self.search_engine = search_engine
-                return
-            else:
-                raise SearchEngineNotReadyException(
-                    "The search index is still building or warming up. Please try again in a little bit."
-                )
+    def _search_index_generation(self) -> Tuple:
+        """The generation key the in-memory indexes (facet, fuzzy, suggest) of the current search index are built for."""
+        return (self._current_dataset_version.id, self._index_generation)
 
     async def total_drug_count(self) -> int:
         await self._preflight()
@@ -119,15 +252,285 @@ class DrugSearch:
         search_term: str = None,
         market_accessable: Optional[bool] = None,
         pagination: Optional[QueryParamsInterface] = None,
+        facets: Optional[List[str]] = None,
         **filter_ref_vals: int | str | bool,
-    ) -> PaginatedResponse[MedLogSearchEngineResult]:
+    ) -> DrugSearchResponse:
+        """Search drugs.
+
+        Args:
+            facets (Optional[List[str]], optional): Reference field names to count the values of in the whole search result. Defaults to None.
+            **filter_ref_vals: Reference field values the drugs must have. Field names can be prefixed with `filter_` like the API query params.
+        """
+        await self._preflight()
+        dataset_version = await self.get_current_dataset_version()
+        search_term, _ = tokenize_search_term(search_term)
+        filter_ref_vals = {
+            drug_ref_field_name_from_filter(k): v
+            for k, v in filter_ref_vals.items()
+            if v != "" and v is not None
+        }
+        facets = sorted(set(facets)) if facets else None
+        cache_key = (
+            dataset_version.id,
+            self._index_generation,
+            search_term,
+            market_accessable,
+            tuple(sorted(filter_ref_vals.items())),
+            tuple(facets) if facets else None,
+            pagination.offset if pagination else None,
+            pagination.limit if pagination else None,
+        )
+        return await drug_search_result_cache.get_or_run(
+            cache_key,
+            lambda: self._search(
+                search_term=search_term,
+                market_accessable=market_accessable,
+                pagination=pagination,
+                facets=facets,
+                filter_ref_vals=filter_ref_vals,
+            ),
+            # facets were requested while the facet index was still building. Do not cache the result without them.
+            cacheable=lambda search_results: (
+                not facets
+                or search_results.facets is not None
+                or not config.DRUG_SEARCH_FACET_INDEX_ENABLED
+            ),
+        )
+
+    async def suggest(
+        self,
+        prefix: str,
+        limit: int = 10,
+        market_accessable: Optional[bool] = None,
+    ) -> List[DrugSuggestion]:
+        """Typeahead suggestions: Trade names and drug codes starting with `prefix`.
+        Answered from the in-memory suggest index only, the database is not queried.
+
+        Raises:
+            SearchEngineNotConfiguredException: the suggest index is disabled by `DRUG_SEARCH_SUGGEST_INDEX_ENABLED`
+            SearchEngineNotReadyException: the search index or the suggest index is not (yet) build
+        """
+        if not config.DRUG_SEARCH_SUGGEST_INDEX_ENABLED:
+            raise SearchEngineNotConfiguredException(
+                "The suggestion index is disabled by `DRUG_SEARCH_SUGGEST_INDEX_ENABLED`."
+            )
         await self._preflight()
-        return await self.search_engine.search(
-            search_term=search_term,
+        # The suggestions of another generation would name drugs of another dataset version
+        suggest_index = get_suggest_index(generation=self._search_index_generation())
+        if suggest_index is None:
+            raise SearchEngineNotReadyException(
+                "The suggestion index is still building. Please try again in a little bit."
+            )
+        return suggest_index.suggest(
+            prefix, limit=limit, market_accessable=market_accessable
+        )
+
+    async def _search(
+        self,
+        search_term: str,
+        market_accessable: Optional[bool] = None,
+        pagination: Optional[QueryParamsInterface] = None,
+        facets: Optional[List[str]] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+    ) -> DrugSearchResponse:
+        # A facet index of another generation would filter and count the drugs of another dataset version
+        facet_index = get_facet_index(generation=self._search_index_generation())
+        # Filters are applied by the search engine, unless the facet index can narrow the search down to a few drug ids.
+        engine_filter_ref_vals = filter_ref_vals
+        filter_drug_ids: Optional[List[uuid.UUID]] = None
+        if filter_ref_vals and facet_index is not None:
+            filter_postings = facet_index.filter(filter_ref_vals)
+            if (
+                facet_index.count(filter_postings)
+                <= config.DRUG_SEARCH_FACET_FILTER_MAX_DRUG_IDS
+            ):
+                filter_drug_ids = facet_index.drug_ids_of_postings(filter_postings)
+                engine_filter_ref_vals = None
+        offset = pagination.offset if pagination and pagination.offset else 0
+        if filter_drug_ids is not None and not filter_drug_ids:
+            # no drug has all the filter values. No need to ask the search engine.
+            return DrugSearchResponse(
+                total_count=0,
+                count=0,
+                offset=offset,
+                items=[],
+                facets={field_name: {} for field_name in facets} if facets else None,
+            )
+        result_drug_ids: Optional[Sequence[uuid.UUID]] = None
+        code_drug_ids = None
+        if not filter_ref_vals:
+            code_drug_ids = await self._drug_ids_by_code(
+                search_term=search_term, market_accessable=market_accessable
+            )
+        if code_drug_ids:
+            limit = pagination.limit if pagination and pagination.limit else None
+            page_drug_ids = code_drug_ids[offset : offset + limit if limit else None]
+            search_results = await self.search_engine._hydrate_search_results(
+                [(drug_id, DRUG_CODE_MATCH_SCORE) for drug_id in page_drug_ids],
+                total_count=len(code_drug_ids),
+                offset=offset,
+            )
+            result_drug_ids = code_drug_ids
+        else:
+            candidate_params_key = (
+                self._current_dataset_version.id,
+                self._index_generation,
+                drug_search_result_cache.invalidations,
+                market_accessable,
+                tuple(sorted((filter_ref_vals or {}).items())),
+            )
+            prefix_refinement = (
+                self.search_engine.prefix_refinement
+                and drug_search_candidate_cache.enabled
+            )
+            candidate_drug_ids = None
+            if prefix_refinement:
+                candidate_drug_ids = drug_search_candidate_cache.get(
+                    candidate_params_key, search_term
+                )
+            search_filter_ref_vals = engine_filter_ref_vals
+            search_drug_ids = filter_drug_ids
+            if candidate_drug_ids is not None:
+                # The search term narrows a recent search down. Only its drugs can match, they allready passed the filters.
+                search_filter_ref_vals = None
+                search_drug_ids = candidate_drug_ids
+            search_results, result_drug_ids = (
+                await self.search_engine.search_with_drug_ids(
+                    search_term=search_term,
+                    market_accessable=market_accessable,
+                    filter_ref_vals=search_filter_ref_vals,
+                    pagination=pagination,
+                    drug_ids=search_drug_ids,
+                    max_result_drug_ids=(
+                        drug_search_candidate_cache.max_drug_ids
+                        if prefix_refinement
+                        else 0
+                    ),
+                )
+            )
+            if result_drug_ids is not None:
+                drug_search_candidate_cache.put(
+                    candidate_params_key, search_term, result_drug_ids
+                )
+            if (
+                search_results.total_count
+                < config.DRUG_SEARCH_FUZZY_FALLBACK_BELOW_RESULT_COUNT
+            ):
+                uncorrected_search_term = search_term
+                search_results, search_term = await self._search_typo_corrected(
+                    search_results,
+                    search_term=search_term,
+                    market_accessable=market_accessable,
+                    filter_ref_vals=engine_filter_ref_vals,
+                    pagination=pagination,
+                    drug_ids=filter_drug_ids,
+                )
+                if search_term != uncorrected_search_term:
+                    # the drug ids belong to the uncorrected search term
+                    result_drug_ids = None
+        facet_counts = None
+        if facets and facet_index is not None:
+            if result_drug_ids is None and search_results.total_count == len(
+                search_results.items
+            ):
+                # the page holds the whole result
+                result_drug_ids = [item.drug_id for item in search_results.items]
+            if result_drug_ids is None:
+                result_drug_ids = await self.search_engine.search_drug_ids(
+                    search_term=search_term,
+                    market_accessable=market_accessable,
+                    filter_ref_vals=engine_filter_ref_vals,
+                    drug_ids=filter_drug_ids,
+                )
+            facet_counts = facet_index.facet_counts(result_drug_ids, facets)
+        return DrugSearchResponse(
+            total_count=search_results.total_count,
+            count=search_results.count,
+            offset=search_results.offset,
+            items=search_results.items,
+            facets=facet_counts,
+        )
+
+    async def _search_typo_corrected(
+        self,
+        search_results: PaginatedResponse[MedLogSearchEngineResult],
+        search_term: str,
+        market_accessable: Optional[bool] = None,
+        pagination: Optional[QueryParamsInterface] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+    ) -> Tuple[PaginatedResponse[MedLogSearchEngineResult], str]:
+        """Repeat a search with few results with typos in the search term corrected by the fuzzy index.
+        Returns the results of the corrected search and the corrected search term if it found more drugs, otherwise the original `search_results` and `search_term`.
+        """
+        fuzzy_index = get_fuzzy_index(generation=self._search_index_generation())
+        if fuzzy_index is None:
+            return search_results, search_term
+        corrected_search_term = fuzzy_index.correct_search_term(search_term)
+        if corrected_search_term is None:
+            return search_results, search_term
+        corrected_search_results = await self.search_engine.search(
+            search_term=corrected_search_term,
             market_accessable=market_accessable,
             filter_ref_vals=filter_ref_vals,
             pagination=pagination,
+            drug_ids=drug_ids,
         )
+        log.debug(
+            f"Typo corrected drug search '{search_term}' -> '{corrected_search_term}': {search_results.total_count} -> {corrected_search_results.total_count} results"
+        )
+        if corrected_search_results.total_count > search_results.total_count:
+            return corrected_search_results, corrected_search_term
+        return search_results, search_term
+
+    async def _drug_ids_by_code(
+        self,
+        search_term: str,
+        market_accessable: Optional[bool] = None,
+    ) -> Optional[List[uuid.UUID]]:
+        """Fast path for search terms that are a drug code of a code system with unique codes (e.g. a scanned PZN).
+        Returns None if the search term is no such code, so the search engine has to answer the search."""
+        code = drug_code_from_search_term(search_term)
+        if code is None:
+            return None
+        dataset_version_ids = [self._current_dataset_version.id]
+        if drug_search_engine_registry.custom_dataset_version is not None:
+            dataset_version_ids.append(
+                drug_search_engine_registry.custom_dataset_version.id
+            )
+        # Own session: identical concurrent searches share this execution, it can outlive the request that started it.
+        async with get_async_session_context() as session:
+            async with DrugCRUD.crud_context(session=session) as drug_crud:
+                drug_crud: DrugCRUD = drug_crud  # typing hint help
+                drug_ids = await drug_crud.get_ids_by_code(
+                    code=code,
+                    dataset_version_ids=dataset_version_ids,
+                    market_accessable=market_accessable,
+                )
+        return drug_ids or None
+
+    async def insert_drug_to_index(self, drug: DrugData):
+        await self._preflight()
+        await self.search_engine.insert_drug_to_index(drug)
+        async with get_async_session_context() as session:
+            async with DrugAPIReadDocumentCRUD.crud_context(
+                session=session
+            ) as drug_doc_crud:
+                drug_doc_crud: DrugAPIReadDocumentCRUD = drug_doc_crud
+                await drug_doc_crud.upsert([drug])
+        fuzzy_index = get_fuzzy_index(generation=self._search_index_generation())
+        if fuzzy_index is not None:
+            fuzzy_index.add_custom_drug(drug.id, drug.trade_name)
+        facet_index = get_facet_index(generation=self._search_index_generation())
+        if facet_index is not None:
+            facet_index.add_drug(drug)
+        suggest_index = get_suggest_index(generation=self._search_index_generation())
+        if suggest_index is not None:
+            suggest_index.add_drug(suggest_drug_of(drug))
+        drug_search_result_cache.invalidate()
+
+    def result_cache_stats(self) -> DrugSearchResultCacheStats:
+        return drug_search_result_cache.stats()
 
 
 async def get_drug_search(
@@ -1,32 +1,58 @@
-from typing import List, Dict, Optional
-import shlex
+from typing import List, Dict, Optional, Sequence, Tuple
+import asyncio
 import traceback
 import datetime
+import time
 import uuid
-from sqlmodel import Field, select, delete, SQLModel, desc
-from sqlalchemy import case, func, literal, Float, text, bindparam, UUID as SA_UUID
+from sqlmodel import Field, select, delete, SQLModel, desc, col, exists
+from sqlalchemy import (
+    case,
+    func,
+    literal,
+    column,
+    Float,
+    String,
+    Date,
+    Boolean,
+    text,
+    bindparam,
+    insert,
+    update,
+    over,
+    UUID as SA_UUID,
+)
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.sql import Select
 from sqlalchemy.sql.elements import ColumnElement
 from sqlalchemy.sql.expression import literal_column
 from sqlalchemy.sql.operators import (
     is_not,
     is_,
-    icontains_op,
-    contains_op,
-    istartswith_op,
-    startswith_op,
     or_,
     and_,
 )
 import re
 
 
-from medlogserver.utils import get_db_type, get_now_datetime
-from medlogserver.db._session import get_async_session_context
+from medlogserver.utils import (
+    get_db_type,
+    get_now_datetime,
+    normalize_search_text,
+    normalize_search_text_pg_sql,
+)
+from medlogserver.db._session import (
+    get_async_session_context,
+    SQLITE_NORMALIZE_SEARCH_TEXT_FUNCTION,
+)
 from medlogserver.db.drug_data.drug_search._base import (
     MedLogDrugSearchEngineBase,
     MedLogSearchEngineResult,
+    tokenize_search_term,
 )
 from medlogserver.db._session import AsyncSession
+from medlogserver.db.drug_data.drug_search.search_result_cache import (
+    drug_search_result_cache,
+)
 
 from medlogserver.model.drug_data.drug_attr_field_definition import (
     DrugAttrFieldDefinition,
@@ -35,10 +61,8 @@ from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
 from medlogserver.db.drug_data.drug_dataset_version import DrugDataSetVersionCRUD
 from medlogserver.api.paginator import QueryParamsInterface, PaginatedResponse
 from medlogserver.model.drug_data.drug import DrugData
-from medlogserver.db.drug_data.drug import DrugCRUD
-from medlogserver.model.drug_data.drug_attr import DrugValRef
+from medlogserver.model.drug_data.drug_attr import DrugValRef, DrugValMultiRef
 from medlogserver.db.drug_data.drug_lov_values import DrugAttrFieldLovItemCRUD
-from medlogserver.model.drug_data.api_drug_model_factory import drug_to_drugAPI_obj
 from medlogserver.db.drug_data.importers import DRUG_IMPORTERS
 from medlogserver.config import Config
 from medlogserver.log import get_logger
@@ -63,6 +87,14 @@ class GenericSQLDrugSearchState(SQLModel, table=True):
     )
     index_item_count: Optional[int] = Field(default=False)
     last_error: Optional[str] = Field(default=None)
+    index_build_partition_count: Optional[int] = Field(
+        default=None,
+        description="Number of drug id ranges the current/last index build aggregates separately (see `DRUG_SEARCH_INDEX_BUILD_PARTITIONS`)",
+    )
+    index_build_partitions_done: Optional[int] = Field(
+        default=None,
+        description="Progress of the current/last index build. Count of id ranges that are already written to the shadow table.",
+    )
 
 
 class GenericSQLDrugSearchCache(SQLModel, table=True):
@@ -76,19 +108,40 @@ class GenericSQLDrugSearchCache(SQLModel, table=True):
         description="one to one relation to a drug",
     )
     search_index_content: str = Field(
-        index=True,
-        description="All searchable fields and ref_fields (values and display) aggregated into one indexed string",
+        description="All searchable fields and ref_fields (values and display) aggregated into one string",
     )
     search_cache_codes: str = Field(
-        index=True,
-        description="All drug codes aggregated into one indexed string",
+        description="All drug codes aggregated into one string",
+    )
+    search_index_content_normalized: str = Field(
+        default="",
+        description="`search_index_content` lower cased, umlaut/ß normalized and whitespace collapsed (see `normalize_search_text()`). Search terms are normalized the same way, so matching needs no per row string functions.",
+    )
+    search_cache_codes_normalized: str = Field(
+        default="",
+        description="`search_cache_codes` normalized like `search_index_content_normalized`",
     )
     market_exit_date: Optional[datetime.date] = Field(default=None)
     is_custom_drug: bool = Field(default=False)
 
 
+class GenericSQLDrugSearchCacheShadow(SQLModel, table=True):
+    __tablename__ = "drug_search_generic_sql_cache_shadow"
+    __table_args__ = {
+        "comment": "Next generation of `drug_search_generic_sql_cache` while an index rebuild is running. Empty otherwise. Swapped with `drug_search_generic_sql_cache` by renaming, so both tables must have the same structure."
+    }
+    id: uuid.UUID = Field(primary_key=True, foreign_key="drug.id")
+    search_index_content: str
+    search_cache_codes: str
+    search_index_content_normalized: str = Field(default="")
+    search_cache_codes_normalized: str = Field(default="")
+    market_exit_date: Optional[datetime.date] = Field(default=None)
+    is_custom_drug: bool = Field(default=False)
+
+
 class GenericSQLDrugSearchEngine(MedLogDrugSearchEngineBase):
     description: str = "'Build-in' search engine. Works with every SQL Database. Does not need any additional setup. Maybe perfoms poor concerning speed and result quality."
+    prefix_refinement: bool = True
 
     def __init__(
         self,
@@ -188,12 +241,17 @@ class GenericSQLDrugSearchEngine(MedLogDrugSearchEngineBase):
         await self._save_state(state)
         try:
             log.info("Build drug search index...")
+            # The expensive aggregation goes into the shadow tables. The current index generation keeps serving searches meanwhile.
+            async with get_async_session_context() as session:
+                await self._build_shadow_index(session=session)
+                await session.commit()
+            # Swap the new generation in. Concurrent searches see the old generation until the commit.
             async with get_async_session_context() as session:
-                await self._clear_cache(session=session)
-                await session.flush()
                 await self._build_index(session=session)
-                # flush content, so we can count it.
-                await session.flush()
+                await session.commit()
+            # The shadow tables hold the previous generation now
+            async with get_async_session_context() as session:
+                await self._clear_shadow_index(session=session)
                 index_item_count = await self._count_cache_items(session=session)
                 log.debug(f"Index build up index_item_count: {index_item_count}")
                 await session.commit()
@@ -217,12 +275,11 @@ class GenericSQLDrugSearchEngine(MedLogDrugSearchEngineBase):
         state.index_item_count = index_item_count
         state.last_error = None
         await self._save_state(state)
+        drug_search_result_cache.invalidate()
 
-    async def _clear_cache(self, session: AsyncSession, skip_commit: bool = True):
-        statement = delete(GenericSQLDrugSearchCache)
-        await session.exec(statement)
-        if not skip_commit:
-            session.commit()
+    async def _clear_shadow_index(self, session: AsyncSession):
+        """Remove the index generation in the shadow tables. That is a leftover of an aborted build or the previous generation after a swap."""
+        await session.exec(delete(GenericSQLDrugSearchCacheShadow))
 
     async def _count_cache_items(self, session: AsyncSession) -> int:
         query = select(func.count(GenericSQLDrugSearchCache.id))
@@ -268,9 +325,120 @@ class GenericSQLDrugSearchEngine(MedLogDrugSearchEngineBase):
         # Remove the symbols
         return re.sub(pattern, "", text)
 
-    async def _build_index(
-        self, session: AsyncSession, skip_commit: bool = True, batch_size: int = 100000
+    def _get_index_tables(self) -> List[Tuple[str, str]]:
+        """(table, shadow table) name pairs, that hold the current and the next index generation."""
+        return [
+            (
+                GenericSQLDrugSearchCache.__tablename__,
+                GenericSQLDrugSearchCacheShadow.__tablename__,
+            )
+        ]
+
+    async def _build_index(self, session: AsyncSession):
+        """Swap the new index generation from the shadow tables in by renaming the tables. That does not depend on the index size.
+        Custom drugs that were added to the previous generation while the shadow tables were build are copied over.
+        """
+        for table_name, shadow_table_name in self._get_index_tables():
+            await self._swap_table_names(session, table_name, shadow_table_name)
+        # The tables are renamed now. `GenericSQLDrugSearchCacheShadow` holds the previous generation.
+        previous_generation_columns = [
+            GenericSQLDrugSearchCacheShadow.id,
+            GenericSQLDrugSearchCacheShadow.search_index_content,
+            GenericSQLDrugSearchCacheShadow.search_cache_codes,
+            GenericSQLDrugSearchCacheShadow.search_index_content_normalized,
+            GenericSQLDrugSearchCacheShadow.search_cache_codes_normalized,
+            GenericSQLDrugSearchCacheShadow.market_exit_date,
+            GenericSQLDrugSearchCacheShadow.is_custom_drug,
+        ]
+        await session.execute(
+            insert(GenericSQLDrugSearchCache).from_select(
+                [c.key for c in previous_generation_columns],
+                select(*previous_generation_columns).where(
+                    GenericSQLDrugSearchCacheShadow.is_custom_drug == True,
+                    GenericSQLDrugSearchCacheShadow.id.not_in(
+                        select(GenericSQLDrugSearchCache.id)
+                    ),
+                ),
+            )
+        )
+
+    async def _swap_table_names(
+        self, session: AsyncSession, table_name: str, shadow_table_name: str
     ):
+        """Swap the names of two tables. Indexes and constraints move with their table.
+
+        On PostgreSQL index and constraint names embed the table name. They are renamed as well,
+        otherwise recreating the shadow table (e.g. by a migration) would clash with the names now used by the other table.
+        SQLite has no named constraints and renames the automatic indexes itself. Other indexes can not be renamed there,
+        the swapped tables must not have any.
+        """
+        is_pg = get_db_type(config.SQL_DATABASE_URL) == "postgres"
+        if is_pg:
+            constraints_and_indexes = {
+                name: await self._get_pg_constraint_and_index_names(session, name)
+                for name in (table_name, shadow_table_name)
+            }
+        swap_table_name = f"{table_name}_swap"
+        for old_name, new_name in [
+            (table_name, swap_table_name),
+            (shadow_table_name, table_name),
+            (swap_table_name, shadow_table_name),
+        ]:
+            await session.execute(text(f"ALTER TABLE {old_name} RENAME TO {new_name}"))
+        if not is_pg:
+            return
+        new_table_names = {table_name: shadow_table_name, shadow_table_name: table_name}
+        # (rename statement template, current name, new name)
+        renames: List[Tuple[str, str, str]] = []
+        for old_table_name, (constraints, indexes) in constraints_and_indexes.items():
+            new_table_name = new_table_names[old_table_name]
+            for name in constraints:
+                renames.append(
+                    (
+                        f'ALTER TABLE {new_table_name} RENAME CONSTRAINT "{{}}" TO "{{}}"',
+                        name,
+                        name.replace(old_table_name, new_table_name, 1),
+                    )
+                )
+            for name in indexes:
+                renames.append(
+                    (
+                        'ALTER INDEX "{}" RENAME TO "{}"',
+                        name,
+                        name.replace(old_table_name, new_table_name, 1),
+                    )
+                )
+        # Park all names first. The new name of an object may still be used by an object of the other table.
+        for parking_no, (statement, name, new_name) in enumerate(renames):
+            await session.execute(text(statement.format(name, f"medlog_swap_{parking_no}")))
+        for parking_no, (statement, name, new_name) in enumerate(renames):
+            await session.execute(
+                text(statement.format(f"medlog_swap_{parking_no}", new_name))
+            )
+
+    async def _get_pg_constraint_and_index_names(
+        self, session: AsyncSession, table_name: str
+    ) -> Tuple[List[str], List[str]]:
+        """Names of the constraints of a PostgreSQL table and of its indexes that do not belong to a constraint.
+        Renaming a primary key or unique constraint renames its index as well."""
+        constraints = await session.execute(
+            text(
+                "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:table_name AS regclass)"
+            ),
+            {"table_name": table_name},
+        )
+        indexes = await session.execute(
+            text(
+                "SELECT index_class.relname FROM pg_index\n"
+                "JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid\n"
+                "WHERE pg_index.indrelid = CAST(:table_name AS regclass)\n"
+                "  AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE pg_constraint.conindid = pg_index.indexrelid)"
+            ),
+            {"table_name": table_name},
+        )
+        return list(constraints.scalars().all()), list(indexes.scalars().all())
+
+    async def _build_shadow_index(self, session: AsyncSession):
         target_drug_dataset_version = await self._get_current_dataset_version()
         custom_drugs_dataset = await self._get_custom_drugs_dataset_version()
         if custom_drugs_dataset is None:
@@ -284,48 +452,221 @@ class GenericSQLDrugSearchEngine(MedLogDrugSearchEngineBase):
             f"INDEX BUILD UP custom_drugs_dataset: {custom_drugs_dataset.id} {type(custom_drugs_dataset.id)}"
         )
 
-        drug_count_query = (
-            select(func.count())
-            .select_from(DrugData)
-            .where(
-                or_(
-                    DrugData.source_dataset_id == target_drug_dataset_version.id,
-                    DrugData.source_dataset_id == custom_drugs_dataset.id,
-                )
-            )
+        dataset_filter = or_(
+            DrugData.source_dataset_id == target_drug_dataset_version.id,
+            DrugData.source_dataset_id == custom_drugs_dataset.id,
         )
+        drug_count_query = select(func.count()).select_from(DrugData).where(dataset_filter)
         results = await session.exec(statement=drug_count_query)
         total_drug_count = results.first()
         log.info(
             f"[INDEX BUILD UP] Start building index for {total_drug_count} drug db entries."
         )
 
-        all_defs = await self._get_all_drug_attr_definitions_fields()
-        searchable_attrs = [f.field_name for f in all_defs.get("attrs", []) if f.searchable]
-        searchable_multi = [f.field_name for f in all_defs.get("attrs_multi", []) if f.searchable]
-        searchable_ref = [f.field_name for f in all_defs.get("attrs_ref", []) if f.searchable]
-        searchable_multi_ref = [f.field_name for f in all_defs.get("attrs_multi_ref", []) if f.searchable]
-
-        is_pg = get_db_type(config.SQL_DATABASE_URL) == "postgres"
-        sql = self._build_index_insert_sql(
-            searchable_attrs=searchable_attrs,
-            searchable_multi=searchable_multi,
-            searchable_ref=searchable_ref,
-            searchable_multi_ref=searchable_multi_ref,
-            is_pg=is_pg,
+        partition_count = max(
+            1, min(config.DRUG_SEARCH_INDEX_BUILD_PARTITIONS, total_drug_count)
+        )
+        if partition_count > 1:
+            partition_start_ids = await self._get_partition_start_ids(
+                session,
+                dataset_filter=dataset_filter,
+                total_drug_count=total_drug_count,
+                partition_count=partition_count,
+            )
+            partition_count = len(partition_start_ids)
+        # The progress is written on another connection. SQLite allows only one transaction at a time to write.
+        await session.commit()
+        await self._set_index_build_progress(
+            partition_count=partition_count, partitions_done=0
         )
+        await self._clear_shadow_index(session=session)
+        if partition_count > 1:
+            await session.commit()
+            await self._build_shadow_index_partitioned(
+                partition_start_ids=partition_start_ids
+            )
+            return
         log.debug("[INDEX BUILD UP] Running INSERT...SELECT aggregation in database...")
+        start_time = time.monotonic()
         await session.execute(
-            text(sql).bindparams(
-                bindparam("version_id", type_=SA_UUID()),
-                bindparam("custom_id", type_=SA_UUID()),
+            await self._get_index_aggregation_statement(insert_into_cache=True)
+        )
+        await session.commit()
+        log.info(
+            f"[INDEX BUILD UP] Aggregation complete ({time.monotonic() - start_time:.1f}s)."
+        )
+        await self._set_index_build_progress(partitions_done_increment=1)
+
+    async def _get_partition_start_ids(
+        self,
+        session: AsyncSession,
+        dataset_filter: ColumnElement,
+        total_drug_count: int,
+        partition_count: int,
+    ) -> List[uuid.UUID]:
+        """Split the drugs into `partition_count` id ranges of (nearly) the same size. Returns the first drug id of each range."""
+        partition_size = -(-total_drug_count // partition_count)
+        numbered_drugs = (
+            select(
+                DrugData.id,
+                (over(func.row_number(), order_by=DrugData.id) - 1).label("row_no"),
+            )
+            .where(dataset_filter)
+            .subquery()
+        )
+        query = (
+            select(numbered_drugs.c.id)
+            .where(numbered_drugs.c.row_no % partition_size == 0)
+            .order_by(numbered_drugs.c.id)
+        )
+        results = await session.exec(query)
+        return list(results.all())
+
+    async def _build_shadow_index_partitioned(
+        self, partition_start_ids: List[uuid.UUID]
+    ):
+        """Aggregate each id range on its own connection and in its own transaction into the shadow table.
+
+        On PostgreSQL up to `DRUG_SEARCH_INDEX_BUILD_PARALLEL_CONNECTIONS` ranges are aggregated at the same time.
+        SQLite allows only one writer at a time, the ranges are build one after the other there.
+        """
+        partition_count = len(partition_start_ids)
+        parallel_connections = 1
+        if get_db_type(config.SQL_DATABASE_URL) == "postgres":
+            parallel_connections = max(
+                1, config.DRUG_SEARCH_INDEX_BUILD_PARALLEL_CONNECTIONS
+            )
+        log.info(
+            f"[INDEX BUILD UP] Aggregate {partition_count} drug id ranges with {min(parallel_connections, partition_count)} parallel connection(s)..."
+        )
+        connection_slots = asyncio.Semaphore(parallel_connections)
+        start_time = time.monotonic()
+        async with asyncio.TaskGroup() as task_group:
+            for partition_no, id_range_start in enumerate(partition_start_ids):
+                id_range_end = (
+                    partition_start_ids[partition_no + 1]
+                    if partition_no + 1 < partition_count
+                    else None
+                )
+                task_group.create_task(
+                    self._build_shadow_index_partition(
+                        partition_no=partition_no,
+                        partition_count=partition_count,
+                        id_range_start=id_range_start,
+                        id_range_end=id_range_end,
+                        connection_slots=connection_slots,
+                    )
+                )
+        log.info(
+            f"[INDEX BUILD UP] Aggregation of {partition_count} drug id ranges complete ({time.monotonic() - start_time:.1f}s)."
+        )
+
+    async def _build_shadow_index_partition(
+        self,
+        partition_no: int,
+        partition_count: int,
+        id_range_start: uuid.UUID,
+        id_range_end: Optional[uuid.UUID],
+        connection_slots: asyncio.Semaphore,
+    ):
+        async with connection_slots:
+            start_time = time.monotonic()
+            statement = await self._get_index_aggregation_statement(
+                insert_into_cache=True,
+                id_range_start=id_range_start,
+                id_range_end=id_range_end,
+            )
+            async with get_async_session_context() as session:
+                result = await session.execute(statement)
+                await session.commit()
+            log.info(
+                f"[INDEX BUILD UP] Drug id range {partition_no + 1}/{partition_count}: "
+                f"{result.rowcount} drugs aggregated ({time.monotonic() - start_time:.1f}s)."
+            )
+        await self._set_index_build_progress(partitions_done_increment=1)
+
+    async def _set_index_build_progress(
+        self,
+        partition_count: Optional[int] = None,
+        partitions_done: Optional[int] = None,
+        partitions_done_increment: int = 0,
+    ):
+        """Report the index build progress to `GenericSQLDrugSearchState`. Increments are atomic, partitions may finish concurrently."""
+        values = {}
+        if partition_count is not None:
+            values["index_build_partition_count"] = partition_count
+        if partitions_done is not None:
+            values["index_build_partitions_done"] = partitions_done
+        if partitions_done_increment:
+            values["index_build_partitions_done"] = (
+                func.coalesce(GenericSQLDrugSearchState.index_build_partitions_done, 0)
+                + partitions_done_increment
+            )
+        async with get_async_session_context() as session:
+            await session.exec(update(GenericSQLDrugSearchState).values(**values))
+            await session.commit()
+
+    async def _get_searchable_field_names(
+        self,
+    ) -> Dict[DrugAttrTypeName, List[str]]:
+        all_defs = await self._get_all_drug_attr_definitions_fields()
+        return {
+            attr_type_name: [f.field_name for f in all_defs.get(attr_type_name, []) if f.searchable]
+            for attr_type_name in ["attrs", "attrs_multi", "attrs_ref", "attrs_multi_ref"]
+        }
+
+    async def _get_index_aggregation_statement(
+        self,
+        insert_into_cache: bool = False,
+        id_range_start: Optional[uuid.UUID] = None,
+        id_range_end: Optional[uuid.UUID] = None,
+    ) -> TextClause:
+        """Statement that aggregates the search content of all drugs of the current and the custom drugs dataset.
+
+        Args:
+            insert_into_cache (bool, optional): If True the aggregated rows are written into the shadow table `drug_search_generic_sql_cache_shadow`. If False the statement just selects the rows
+                (id, search_index_content, search_cache_codes, market_exit_date, is_custom_drug). Defaults to False.
+            id_range_start (Optional[uuid.UUID], optional): Only aggregate drugs with this or a greater id. Defaults to None.
+            id_range_end (Optional[uuid.UUID], optional): Only aggregate drugs with an id less than this. Defaults to None.
+        """
+        target_drug_dataset_version = await self._get_current_dataset_version()
+        custom_drugs_dataset = await self._get_custom_drugs_dataset_version()
+        searchable_field_names = await self._get_searchable_field_names()
+        sql_params = dict(
+            searchable_attrs=searchable_field_names["attrs"],
+            searchable_multi=searchable_field_names["attrs_multi"],
+            searchable_ref=searchable_field_names["attrs_ref"],
+            searchable_multi_ref=searchable_field_names["attrs_multi_ref"],
+            is_pg=get_db_type(config.SQL_DATABASE_URL) == "postgres",
+            id_range_start=id_range_start is not None,
+            id_range_end=id_range_end is not None,
+        )
+        if insert_into_cache:
+            sql = self._build_index_insert_sql(**sql_params)
+        else:
+            sql = self._build_index_select_sql(**sql_params)
+        params = [
+            bindparam(
+                "version_id", value=target_drug_dataset_version.id, type_=SA_UUID()
             ),
-            {
-                "version_id": target_drug_dataset_version.id,
-                "custom_id": custom_drugs_dataset.id,
-            },
+            bindparam("custom_id", value=custom_drugs_dataset.id, type_=SA_UUID()),
+        ]
+        if id_range_start is not None:
+            params.append(
+                bindparam("id_range_start", value=id_range_start, type_=SA_UUID())
+            )
+        if id_range_end is not None:
+            params.append(bindparam("id_range_end", value=id_range_end, type_=SA_UUID()))
+        statement = text(sql).bindparams(*params)
+        if insert_into_cache:
+            return statement
+        return statement.columns(
+            column("id", SA_UUID()),
+            column("search_index_content", String()),
+            column("search_cache_codes", String()),
+            column("market_exit_date", Date()),
+            column("is_custom_drug", Boolean()),
         )
-        log.info("[INDEX BUILD UP] Aggregation complete.")
 
     def _build_index_insert_sql(
         self,
@@ -334,11 +675,59 @@ class GenericSQLDrugSearchEngine(MedLogDrugSearchEngineBase):
         searchable_ref: List[str],
         searchable_multi_ref: List[str],
         is_pg: bool,
+        id_range_start: bool = False,
+        id_range_end: bool = False,
+    ) -> str:
+        """Build an INSERT...SELECT that populates the shadow search cache entirely in SQL.
+
+        No data ever leaves the database server.
+        """
+        return (
+            f"INSERT INTO {GenericSQLDrugSearchCacheShadow.__tablename__}\n"
+            "    (id, search_index_content, search_cache_codes, search_index_content_normalized, search_cache_codes_normalized, market_exit_date, is_custom_drug)\n"
+            "SELECT\n"
+            "    id,\n"
+            "    search_index_content,\n"
+            "    search_cache_codes,\n"
+            "    " + self._normalize_search_text_sql("search_index_content", is_pg=is_pg) + ",\n"
+            "    " + self._normalize_search_text_sql("search_cache_codes", is_pg=is_pg) + ",\n"
+            "    market_exit_date,\n"
+            "    is_custom_drug\n"
+            "FROM (\n"
+            + self._build_index_select_sql(
+                searchable_attrs=searchable_attrs,
+                searchable_multi=searchable_multi,
+                searchable_ref=searchable_ref,
+                searchable_multi_ref=searchable_multi_ref,
+                is_pg=is_pg,
+                id_range_start=id_range_start,
+                id_range_end=id_range_end,
+            )
+            + ") AS aggregated\n"
+        )
+
+    def _normalize_search_text_sql(self, col_expr: str, is_pg: bool) -> str:
+        """SQL counterpart of `normalize_search_text()` for the index build."""
+        if is_pg:
+            return normalize_search_text_pg_sql(col_expr)
+        # SQLite's LOWER() only handles ASCII chars. `normalize_search_text()` itself is registered on every SQLite connection.
+        return SQLITE_NORMALIZE_SEARCH_TEXT_FUNCTION + "(" + col_expr + ")"
+
+    def _build_index_select_sql(
+        self,
+        searchable_attrs: List[str],
+        searchable_multi: List[str],
+        searchable_ref: List[str],
+        searchable_multi_ref: List[str],
+        is_pg: bool,
+        id_range_start: bool = False,
+        id_range_end: bool = False,
     ) -> str:
-        """Build an INSERT...SELECT that populates the search cache entirely in SQL.
+        """Build the SELECT that aggregates the search content of every drug.
 
         Uses CTEs to aggregate each attribute category, then joins them all onto the
-        drug table in one pass. No data ever leaves the database server.
+        drug table in one pass. `id_range_start`/`id_range_end` limit it to the drugs with an id
+        in the range of the bind params `:id_range_start` (inclusive) and `:id_range_end` (exclusive).
         """
 
         def _quoted_names(names: List[str]) -> str:
@@ -349,9 +738,16 @@ class GenericSQLDrugSearchEngine(MedLogDrugSearchEngineBase):
                 return "STRING_AGG(" + col_expr + ", " + sep + ")"
             return "GROUP_CONCAT(" + col_expr + ", " + sep + ")"
 
+        id_range_sql = ""
+        if id_range_start:
+            id_range_sql += " AND id >= :id_range_start"
+        if id_range_end:
+            id_range_sql += " AND id < :id_range_end"
         ctes: List[str] = [
             "filtered_drugs AS (\n"
-            "    SELECT id FROM drug WHERE source_dataset_id IN (:version_id, :custom_id)\n"
+            "    SELECT id FROM drug WHERE source_dataset_id IN (:version_id, :custom_id)"
+            + id_range_sql
+            + "\n"
             ")"
         ]
         joins: List[str] = []
@@ -465,13 +861,11 @@ class GenericSQLDrugSearchEngine(MedLogDrugSearchEngineBase):
         joins_sql = "\n    ".join(joins)
 
         return (
-            "INSERT INTO drug_search_generic_sql_cache\n"
-            "    (id, search_index_content, search_cache_codes, market_exit_date, is_custom_drug)\n"
             "WITH " + ctes_sql + "\n"
             "SELECT\n"
             "    d.id,\n"
-            "    " + content_expr + ",\n"
-            "    COALESCE(ac.agg_codes, ''),\n"
+            "    " + content_expr + " AS search_index_content,\n"
+            "    COALESCE(ac.agg_codes, '') AS search_cache_codes,\n"
             "    d.market_exit_date,\n"
             "    d.is_custom_drug\n"
             "FROM drug d\n"
@@ -553,21 +947,32 @@ class GenericSQLDrugSearchEngine(MedLogDrugSearchEngineBase):
             if field_values_aggregated
             else ""
         )
+        search_index_content = self.remove_trademark_symbols(field_values_aggregated)
+        search_cache_codes = "|".join(
+            [f"{c.code_system_id}:{c.code}" for c in drug.codes]
+        )
         return GenericSQLDrugSearchCache(
             id=drug.id,
-            search_index_content=self.remove_trademark_symbols(field_values_aggregated),
-            search_cache_codes="|".join(
-                [f"{c.code_system_id}:{c.code}" for c in drug.codes]
+            search_index_content=search_index_content,
+            search_cache_codes=search_cache_codes,
+            search_index_content_normalized=normalize_search_text(
+                search_index_content
             ),
+            search_cache_codes_normalized=normalize_search_text(search_cache_codes),
             market_exit_date=drug.market_exit_date,
             is_custom_drug=drug.is_custom_drug,
         )
 
     async def index_ready(self) -> bool:
+        # A rebuild fills the shadow table. The last completed generation keeps serving until it is swapped out.
+        state = await self._get_state()
+        return state.last_index_build_at is not None
+
+    async def index_generation(self) -> Optional[Tuple]:
         state = await self._get_state()
         return (
-            not state.index_build_up_in_process
-            and state.last_index_build_at is not None
+            state.last_index_build_based_on_drug_datasetversion_id,
+            state.last_index_build_at,
         )
 
     async def insert_drug_to_index(self, drug: DrugData):
@@ -647,186 +1052,176 @@ class GenericSQLDrugSearchEngine(MedLogDrugSearchEngineBase):
 
         return result
 
+    def _append_search_filters(
+        self,
+        query: Select,
+        market_accessable: Optional[bool] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+    ) -> Select:
+        """Restrict a query on `GenericSQLDrugSearchCache` by market access, reference value filters and drug ids."""
+        if drug_ids is not None:
+            query = query.where(col(GenericSQLDrugSearchCache.id).in_(drug_ids))
+        for filter_ref_field_name, filter_ref_value in (filter_ref_vals or {}).items():
+            # one semi join per filter. A drug has to match every filter, but each with another value row.
+            query = query.where(
+                or_(
+                    exists().where(
+                        DrugValRef.drug_id == GenericSQLDrugSearchCache.id,
+                        DrugValRef.field_name == str(filter_ref_field_name),
+                        DrugValRef.value == str(filter_ref_value),
+                    ),
+                    exists().where(
+                        DrugValMultiRef.drug_id == GenericSQLDrugSearchCache.id,
+                        DrugValMultiRef.field_name == str(filter_ref_field_name),
+                        DrugValMultiRef.value == str(filter_ref_value),
+                    ),
+                )
+            )
+        if market_accessable == True:
+            query = query.where(
+                or_(
+                    is_(GenericSQLDrugSearchCache.market_exit_date, None),
+                    GenericSQLDrugSearchCache.market_exit_date > datetime.date.today(),
+                )
+            )
+        if market_accessable == False:
+            query = query.where(
+                and_(
+                    is_not(GenericSQLDrugSearchCache.market_exit_date, None),
+                    GenericSQLDrugSearchCache.market_exit_date < datetime.date.today(),
+                )
+            )
+        return query
+
     def _scoring_token_appearance(
         self, search_term_token: str, content_column: ColumnElement
     ):
         pass
 
-    async def search(
-        self,
-        search_term: str = None,
-        market_accessable: Optional[bool] = None,
-        pagination: Optional[QueryParamsInterface] = None,
-        filter_ref_vals: Dict[str, int | str | bool] | None = None,
-    ) -> PaginatedResponse[MedLogSearchEngineResult]:
-        # clean empty string filters
-        log.debug(
-            f"filter_ref_vals in module {type(filter_ref_vals)} {filter_ref_vals}"
-        )
-        if filter_ref_vals is None:
-            filter_ref_vals = {}
-        filter_ref_vals = {
-            k: v for k, v in filter_ref_vals.items() if v != "" and v is not None
-        }
-        # normalize quotes
-        search_term = (
-            search_term.replace("'", '"')
-            .replace("`", '"')
-            .replace("´", '"')
-            .replace("„", '"')
-            .replace("“", '"')
-            .replace("‘", '"')
-        )
-        try:
-            search_term_tokens = shlex.split(search_term)
-        except ValueError:
-            # Unbalanced quotes, fixing
-            # ValueError("No closing quotation")
-            # auto-close the last quote type being used
-            if search_term.count('"') % 2 != 0:
-                search_term += '"'
-            search_term_tokens = shlex.split(search_term)
-        search_term_tokens = [token for token in search_term_tokens if len(token) > 2]
-        log.debug(f"search_term_tokens: {search_term_tokens}")
+    def _position(self, content_column: ColumnElement, fragment: str) -> ColumnElement:
+        """1-based position of `fragment` in the column, 0 if it does not contain it. A plain byte search without case folding.
+        Compare normalized fragments (`normalize_search_text()`) with the `*_normalized` columns for case-insensitive matches.
+        """
+        if get_db_type(config.SQL_DATABASE_URL) == "postgres":
+            return func.strpos(content_column, fragment)
+        return func.instr(content_column, fragment)
+
+    def _starts_with(self, content_column: ColumnElement, fragment: str) -> ColumnElement:
+        """Plain comparison of the column prefix. Unlike LIKE, it is case-sensitive in every database."""
+        return func.substr(content_column, 1, len(fragment)) == fragment
+
+    def _score_expression(
+        self, search_term: str, search_term_tokens: List[str]
+    ) -> ColumnElement:
+        """Relevance score of a `GenericSQLDrugSearchCache` row for the search term. A score of 0 means no match.
+
+        Case-insensitive matches compare the normalized search term with the normalized columns.
+        The search term is normalized here once, the rows were normalized at index build time.
+        """
+        content = GenericSQLDrugSearchCache.search_index_content
+        content_normalized = GenericSQLDrugSearchCache.search_index_content_normalized
+        codes_normalized = GenericSQLDrugSearchCache.search_cache_codes_normalized
+        search_term = search_term.replace('"', "")
+        search_term_normalized = normalize_search_text(search_term)
         # if a name starts with the exact search term we add 1.2 to the score
         # if the drug contains the whole search term cohesive it adds 1.1 to the search score.
         # if it also matches the case it adds 1.0 to the score
         score_cases = case(
             (
-                startswith_op(  # starts with case-sensitive
-                    GenericSQLDrugSearchCache.search_index_content,
-                    search_term.replace('"', ""),
-                ),
+                self._starts_with(content, search_term),  # starts with case-sensitive
                 2.3,
             ),
             (
-                istartswith_op(  # starts with non-case-sensitive
-                    GenericSQLDrugSearchCache.search_index_content,
-                    search_term.replace('"', ""),
+                self._starts_with(  # starts with non-case-sensitive
+                    content_normalized, search_term_normalized
                 ),
                 2.2,
             ),
             (
-                contains_op(
-                    GenericSQLDrugSearchCache.search_index_content,
-                    search_term.replace('"', ""),
-                ),
+                self._position(content, search_term) > 0,
                 1.1,
             ),
             (
-                icontains_op(
-                    GenericSQLDrugSearchCache.search_index_content,
-                    search_term.replace('"', ""),
-                ),
+                self._position(content_normalized, search_term_normalized) > 0,
                 1,
             ),
             else_=0,
         )
 
-        # Sum all positions
-        position_sum: ColumnElement = literal(0.0)
-        matched_count: ColumnElement = literal(0)
-
         for token_pos, search_token in enumerate(search_term_tokens):
             # if a drug contains one search token is add 0.1 to the score
             # if matches the case it add 0.2 to the score
-            # if search_term == search_token:
-            #    continue
             # first token (pos 0) gets the heighest weight of 1
             token_input_position_weight = max(0.2, 1.0 - (token_pos * 0.15))
+            search_token_normalized = normalize_search_text(search_token)
 
             log.debug(f"token: {search_token}")
             score_cases = score_cases.op("+")(
                 case(
                     (
-                        icontains_op(  # starts with case-sensitive
-                            GenericSQLDrugSearchCache.search_cache_codes,
-                            search_token,
-                        ),
+                        self._position(codes_normalized, search_token_normalized) > 0,
                         3.0,
                     ),
                     (
-                        startswith_op(  # starts with case-sensitive
-                            GenericSQLDrugSearchCache.search_index_content,
-                            search_token,
-                        ),
+                        self._starts_with(content, search_token),  # starts with case-sensitive
                         1.3 * token_input_position_weight,
                     ),
                     (
-                        istartswith_op(  # starts with non-case-sensitive
-                            GenericSQLDrugSearchCache.search_index_content,
-                            search_token,
+                        self._starts_with(  # starts with non-case-sensitive
+                            content_normalized, search_token_normalized
                         ),
                         1.2 * token_input_position_weight,
                     ),
                     (
-                        contains_op(
-                            GenericSQLDrugSearchCache.search_index_content,
-                            f" {search_token} ",
-                        ),
+                        self._position(content, f" {search_token} ") > 0,
                         0.6,
                     ),
                     (
-                        icontains_op(
-                            GenericSQLDrugSearchCache.search_index_content,
-                            f" {search_token} ",
-                        ),
+                        self._position(
+                            content_normalized, f" {search_token_normalized} "
+                        )
+                        > 0,
                         0.5,
                     ),
                     (
-                        contains_op(
-                            GenericSQLDrugSearchCache.search_index_content,
-                            f" {search_token}",
-                        ),
+                        self._position(content, f" {search_token}") > 0,
                         0.4,
                     ),
                     (
-                        icontains_op(
-                            GenericSQLDrugSearchCache.search_index_content,
-                            f" {search_token}",
-                        ),
+                        self._position(
+                            content_normalized, f" {search_token_normalized}"
+                        )
+                        > 0,
                         0.3,
                     ),
                     (
-                        contains_op(
-                            GenericSQLDrugSearchCache.search_index_content,
-                            f"{search_token} ",
-                        ),
+                        self._position(content, f"{search_token} ") > 0,
                         0.4,
                     ),
                     (
-                        icontains_op(
-                            GenericSQLDrugSearchCache.search_index_content,
-                            f"{search_token} ",
-                        ),
+                        self._position(
+                            content_normalized, f"{search_token_normalized} "
+                        )
+                        > 0,
                         0.3,
                     ),
                     (
-                        contains_op(
-                            GenericSQLDrugSearchCache.search_index_content, search_token
-                        ),
+                        self._position(content, search_token) > 0,
                         0.2,
                     ),
                     (
-                        icontains_op(
-                            GenericSQLDrugSearchCache.search_index_content, search_token
-                        ),
+                        self._position(content_normalized, search_token_normalized)
+                        > 0,
                         0.1,
                     ),
                     else_=0,
                 )
             )
             # we try to score the match position in the search content. Early macthes will get a bonus
-            if get_db_type(config.SQL_DATABASE_URL) != "postgres":
-                match_position_statement = func.instr(
-                    func.lower(GenericSQLDrugSearchCache.search_index_content),
-                    search_token.lower(),
-                )
-            else:
-                match_position_statement = func.strpos(
-                    func.lower(GenericSQLDrugSearchCache.search_index_content),
-                    search_token.lower(),
-                )
+            match_position_statement = self._position(
+                content_normalized, search_token_normalized
+            )
             # Adjust to control how quickly score drops off
             match_position_scale_factor: float = 20.0
             max_bonus = 1.0
@@ -847,76 +1242,153 @@ class GenericSQLDrugSearchEngine(MedLogDrugSearchEngineBase):
                 )
             )
 
+        return score_cases
+
+    async def search(
+        self,
+        search_term: str = None,
+        market_accessable: Optional[bool] = None,
+        pagination: Optional[QueryParamsInterface] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+    ) -> PaginatedResponse[MedLogSearchEngineResult]:
+        search_results, _ = await self.search_with_drug_ids(
+            search_term=search_term,
+            market_accessable=market_accessable,
+            pagination=pagination,
+            filter_ref_vals=filter_ref_vals,
+            drug_ids=drug_ids,
+        )
+        return search_results
+
+    async def search_with_drug_ids(
+        self,
+        search_term: str = None,
+        market_accessable: Optional[bool] = None,
+        pagination: Optional[QueryParamsInterface] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+        max_result_drug_ids: int = 0,
+    ) -> Tuple[PaginatedResponse[MedLogSearchEngineResult], Optional[List[uuid.UUID]]]:
+        query = self._build_search_query(
+            search_term=search_term,
+            market_accessable=market_accessable,
+            filter_ref_vals=filter_ref_vals,
+            drug_ids=drug_ids,
+        )
+        return await self._fetch_scored_page(
+            query, pagination=pagination, max_result_drug_ids=max_result_drug_ids
+        )
+
+    async def search_drug_ids(
+        self,
+        search_term: str = None,
+        market_accessable: Optional[bool] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+    ) -> List[uuid.UUID]:
+        query = self._build_search_query(
+            search_term=search_term,
+            market_accessable=market_accessable,
+            filter_ref_vals=filter_ref_vals,
+            drug_ids=drug_ids,
+        ).subquery()
+        async with get_async_session_context() as session:
+            result = await session.exec(select(query.c.id))
+            return result.all()
+
+    def _build_search_query(
+        self,
+        search_term: str = None,
+        market_accessable: Optional[bool] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+    ) -> Select:
+        """The query selecting `(GenericSQLDrugSearchCache.id, score)` of all matching drugs. Unordered and without pagination."""
+        # clean empty string filters
+        log.debug(
+            f"filter_ref_vals in module {type(filter_ref_vals)} {filter_ref_vals}"
+        )
+        if filter_ref_vals is None:
+            filter_ref_vals = {}
+        filter_ref_vals = {
+            k: v for k, v in filter_ref_vals.items() if v != "" and v is not None
+        }
+        search_term, search_term_tokens = tokenize_search_term(search_term)
+        log.debug(f"search_term_tokens: {search_term_tokens}")
+        score_cases = self._score_expression(search_term, search_term_tokens)
         query = select(
             GenericSQLDrugSearchCache.id,
             score_cases.label("score"),
         )
-        if filter_ref_vals:
-            query = query.join(
-                DrugData, onclause=GenericSQLDrugSearchCache.id == DrugData.id
-            ).join(DrugValRef)
-
-            for filter_ref_field_name, filter_ref_value in filter_ref_vals.items():
-                query = query.where(
-                    and_(
-                        DrugValRef.field_name == str(filter_ref_field_name),
-                        DrugValRef.value == str(filter_ref_value),
-                    )
-                )
-        if market_accessable == True:
-            query = query.where(
-                or_(
-                    is_(GenericSQLDrugSearchCache.market_exit_date, None),
-                    GenericSQLDrugSearchCache.market_exit_date > datetime.date.today(),
-                )
-            )
-        if market_accessable == False:
-            query = query.where(
-                and_(
-                    is_not(GenericSQLDrugSearchCache.market_exit_date, None),
-                    GenericSQLDrugSearchCache.market_exit_date < datetime.date.today(),
-                )
-            )
+        query = self._append_search_filters(
+            query,
+            market_accessable=market_accessable,
+            filter_ref_vals=filter_ref_vals,
+            drug_ids=drug_ids,
+        )
         query = query.where(score_cases > 0)
-        if pagination:
-            query = pagination.append_to_query(
-                query, ignore_limit=True, ignore_order_by=True
-            )
-        query = query.order_by(GenericSQLDrugSearchCache.is_custom_drug)
-        query = query.order_by(desc("score"))
-        query = query.order_by(GenericSQLDrugSearchCache.search_index_content)
+        return query
+
+    async def _fetch_scored_page(
+        self,
+        query: Select,
+        pagination: Optional[QueryParamsInterface] = None,
+        max_result_drug_ids: int = 0,
+    ) -> Tuple[PaginatedResponse[MedLogSearchEngineResult], Optional[List[uuid.UUID]]]:
+        """Run a search query selecting `(GenericSQLDrugSearchCache.id, score)` and hydrate the requested page.
+
+        Ordering, LIMIT and OFFSET are applied in the database. The total hit count comes from a `COUNT(*) OVER()`
+        window, so only the rows of the requested page are transferred, no matter how broad the search term is.
 
-        # log.debug(f"DRUG SEARCH QUERY: {query}")
+        With `max_result_drug_ids` the first `max_result_drug_ids + 1` rows are fetched instead and the page is cut out of them.
+        If that is the whole result, the ids of all found drugs are returned as well, otherwise `None`.
+        """
+        offset = pagination.offset if pagination and pagination.offset else 0
+        limit = pagination.limit if pagination else None
+        collect_drug_ids = (
+            max_result_drug_ids > 0
+            and limit is not None
+            and offset + limit <= max_result_drug_ids
+        )
+        paged_query = query.add_columns(over(func.count()).label("total_count"))
+        paged_query = paged_query.order_by(GenericSQLDrugSearchCache.is_custom_drug)
+        paged_query = paged_query.order_by(desc("score"))
+        paged_query = paged_query.order_by(
+            GenericSQLDrugSearchCache.search_index_content
+        )
+        if collect_drug_ids:
+            paged_query = paged_query.limit(max_result_drug_ids + 1)
+        elif pagination:
+            paged_query = pagination.append_to_query(
+                paged_query, ignore_order_by=True
+            )
+        # log.debug(f"DRUG SEARCH QUERY: {paged_query}")
+        result_drug_ids = None
         async with get_async_session_context() as session:
-            search_res = await session.exec(query)
-            drug_ids_with_score = search_res.all()
-
-            result_count = len(drug_ids_with_score)
-            if pagination.limit:
-                drug_ids_with_score = drug_ids_with_score[: pagination.limit]
-            async with DrugCRUD.crud_context(session=session) as drug_crud:
-                drug_crud: DrugCRUD = drug_crud  # typing hint help
-
-                drugs = await drug_crud.get_multiple(
-                    ids=[item[0] for item in drug_ids_with_score],
-                    keep_result_in_ids_order=True,
-                )
-                # i do not understand why i need to translate/cast Drug to DrugApiRead object by hand (via drug_to_drugAPI_obj) here because in the "list" endpoint pydantic does it for me... Todo: investigate
-                score_map = {item[0]: item[1] for item in drug_ids_with_score}
-                search_result_objs = [
-                    MedLogSearchEngineResult(
-                        drug_id=drug.id,
-                        drug=await drug_to_drugAPI_obj(drug),
-                        relevance_score=score_map[drug.id],
-                    )
-                    for drug in drugs
-                ]
-                return PaginatedResponse(
-                    total_count=result_count,
-                    count=len(drug_ids_with_score),
-                    offset=pagination.offset,
-                    items=search_result_objs,
+            search_res = await session.exec(paged_query)
+            rows = search_res.all()
+            if collect_drug_ids:
+                total_count = rows[0][2] if rows else 0
+                if total_count <= max_result_drug_ids:
+                    result_drug_ids = [row[0] for row in rows]
+                rows = rows[offset : offset + limit]
+            elif rows:
+                total_count = rows[0][2]
+            elif offset:
+                # the page is behind the last hit. The window count is not available, count explicit.
+                count_res = await session.exec(
+                    select(func.count()).select_from(query.subquery())
                 )
+                total_count = count_res.one()
+            else:
+                total_count = 0
+        search_results = await self._hydrate_search_results(
+            [(row[0], row[1]) for row in rows],
+            total_count=total_count,
+            offset=offset,
+        )
+        return search_results, result_drug_ids
 
     async def _get_state(self) -> GenericSQLDrugSearchState:
         state = None
@@ -0,0 +1,861 @@
+from typing import AsyncIterator, List, Dict, Optional, Set, Tuple, Iterable, Sequence
+from array import array
+from pathlib import Path
+import asyncio
+import contextlib
+import datetime
+import fcntl
+import hashlib
+import json
+import time
+import uuid
+from sqlmodel import select, col
+
+from medlogserver.db._session import get_async_session_context
+from medlogserver.db.drug_data.drug_search._base import (
+    MedLogDrugSearchEngineBase,
+    MedLogSearchEngineResult,
+    tokenize_search_term,
+)
+from medlogserver.db.drug_data.drug_search.search_module_generic_sql import (
+    GenericSQLDrugSearchEngine,
+    MAX_INDEXABLE_LENGTH,
+)
+from medlogserver.db.drug_data.drug_search.memory_index_snapshot import (
+    MappedDict,
+    MappedPostingLists,
+    MappedSequence,
+    MappedSetDict,
+    open_snapshot_file,
+    pack_postings,
+    pack_strings,
+    write_snapshot_file,
+)
+from medlogserver.db.drug_data.drug_search.search_result_cache import (
+    drug_search_result_cache,
+)
+from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
+from medlogserver.api.paginator import QueryParamsInterface, PaginatedResponse
+from medlogserver.model.drug_data.drug import DrugData
+from medlogserver.model.drug_data.drug_attr import DrugValRef, DrugValMultiRef
+from medlogserver.db.drug_data.drug import DrugCRUD
+from medlogserver.db.drug_data.drug_dataset_version import DrugDataSetVersionCRUD
+from medlogserver.config import Config
+from medlogserver.utils import normalize_search_text
+from medlogserver.log import get_logger
+
+log = get_logger(modulename="DRUG_SEARCH_INDEX")
+config = Config()
+
+# length of the n-grams the vocabulary of the index is split into.
+NGRAM_SIZE = 3
+# Custom drugs can be created via any API process. Other processes pick them up in this interval.
+CUSTOM_DRUGS_SYNC_INTERVAL_SEC = 60
+# Increase if the snapshot sections change. Snapshots of other versions are rebuild.
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_FILE_PREFIX = "drug_memory_index_"
+SNAPSHOT_FILE_SUFFIX = ".snapshot"
+# Held while a process builds and writes a snapshot. The lock file itself is never removed.
+SNAPSHOT_LOCK_FILE_NAME = f"{SNAPSHOT_FILE_PREFIX}build.lock"
+
+
+def _ref_val_key(field_name_and_value: Tuple[str, str]) -> str:
+    return "\x1f".join(field_name_and_value)
+
+
+class DrugMemoryIndex:
+    """Inverted index over the aggregated drug search content, held in process memory.
+
+    The documents are the same strings the 'GenericSQLDrugSearch'-engine writes into `drug_search_generic_sql_cache`.
+    Every document is split into words and each word gets a posting list of the documents it appears in.
+    The words themselves are indexed by their n-grams. A (infix) search token therefore only has to be looked up in the
+    vocabulary, which grows much slower than the drug table, instead of being compared against every drug.
+    """
+
+    def __init__(self, dataset_version_id: uuid.UUID):
+        self.dataset_version_id = dataset_version_id
+        self.created_at = datetime.datetime.now()
+        # document store. The document number is the list index.
+        self.drug_ids: List[uuid.UUID] = []
+        self.contents: List[str] = []
+        # normalized with `normalize_search_text()` like `GenericSQLDrugSearchCache.search_index_content_normalized`
+        self.contents_normalized: List[str] = []
+        self.codes_normalized: List[str] = []
+        self.market_exit_dates: List[Optional[datetime.date]] = []
+        self.is_custom_drug: List[bool] = []
+        self.doc_no_by_drug_id: Dict[uuid.UUID, int] = {}
+        # vocabulary. The word id is the list index.
+        self.words: List[str] = []
+        self.word_ids: Dict[str, int] = {}
+        # word id -> sorted document numbers
+        self.word_postings: List[array] = []
+        # n-gram -> sorted word ids
+        self.ngram_postings: Dict[str, array] = {}
+        # (ref field name, ref value) -> document numbers
+        self.ref_val_postings: Dict[Tuple[str, str], Set[int]] = {}
+        # set if the index is mapped from a snapshot file (see `from_snapshot()`)
+        self.snapshot_generation: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.drug_ids)
+
+    def write_snapshot(self, path: Path, generation: str):
+        """Write a freshly build index to a snapshot file. Other processes map it with `from_snapshot()` instead of building the index again.
+
+        The vocabulary is stored sorted, the word ids are renumbered to the sort order, so words can be looked up by bisection.
+        """
+        doc_count = len(self.drug_ids)
+        word_order = sorted(range(len(self.words)), key=self.words.__getitem__)
+        renumbered_word_ids = array("I", bytes(4 * len(word_order)))
+        for new_word_id, word_id in enumerate(word_order):
+            renumbered_word_ids[word_id] = new_word_id
+        ngrams = sorted(self.ngram_postings)
+        ref_val_keys = sorted(self.ref_val_postings, key=_ref_val_key)
+        sections = {
+            "drug_ids": b"".join(drug_id.bytes for drug_id in self.drug_ids),
+            "drug_id_order": array(
+                "I", sorted(range(doc_count), key=lambda doc_no: self.drug_ids[doc_no].bytes)
+            ),
+            "market_exit_dates": array(
+                "i",
+                [
+                    market_exit_date.toordinal() if market_exit_date is not None else 0
+                    for market_exit_date in self.market_exit_dates
+                ],
+            ),
+            "is_custom_drug": bytes(self.is_custom_drug),
+        }
+        for name in ["contents", "contents_normalized", "codes_normalized"]:
+            sections[f"{name}_blob"], sections[f"{name}_offsets"] = pack_strings(
+                getattr(self, name)
+            )
+        sections["words_blob"], sections["words_offsets"] = pack_strings(
+            [self.words[word_id] for word_id in word_order]
+        )
+        sections["word_postings"], sections["word_postings_offsets"] = pack_postings(
+            [self.word_postings[word_id] for word_id in word_order]
+        )
+        sections["ngrams_blob"], sections["ngrams_offsets"] = pack_strings(ngrams)
+        sections["ngram_postings"], sections["ngram_postings_offsets"] = pack_postings(
+            [
+                sorted(renumbered_word_ids[word_id] for word_id in self.ngram_postings[ngram])
+                for ngram in ngrams
+            ]
+        )
+        sections["ref_val_keys_blob"], sections["ref_val_keys_offsets"] = pack_strings(
+            [_ref_val_key(key) for key in ref_val_keys]
+        )
+        sections["ref_val_postings"], sections["ref_val_postings_offsets"] = (
+            pack_postings([sorted(self.ref_val_postings[key]) for key in ref_val_keys])
+        )
+        write_snapshot_file(
+            path,
+            meta={
+                "dataset_version_id": str(self.dataset_version_id),
+                "generation": generation,
+                "created_at": self.created_at.isoformat(),
+            },
+            sections=sections,
+        )
+
+    @classmethod
+    def from_snapshot(cls, path: Path) -> "DrugMemoryIndex":
+        """Map an index snapshot read only. Documents added later (custom drugs) are kept in process memory on top of it."""
+        meta, sections = open_snapshot_file(path)
+        index = cls(dataset_version_id=uuid.UUID(meta["dataset_version_id"]))
+        index.created_at = datetime.datetime.fromisoformat(meta["created_at"])
+        index.snapshot_generation = meta["generation"]
+
+        drug_ids = sections["drug_ids"]
+        drug_id_order = sections["drug_id_order"]
+        market_exit_dates = sections["market_exit_dates"]
+        is_custom_drug = sections["is_custom_drug"]
+        doc_count = len(is_custom_drug)
+
+        def drug_id_bytes(doc_no: int) -> bytes:
+            return bytes(drug_ids[doc_no * 16 : (doc_no + 1) * 16])
+
+        index.drug_ids = MappedSequence(
+            doc_count, lambda doc_no: uuid.UUID(bytes=drug_id_bytes(doc_no))
+        )
+        for name in ["contents", "contents_normalized", "codes_normalized"]:
+            setattr(
+                index,
+                name,
+                MappedSequence.of_strings(
+                    sections[f"{name}_blob"], sections[f"{name}_offsets"]
+                ),
+            )
+        index.market_exit_dates = MappedSequence(
+            doc_count,
+            lambda doc_no: (
+                datetime.date.fromordinal(market_exit_dates[doc_no])
+                if market_exit_dates[doc_no]
+                else None
+            ),
+        )
+        index.is_custom_drug = MappedSequence(
+            doc_count, lambda doc_no: bool(is_custom_drug[doc_no])
+        )
+        index.doc_no_by_drug_id = MappedDict(
+            MappedSequence(
+                doc_count, lambda position: drug_id_bytes(drug_id_order[position])
+            ),
+            lambda position: drug_id_order[position],
+            encode_key=lambda drug_id: drug_id.bytes,
+        )
+        index.words = MappedSequence.of_strings(
+            sections["words_blob"], sections["words_offsets"]
+        )
+        # the word ids are the positions in the sorted vocabulary
+        index.word_ids = MappedDict(
+            MappedSequence.of_strings(sections["words_blob"], sections["words_offsets"]),
+            lambda position: position,
+        )
+        index.word_postings = MappedPostingLists(
+            sections["word_postings"], sections["word_postings_offsets"]
+        )
+        ngram_postings = MappedPostingLists(
+            sections["ngram_postings"], sections["ngram_postings_offsets"]
+        )
+        index.ngram_postings = MappedDict(
+            MappedSequence.of_strings(sections["ngrams_blob"], sections["ngrams_offsets"]),
+            lambda position: ngram_postings[position],
+        )
+        index.ref_val_postings = MappedSetDict(
+            MappedSequence.of_strings(
+                sections["ref_val_keys_blob"], sections["ref_val_keys_offsets"]
+            ),
+            MappedPostingLists(
+                sections["ref_val_postings"], sections["ref_val_postings_offsets"]
+            ),
+            encode_key=_ref_val_key,
+        )
+        return index
+
+    def add_document(
+        self,
+        drug_id: uuid.UUID,
+        search_index_content: str,
+        search_cache_codes: str,
+        market_exit_date: Optional[datetime.date],
+        is_custom_drug: bool,
+    ) -> int:
+        if drug_id in self.doc_no_by_drug_id:
+            return self.doc_no_by_drug_id[drug_id]
+        search_index_content = search_index_content or ""
+        search_cache_codes = search_cache_codes or ""
+        doc_no = len(self.drug_ids)
+        content_normalized = normalize_search_text(search_index_content)
+        codes_normalized = normalize_search_text(search_cache_codes)
+        self.drug_ids.append(drug_id)
+        self.contents.append(search_index_content)
+        self.contents_normalized.append(content_normalized)
+        self.codes_normalized.append(codes_normalized)
+        self.market_exit_dates.append(market_exit_date)
+        self.is_custom_drug.append(bool(is_custom_drug))
+        self.doc_no_by_drug_id[drug_id] = doc_no
+
+        words = set(content_normalized.split())
+        words.update(code for code in codes_normalized.split("|") if code)
+        for word in words:
+            word_id = self.word_ids.get(word)
+            if word_id is None:
+                word_id = self._add_word(word)
+            # documents are only appended, so posting lists stay sorted
+            self.word_postings[word_id].append(doc_no)
+        return doc_no
+
+    def add_ref_val(self, doc_no: int, field_name: str, value: str):
+        self.ref_val_postings.setdefault((field_name, str(value)), set()).add(doc_no)
+
+    def _add_word(self, word: str) -> int:
+        word_id = len(self.words)
+        self.words.append(word)
+        self.word_ids[word] = word_id
+        self.word_postings.append(array("I"))
+        for ngram in self._ngrams(word):
+            postings = self.ngram_postings.get(ngram)
+            if postings is None:
+                postings = array("I")
+                self.ngram_postings[ngram] = postings
+            postings.append(word_id)
+        return word_id
+
+    @staticmethod
+    def _ngrams(word: str) -> Set[str]:
+        return {word[i : i + NGRAM_SIZE] for i in range(len(word) - NGRAM_SIZE + 1)}
+
+    def _word_ids_containing(self, fragment: str) -> Iterable[int]:
+        if len(fragment) < NGRAM_SIZE:
+            # too short to be n-gram indexed. The vocabulary is small enough to be scanned.
+            return [
+                word_id for word_id, word in enumerate(self.words) if fragment in word
+            ]
+        postings = []
+        for ngram in self._ngrams(fragment):
+            ngram_postings = self.ngram_postings.get(ngram)
+            if ngram_postings is None:
+                return []
+            postings.append(ngram_postings)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for ngram_postings in postings[1:]:
+            candidates.intersection_update(ngram_postings)
+            if not candidates:
+                return []
+        # n-grams can match in the wrong order (e.g. "abcab" vs. "cabc"); verify.
+        return [word_id for word_id in candidates if fragment in self.words[word_id]]
+
+    def candidates(self, search_string_normalized: str) -> Set[int]:
+        """All documents that contain every whitespace separated fragment of the search string."""
+        result: Optional[Set[int]] = None
+        for fragment in search_string_normalized.split():
+            docs = set()
+            for word_id in self._word_ids_containing(fragment):
+                docs.update(self.word_postings[word_id])
+            result = docs if result is None else result & docs
+            if not result:
+                return set()
+        return result if result is not None else set()
+
+    def score(
+        self,
+        doc_no: int,
+        search_term: str,
+        search_term_tokens: List[str],
+        search_term_normalized: str,
+        search_term_tokens_normalized: List[str],
+    ) -> float:
+        """Scores a document with the same weights the 'GenericSQLDrugSearch'-engine uses in its SQL CASE expression,
+        so results rank the same with both engines. The `*_normalized` args are normalized with `normalize_search_text()`."""
+        content = self.contents[doc_no]
+        content_normalized = self.contents_normalized[doc_no]
+        codes_normalized = self.codes_normalized[doc_no]
+        score = 0.0
+        if content.startswith(search_term):
+            score += 2.3
+        elif content_normalized.startswith(search_term_normalized):
+            score += 2.2
+        elif search_term in content:
+            score += 1.1
+        elif search_term_normalized in content_normalized:
+            score += 1.0
+        for token_pos, (token, token_normalized) in enumerate(
+            zip(search_term_tokens, search_term_tokens_normalized)
+        ):
+            token_input_position_weight = max(0.2, 1.0 - (token_pos * 0.15))
+            if token_normalized in codes_normalized:
+                score += 3.0
+            elif content.startswith(token):
+                score += 1.3 * token_input_position_weight
+            elif content_normalized.startswith(token_normalized):
+                score += 1.2 * token_input_position_weight
+            elif f" {token} " in content:
+                score += 0.6
+            elif f" {token_normalized} " in content_normalized:
+                score += 0.5
+            elif f" {token}" in content:
+                score += 0.4
+            elif f" {token_normalized}" in content_normalized:
+                score += 0.3
+            elif f"{token} " in content:
+                score += 0.4
+            elif f"{token_normalized} " in content_normalized:
+                score += 0.3
+            elif token in content:
+                score += 0.2
+            elif token_normalized in content_normalized:
+                score += 0.1
+            # early matches in the search content get a bonus
+            match_position = content_normalized.find(token_normalized) + 1
+            if match_position > 0:
+                score += 1.0 / (1.0 + (match_position / 20.0))
+        return score
+
+    def search(
+        self,
+        search_term: str,
+        search_term_tokens: List[str],
+        market_accessable: Optional[bool] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+    ) -> List[Tuple[uuid.UUID, float]]:
+        """Returns all matching drug ids with their score in result order.
+        If `drug_ids` is given, only these drugs can match."""
+        search_term_normalized = normalize_search_text(search_term)
+        search_term_tokens_normalized = [
+            normalize_search_text(token) for token in search_term_tokens
+        ]
+        if search_term.strip() == "":
+            # every drug "starts with" an empty search term
+            candidates = set(range(len(self.drug_ids)))
+        else:
+            candidates = self.candidates(search_term_normalized)
+            for token_normalized in search_term_tokens_normalized:
+                candidates |= self.candidates(token_normalized)
+        if drug_ids is not None:
+            candidates &= {
+                self.doc_no_by_drug_id[drug_id]
+                for drug_id in drug_ids
+                if drug_id in self.doc_no_by_drug_id
+            }
+        for field_name, value in (filter_ref_vals or {}).items():
+            candidates &= self.ref_val_postings.get((str(field_name), str(value)), set())
+        if market_accessable is not None:
+            today = datetime.date.today()
+            if market_accessable:
+                candidates = {
+                    doc_no
+                    for doc_no in candidates
+                    if self.market_exit_dates[doc_no] is None
+                    or self.market_exit_dates[doc_no] > today
+                }
+            else:
+                candidates = {
+                    doc_no
+                    for doc_no in candidates
+                    if self.market_exit_dates[doc_no] is not None
+                    and self.market_exit_dates[doc_no] < today
+                }
+        scored = []
+        for doc_no in candidates:
+            score = self.score(
+                doc_no,
+                search_term,
+                search_term_tokens,
+                search_term_normalized,
+                search_term_tokens_normalized,
+            )
+            if score > 0:
+                scored.append((doc_no, score))
+        scored.sort(
+            key=lambda item: (
+                self.is_custom_drug[item[0]],
+                -item[1],
+                self.contents[item[0]],
+            )
+        )
+        return [(self.drug_ids[doc_no], score) for doc_no, score in scored]
+
+
+class _MemoryIndexHolder:
+    # The index lives on module level, because search engine instances are created per request.
+    index: Optional[DrugMemoryIndex] = None
+    build_in_process: bool = False
+    custom_drugs_synced_at: float = 0.0
+    background_task: Optional[asyncio.Task] = None
+
+
+_holder = _MemoryIndexHolder()
+
+
+class MemoryIndexDrugSearchEngine(MedLogDrugSearchEngineBase):
+    description: str = "Keeps an inverted n-gram index of all searchable drug data in the memory of every MedLog process. Search time does not grow with the size of the drug dataset. Needs some hundred MB RAM per process for large datasets and builds its index on the first search after a process start or a drug dataset update."
+
+    def __init__(
+        self,
+        engine_config: Dict | DrugDataSetVersion = None,
+    ):
+        # DrugSearch._preflight() hands over the active dataset version, we can save a query with it.
+        super().__init__(engine_config)
+        # We share the aggregation of the searchable drug data with the generic sql engine.
+        self._sql_engine = GenericSQLDrugSearchEngine()
+
+    async def disable(self):
+        _holder.index = None
+
+    async def _get_current_dataset_version(self) -> Optional[DrugDataSetVersion]:
+        if isinstance(self.engine_config, DrugDataSetVersion):
+            return self.engine_config
+        return await self._sql_engine._get_current_dataset_version()
+
+    async def build_index(self, force_rebuild: bool = False):
+        target_drug_dataset_version = await self._get_current_dataset_version()
+        if target_drug_dataset_version is None:
+            log.info(
+                "Skip build_index for 'MemoryIndexDrugSearchEngine'-Engine: "
+                "no active drug dataset version available yet (no drug data loaded)."
+            )
+            return
+        if _holder.build_in_process:
+            log.warning(
+                "Cancel build_index for 'MemoryIndexDrugSearchEngine'-Engine because build up is already in progress"
+            )
+            return
+        if (
+            _holder.index is not None
+            and _holder.index.dataset_version_id == target_drug_dataset_version.id
+            and not force_rebuild
+        ):
+            log.debug(
+                "Skip build_index for 'MemoryIndexDrugSearchEngine'-Engine because search index is up 2 date"
+            )
+            return
+        _holder.build_in_process = True
+        try:
+            index = None
+            if not force_rebuild:
+                index = await self._load_snapshot(target_drug_dataset_version)
+            if index is None:
+                lock_requested_at = time.time()
+                # Only one process builds the index, the others wait for its snapshot
+                async with self._snapshot_build_lock():
+                    index = await self._load_snapshot(
+                        target_drug_dataset_version,
+                        # a forced rebuild only takes a snapshot written while it waited for the lock
+                        written_after=lock_requested_at if force_rebuild else None,
+                    )
+                    if index is None:
+                        log.info("Build in-memory drug search index...")
+                        start_time = time.monotonic()
+                        index = await self._build_index(target_drug_dataset_version)
+                        log.info(
+                            f"...building in-memory drug search index done. Indexed {len(index)} drugs ({len(index.words)} words) in {time.monotonic() - start_time:.1f}s."
+                        )
+                        index = await self._write_snapshot(index)
+                        _holder.index = index
+                        _holder.custom_drugs_synced_at = time.monotonic()
+                        drug_search_result_cache.invalidate()
+                        return
+            # the old index keeps serving searches until here
+            _holder.index = index
+            # custom drugs created after the snapshot was written
+            await self._sync_custom_drugs()
+            drug_search_result_cache.invalidate()
+        finally:
+            _holder.build_in_process = False
+
+    @contextlib.asynccontextmanager
+    async def _snapshot_build_lock(self) -> AsyncIterator[None]:
+        """Exclusive lock on the snapshot directory across all MedLog processes (`flock`), held while building and writing a snapshot.
+        No lock without a snapshot directory, every process builds its own index then."""
+        if not config.DRUG_SEARCH_INDEX_SNAPSHOT_DIR:
+            yield
+            return
+        lock_path = Path(config.DRUG_SEARCH_INDEX_SNAPSHOT_DIR, SNAPSHOT_LOCK_FILE_NAME)
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        # Closing the file releases the lock, also if the process dies.
+        with open(lock_path, "a") as lock_file:
+            # flock blocks until the other process is done. Wait in a thread to keep the event loop running.
+            await asyncio.to_thread(fcntl.flock, lock_file.fileno(), fcntl.LOCK_EX)
+            yield
+
+    def _snapshot_path(self, dataset_version_id: uuid.UUID) -> Optional[Path]:
+        if not config.DRUG_SEARCH_INDEX_SNAPSHOT_DIR:
+            return None
+        return Path(
+            config.DRUG_SEARCH_INDEX_SNAPSHOT_DIR,
+            f"{SNAPSHOT_FILE_PREFIX}{dataset_version_id}{SNAPSHOT_FILE_SUFFIX}",
+        )
+
+    async def _snapshot_generation(self) -> str:
+        """Snapshots are only used with the same snapshot format and index content (searchable fields) they were written with."""
+        generation_params = [
+            SNAPSHOT_FORMAT_VERSION,
+            MAX_INDEXABLE_LENGTH,
+            await self._sql_engine._get_searchable_field_names(),
+        ]
+        return hashlib.sha256(
+            json.dumps(generation_params, sort_keys=True).encode()
+        ).hexdigest()[:16]
+
+    async def _load_snapshot(
+        self,
+        target_drug_dataset_version: DrugDataSetVersion,
+        written_after: Optional[float] = None,
+    ) -> Optional[DrugMemoryIndex]:
+        """Map the snapshot of the dataset version. None if there is no usable one or, with `written_after` (unix time), it is older."""
+        path = self._snapshot_path(target_drug_dataset_version.id)
+        if path is None or not path.exists():
+            return None
+        if written_after is not None and path.stat().st_mtime < written_after:
+            return None
+        try:
+            index = DrugMemoryIndex.from_snapshot(path)
+        except (OSError, ValueError, KeyError) as err:
+            log.warning(f"Ignore unreadable drug search index snapshot '{path}': {err!r}")
+            return None
+        if index.snapshot_generation != await self._snapshot_generation():
+            log.info(f"Drug search index snapshot '{path}' is outdated. Rebuild it.")
+            return None
+        log.info(
+            f"Mapped in-memory drug search index snapshot '{path}' ({len(index)} drugs, build at {index.created_at})."
+        )
+        return index
+
+    async def _write_snapshot(self, index: DrugMemoryIndex) -> DrugMemoryIndex:
+        """Write a new index to disk for other MedLog processes. Returns the mapped snapshot,
+        so this process shares the pages with them as well. Falls back to the given in-process index.
+        Must be called with the `_snapshot_build_lock()` held."""
+        path = self._snapshot_path(index.dataset_version_id)
+        if path is None:
+            return index
+        generation = await self._snapshot_generation()
+        try:
+            await asyncio.to_thread(index.write_snapshot, path, generation)
+            mapped_index = DrugMemoryIndex.from_snapshot(path)
+        except (OSError, ValueError) as err:
+            log.warning(
+                f"Writing drug search index snapshot '{path}' failed. Keep the index in process memory only: {err!r}"
+            )
+            return index
+        # snapshots of previous dataset versions. Processes that still map them keep their copy until they switch.
+        # The index of this process may be outdated itself, if a new dataset version got active during the build.
+        # Keep the snapshot of the active version, another process may have written it.
+        keep_paths = {path}
+        async with get_async_session_context() as session:
+            async with DrugDataSetVersionCRUD.crud_context(
+                session=session
+            ) as drug_dataset_crud:
+                drug_dataset_crud: DrugDataSetVersionCRUD = (
+                    drug_dataset_crud  # typing hint help
+                )
+                current_dataset_version = await drug_dataset_crud.get_current_active()
+        if current_dataset_version is not None:
+            keep_paths.add(self._snapshot_path(current_dataset_version.id))
+        for outdated_path in path.parent.glob(
+            f"{SNAPSHOT_FILE_PREFIX}*{SNAPSHOT_FILE_SUFFIX}"
+        ):
+            if outdated_path not in keep_paths:
+                outdated_path.unlink(missing_ok=True)
+        return mapped_index
+
+    async def _build_index(
+        self, target_drug_dataset_version: DrugDataSetVersion
+    ) -> DrugMemoryIndex:
+        custom_drugs_dataset = await self._sql_engine._get_custom_drugs_dataset_version()
+        if custom_drugs_dataset is None:
+            raise ValueError(
+                "Something went wrong. There is no custom drug dataset registered. This should not happen."
+            )
+        # make sure the aggregation runs against the same dataset version we label the index with.
+        self._sql_engine.current_dataset_version = target_drug_dataset_version
+        async with get_async_session_context() as session:
+            result = await session.execute(
+                await self._sql_engine._get_index_aggregation_statement()
+            )
+            drug_rows = result.all()
+            result = await session.execute(
+                select(DrugValRef.drug_id, DrugValRef.field_name, DrugValRef.value).where(
+                    col(DrugValRef.drug_id).in_(
+                        select(DrugData.id).where(
+                            col(DrugData.source_dataset_id).in_(
+                                [target_drug_dataset_version.id, custom_drugs_dataset.id]
+                            )
+                        )
+                    )
+                )
+            )
+            ref_val_rows = result.all()
+            result = await session.execute(
+                select(
+                    DrugValMultiRef.drug_id,
+                    DrugValMultiRef.field_name,
+                    DrugValMultiRef.value,
+                ).where(
+                    col(DrugValMultiRef.drug_id).in_(
+                        select(DrugData.id).where(
+                            col(DrugData.source_dataset_id).in_(
+                                [target_drug_dataset_version.id, custom_drugs_dataset.id]
+                            )
+                        )
+                    )
+                )
+            )
+            ref_val_rows += result.all()
+
+        def _fill_index() -> DrugMemoryIndex:
+            index = DrugMemoryIndex(dataset_version_id=target_drug_dataset_version.id)
+            for drug_id, content, codes, market_exit_date, is_custom_drug in drug_rows:
+                index.add_document(
+                    drug_id, content, codes, market_exit_date, is_custom_drug
+                )
+            for drug_id, field_name, value in ref_val_rows:
+                doc_no = index.doc_no_by_drug_id.get(drug_id)
+                if doc_no is not None and value is not None:
+                    index.add_ref_val(doc_no, field_name, value)
+            return index
+
+        # Filling the index is pure python work. Keep the event loop responsive for other requests meanwhile.
+        return await asyncio.to_thread(_fill_index)
+
+    async def _build_index_in_background(self):
+        try:
+            await self.build_index()
+        except Exception:
+            log.exception("Building in-memory drug search index failed")
+
+    async def _sync_custom_drugs_in_background(self):
+        try:
+            await self._sync_custom_drugs()
+        except Exception:
+            log.exception("Syncing custom drugs into in-memory drug search index failed")
+
+    async def _sync_custom_drugs(self):
+        """Add custom drugs that were created by other MedLog processes."""
+        _holder.custom_drugs_synced_at = time.monotonic()
+        index = _holder.index
+        if index is None:
+            return
+        custom_drugs_dataset = await self._sql_engine._get_custom_drugs_dataset_version()
+        async with get_async_session_context() as session:
+            result = await session.exec(
+                select(DrugData.id).where(
+                    DrugData.source_dataset_id == custom_drugs_dataset.id
+                )
+            )
+            missing_drug_ids = [
+                drug_id
+                for drug_id in result.all()
+                if drug_id not in index.doc_no_by_drug_id
+            ]
+            if not missing_drug_ids:
+                return
+            async with DrugCRUD.crud_context(session=session) as drug_crud:
+                drug_crud: DrugCRUD = drug_crud  # typing hint help
+                for drug in await drug_crud.get_multiple(ids=missing_drug_ids):
+                    await self.insert_drug_to_index(drug)
+        drug_search_result_cache.invalidate()
+
+    def _run_in_background(self, coro):
+        # keep a reference to the task, otherwise it may be garbage collected while running
+        _holder.background_task = asyncio.create_task(coro)
+
+    async def index_ready(self) -> bool:
+        target_drug_dataset_version = await self._get_current_dataset_version()
+        if target_drug_dataset_version is None:
+            return False
+        index = _holder.index
+        if (
+            index is None or index.dataset_version_id != target_drug_dataset_version.id
+        ) and not _holder.build_in_process:
+            self._run_in_background(self._build_index_in_background())
+        elif (
+            index is not None
+            and not _holder.build_in_process
+            and time.monotonic() - _holder.custom_drugs_synced_at
+            > CUSTOM_DRUGS_SYNC_INTERVAL_SEC
+        ):
+            self._run_in_background(self._sync_custom_drugs_in_background())
+        # An index of a previous dataset version keeps serving until the new one is ready.
+        return index is not None
+
+    async def index_generation(self) -> Optional[uuid.UUID]:
+        index = _holder.index
+        return index.dataset_version_id if index is not None else None
+
+    async def insert_drug_to_index(self, drug: DrugData):
+        """Adhoc insert a single drug into the index. this is needed for user defined custom drugs.
+
+        Args:
+            drug (Drug): _description_
+        """
+        index = _holder.index
+        if index is None:
+            # the drug will be part of the index when it is build.
+            return
+        cache_entry = await self._sql_engine._drug_to_cache_obj(drug)
+        doc_no = index.add_document(
+            drug.id,
+            cache_entry.search_index_content,
+            cache_entry.search_cache_codes,
+            cache_entry.market_exit_date,
+            cache_entry.is_custom_drug,
+        )
+        for attr_ref in drug.attrs_ref:
+            if attr_ref.value is not None:
+                index.add_ref_val(doc_no, attr_ref.field_name, attr_ref.value)
+        for attr_multi_ref in drug.attrs_multi_ref:
+            if attr_multi_ref.value is not None:
+                index.add_ref_val(
+                    doc_no, attr_multi_ref.field_name, attr_multi_ref.value
+                )
+
+    async def total_item_count(self) -> int:
+        # count of all items that are in the index.
+        if _holder.index is None:
+            return 0
+        return len(_holder.index)
+
+    async def search(
+        self,
+        search_term: str = None,
+        market_accessable: Optional[bool] = None,
+        pagination: Optional[QueryParamsInterface] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+    ) -> PaginatedResponse[MedLogSearchEngineResult]:
+        search_results, _ = await self.search_with_drug_ids(
+            search_term=search_term,
+            market_accessable=market_accessable,
+            pagination=pagination,
+            filter_ref_vals=filter_ref_vals,
+            drug_ids=drug_ids,
+        )
+        return search_results
+
+    async def search_with_drug_ids(
+        self,
+        search_term: str = None,
+        market_accessable: Optional[bool] = None,
+        pagination: Optional[QueryParamsInterface] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+        max_result_drug_ids: int = 0,
+    ) -> Tuple[PaginatedResponse[MedLogSearchEngineResult], Optional[List[uuid.UUID]]]:
+        drug_ids_with_score = self._search_index(
+            search_term=search_term,
+            market_accessable=market_accessable,
+            filter_ref_vals=filter_ref_vals,
+            drug_ids=drug_ids,
+        )
+        offset = pagination.offset if pagination and pagination.offset else 0
+        limit = pagination.limit if pagination else None
+        page = drug_ids_with_score[offset : offset + limit if limit else None]
+        result_drug_ids = None
+        if len(drug_ids_with_score) <= max_result_drug_ids:
+            result_drug_ids = [drug_id for drug_id, _ in drug_ids_with_score]
+        search_results = await self._hydrate_search_results(
+            page, total_count=len(drug_ids_with_score), offset=offset
+        )
+        return search_results, result_drug_ids
+
+    async def search_drug_ids(
+        self,
+        search_term: str = None,
+        market_accessable: Optional[bool] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+    ) -> List[uuid.UUID]:
+        return [
+            drug_id
+            for drug_id, _ in self._search_index(
+                search_term=search_term,
+                market_accessable=market_accessable,
+                filter_ref_vals=filter_ref_vals,
+                drug_ids=drug_ids,
+            )
+        ]
+
+    def _search_index(
+        self,
+        search_term: str = None,
+        market_accessable: Optional[bool] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+    ) -> List[Tuple[uuid.UUID, float]]:
+        if filter_ref_vals is None:
+            filter_ref_vals = {}
+        filter_ref_vals = {
+            k: v for k, v in filter_ref_vals.items() if v != "" and v is not None
+        }
+        search_term, search_term_tokens = tokenize_search_term(search_term)
+        log.debug(f"search_term_tokens: {search_term_tokens}")
+        return _holder.index.search(
+            search_term=search_term.replace('"', ""),
+            search_term_tokens=search_term_tokens,
+            market_accessable=market_accessable,
+            filter_ref_vals=filter_ref_vals,
+            drug_ids=drug_ids,
+        )
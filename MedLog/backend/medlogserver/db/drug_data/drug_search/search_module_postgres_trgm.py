@@ -0,0 +1,277 @@
+from typing import List, Dict, Optional, Sequence, Tuple
+import uuid
+import re
+from sqlmodel import select
+from sqlalchemy import (
+    func,
+    literal,
+    or_,
+    text,
+    bindparam,
+    table,
+    column,
+    String,
+    UUID as SA_UUID,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.sql import Select
+
+from medlogserver.utils import get_db_type
+from medlogserver.db._session import get_async_session_context, AsyncSession
+from medlogserver.db.drug_data.drug_search._base import (
+    MedLogSearchEngineResult,
+    tokenize_search_term,
+)
+from medlogserver.db.drug_data.drug_search.search_module_generic_sql import (
+    GenericSQLDrugSearchEngine,
+    GenericSQLDrugSearchCache,
+    GenericSQLDrugSearchCacheShadow,
+)
+from medlogserver.api.paginator import QueryParamsInterface, PaginatedResponse
+from medlogserver.model.drug_data.drug import DrugData
+from medlogserver.config import Config
+from medlogserver.log import get_logger
+
+log = get_logger(modulename="DRUG_SEARCH_INDEX")
+config = Config()
+
+DOCUMENT_TABLE_NAME = "drug_search_postgres_trgm_doc"
+# documents of the next index generation while an index rebuild is running, swapped in together with the generic search cache
+DOCUMENT_SHADOW_TABLE_NAME = f"{DOCUMENT_TABLE_NAME}_shadow"
+# ts_rank of word prefix matches is added on top of the generic score with this weight
+TS_RANK_WEIGHT = 1.0
+
+document_table = table(
+    DOCUMENT_TABLE_NAME,
+    column("id", SA_UUID()),
+    column("search_document", String()),
+    column("search_tsvector", TSVECTOR()),
+)
+
+
+class PostgresTrgmDrugSearchEngine(GenericSQLDrugSearchEngine):
+    """Adds a normalized (lower case, unaccented) search document per drug on top of the aggregated search content
+    of the 'GenericSQLDrugSearch'-engine (table `drug_search_generic_sql_cache`).
+
+    The document is indexed with a GIN trigram index (pg_trgm), which serves the infix `LIKE` candidate filter,
+    and a GIN indexed tsvector used for ranking word prefix matches. The generic scoring is only
+    applied to the candidates that passed the index.
+    """
+
+    description: str = "PostgreSQL only. Needs the 'pg_trgm' and 'unaccent' extensions (shipped with PostgreSQL contrib, created automatically if the database user is allowed to). Filters candidates with a GIN trigram index before scoring. Accent insensitive."
+    # the trigram index finds the candidates faster than a list of drug ids can be bound to the query
+    prefix_refinement: bool = False
+
+    def _check_db_support(self) -> bool:
+        if get_db_type(config.SQL_DATABASE_URL) != "postgres":
+            log.error(
+                "The 'PostgresTrgmDrugSearch' drug search engine only works with PostgreSQL databases. "
+                f"Choose another search engine in config var 'DRUG_SEARCHENGINE_CLASS'."
+            )
+            return False
+        return True
+
+    async def disable(self):
+        if not self._check_db_support():
+            return
+        async with get_async_session_context() as session:
+            for table_name in (DOCUMENT_TABLE_NAME, DOCUMENT_SHADOW_TABLE_NAME):
+                await session.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+            await session.commit()
+
+    async def _create_document_tables_if_not_exist(self, session: AsyncSession):
+        await session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await session.execute(text("CREATE EXTENSION IF NOT EXISTS unaccent"))
+        for table_name, cache_table_name in [
+            (DOCUMENT_TABLE_NAME, GenericSQLDrugSearchCache.__tablename__),
+            (DOCUMENT_SHADOW_TABLE_NAME, GenericSQLDrugSearchCacheShadow.__tablename__),
+        ]:
+            for statement in [
+                f"CREATE TABLE IF NOT EXISTS {table_name} (\n"
+                f"    id UUID PRIMARY KEY REFERENCES {cache_table_name}(id) ON DELETE CASCADE,\n"
+                "    search_document TEXT NOT NULL,\n"
+                "    search_tsvector TSVECTOR NOT NULL\n"
+                ")",
+                f"CREATE INDEX IF NOT EXISTS ix_{table_name}_search_document_trgm "
+                f"ON {table_name} USING GIN (search_document gin_trgm_ops)",
+                f"CREATE INDEX IF NOT EXISTS ix_{table_name}_search_tsvector "
+                f"ON {table_name} USING GIN (search_tsvector)",
+            ]:
+                await session.execute(text(statement))
+
+    def _insert_documents_sql(
+        self,
+        where_clause: str = "",
+        table_name: str = DOCUMENT_TABLE_NAME,
+        cache_table_name: str = GenericSQLDrugSearchCache.__tablename__,
+    ) -> str:
+        # drug codes are stored as "SYSTEM:CODE|SYSTEM:CODE". Split them into words for the tsvector.
+        normalized_document = (
+            "lower(unaccent(search_index_content || ' ' || replace(replace(search_cache_codes, '|', ' '), ':', ' ')))"
+        )
+        return (
+            f"INSERT INTO {table_name} (id, search_document, search_tsvector)\n"
+            f"SELECT id, {normalized_document}, to_tsvector('simple', {normalized_document})\n"
+            f"FROM {cache_table_name}\n"
+            f"{where_clause}\n"
+            "ON CONFLICT (id) DO UPDATE SET search_document = EXCLUDED.search_document, "
+            "search_tsvector = EXCLUDED.search_tsvector"
+        )
+
+    async def _documents_in_sync(self) -> bool:
+        """The generic search cache can be rebuild without us (e.g. while the 'GenericSQLDrugSearch'-engine was configured).
+        The documents are in sync if there is exactly one per cache row."""
+        async with get_async_session_context() as session:
+            res = await session.execute(
+                text("SELECT to_regclass(:name) IS NOT NULL"),
+                {"name": DOCUMENT_TABLE_NAME},
+            )
+            if not res.scalar_one():
+                return False
+            res = await session.execute(
+                text(f"SELECT count(*) FROM {DOCUMENT_TABLE_NAME}")
+            )
+            document_count = res.scalar_one()
+            cache_item_count = await self._count_cache_items(session=session)
+        return document_count == cache_item_count
+
+    async def build_index(self, force_rebuild: bool = False):
+        if not self._check_db_support():
+            return
+        if not force_rebuild and not await self._documents_in_sync():
+            force_rebuild = True
+        await super().build_index(force_rebuild=force_rebuild)
+
+    async def _clear_shadow_index(self, session: AsyncSession):
+        await self._create_document_tables_if_not_exist(session)
+        # cheaper than letting the delete on the shadow cache table cascade row by row
+        await session.execute(text(f"DELETE FROM {DOCUMENT_SHADOW_TABLE_NAME}"))
+        await super()._clear_shadow_index(session=session)
+
+    async def _build_shadow_index(self, session: AsyncSession):
+        await super()._build_shadow_index(session=session)
+        log.info("[INDEX BUILD UP] Build normalized trigram search documents...")
+        await session.execute(
+            text(
+                self._insert_documents_sql(
+                    table_name=DOCUMENT_SHADOW_TABLE_NAME,
+                    cache_table_name=GenericSQLDrugSearchCacheShadow.__tablename__,
+                )
+            )
+        )
+        await session.commit()
+        log.info("[INDEX BUILD UP] Trigram search documents complete.")
+
+    def _get_index_tables(self) -> List[Tuple[str, str]]:
+        return super()._get_index_tables() + [
+            (DOCUMENT_TABLE_NAME, DOCUMENT_SHADOW_TABLE_NAME)
+        ]
+
+    async def _build_index(self, session: AsyncSession):
+        await super()._build_index(session=session)
+        # documents of the custom drugs copied over from the previous generation
+        await session.execute(
+            text(
+                self._insert_documents_sql(
+                    f"WHERE id NOT IN (SELECT id FROM {DOCUMENT_TABLE_NAME})"
+                )
+            )
+        )
+
+    async def index_ready(self) -> bool:
+        if get_db_type(config.SQL_DATABASE_URL) != "postgres":
+            return False
+        return await super().index_ready()
+
+    async def insert_drug_to_index(self, drug: DrugData):
+        """Adhoc insert a single drug into the index. this is needed for user defined custom drugs.
+
+        Args:
+            drug (Drug): _description_
+        """
+        await super().insert_drug_to_index(drug)
+        async with get_async_session_context() as session:
+            await session.execute(
+                text(self._insert_documents_sql("WHERE id = :drug_id")).bindparams(
+                    bindparam("drug_id", value=drug.id, type_=SA_UUID())
+                )
+            )
+            await session.commit()
+
+    def _tsquery_expression(self, search_term_tokens: List[str]) -> str:
+        # word prefix query, e.g. "metf:* | 500:*". Everything but word chars would be tsquery syntax.
+        words = set()
+        for token in search_term_tokens:
+            words.update(w for w in re.split(r"\W+", token.lower()) if w)
+        return " | ".join(f"{word}:*" for word in sorted(words))
+
+    def _build_search_query(
+        self,
+        search_term: str = None,
+        market_accessable: Optional[bool] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+    ) -> Select:
+        if filter_ref_vals is None:
+            filter_ref_vals = {}
+        filter_ref_vals = {
+            k: v for k, v in filter_ref_vals.items() if v != "" and v is not None
+        }
+        search_term, search_term_tokens = tokenize_search_term(search_term)
+        if not search_term_tokens:
+            # pg_trgm can not use the index for patterns shorter than 3 chars (and empty search terms list everything).
+            # Fall back to the plain SQL scoring.
+            return super()._build_search_query(
+                search_term=search_term,
+                market_accessable=market_accessable,
+                filter_ref_vals=filter_ref_vals,
+                drug_ids=drug_ids,
+            )
+        log.debug(f"search_term_tokens: {search_term_tokens}")
+
+        tsquery_expression = self._tsquery_expression(search_term_tokens)
+        score = self._score_expression(search_term, search_term_tokens)
+        if tsquery_expression:
+            score = score + literal(TS_RANK_WEIGHT) * func.ts_rank(
+                document_table.c.search_tsvector,
+                func.to_tsquery("simple", tsquery_expression),
+            )
+        # Every candidate contains at least one token. These LIKE predicates are served by the trigram index.
+        candidate_filter = or_(
+            *[
+                document_table.c.search_document.like(
+                    func.concat(
+                        "%",
+                        func.lower(
+                            func.unaccent(
+                                literal(
+                                    token.replace("\\", "\\\\")
+                                    .replace("%", "\\%")
+                                    .replace("_", "\\_")
+                                )
+                            )
+                        ),
+                        "%",
+                    )
+                )
+                for token in search_term_tokens
+            ]
+        )
+        query = (
+            select(
+                GenericSQLDrugSearchCache.id,
+                score.label("score"),
+            )
+            .select_from(document_table)
+            .join(
+                GenericSQLDrugSearchCache,
+                onclause=GenericSQLDrugSearchCache.id == document_table.c.id,
+            )
+            .where(candidate_filter)
+        )
+        return self._append_search_filters(
+            query,
+            market_accessable=market_accessable,
+            filter_ref_vals=filter_ref_vals,
+            drug_ids=drug_ids,
+        )
@@ -0,0 +1,294 @@
+from typing import List, Dict, Optional, Sequence, Tuple
+import uuid
+from sqlmodel import select
+from sqlalchemy import (
+    case,
+    func,
+    literal,
+    literal_column,
+    text,
+    bindparam,
+    table,
+    column,
+    UUID as SA_UUID,
+)
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import ColumnElement
+
+from medlogserver.utils import get_db_type, normalize_search_text
+from medlogserver.db._session import get_async_session_context, AsyncSession
+from medlogserver.db.drug_data.drug_search._base import (
+    MedLogSearchEngineResult,
+    tokenize_search_term,
+)
+from medlogserver.db.drug_data.drug_search.search_module_generic_sql import (
+    GenericSQLDrugSearchEngine,
+    GenericSQLDrugSearchCache,
+    GenericSQLDrugSearchCacheShadow,
+)
+from medlogserver.api.paginator import QueryParamsInterface, PaginatedResponse
+from medlogserver.model.drug_data.drug import DrugData
+from medlogserver.config import Config
+from medlogserver.log import get_logger
+
+log = get_logger(modulename="DRUG_SEARCH_INDEX")
+config = Config()
+
+FTS_TABLE_NAME = "drug_search_sqlite_fts5"
+# FTS index of the next index generation while an index rebuild is running, swapped in together with the generic search cache
+FTS_SHADOW_TABLE_NAME = f"{FTS_TABLE_NAME}_shadow"
+# Columns of `drug_search_generic_sql_cache` the FTS index is build on. Search tokens are normalized the same way (see `normalize_search_text()`).
+FTS_COLUMNS = ("search_index_content_normalized", "search_cache_codes_normalized")
+# bm25 column weights for FTS_COLUMNS
+BM25_WEIGHTS = (1.0, 2.0)
+# Contentless, the rowids point to the implicit rowids of the generic search cache table. An external content table would be
+# bound to the cache table by name, which does not work with the swap of the cache tables by renaming.
+FTS_TABLE_OPTIONS = "content='', tokenize='trigram'"
+
+
+class SQLiteFTS5DrugSearchEngine(GenericSQLDrugSearchEngine):
+    """Indexes the aggregated drug search content of the 'GenericSQLDrugSearch'-engine
+    (table `drug_search_generic_sql_cache`) in a contentless SQLite FTS5 full text index.
+
+    The FTS5 index uses the trigram tokenizer, so infix matches ("formin" in "Metformin") are served by the index as well.
+    It indexes the normalized content columns, so matching is umlaut and ß insensitive like in the 'GenericSQLDrugSearch'-engine.
+    """
+
+    description: str = "SQLite only. Full text index (FTS5, trigram tokenizer) on top of the 'GenericSQLDrugSearch' aggregated drug data. Ranks by bm25 plus prefix and drug code matches. Does not need any additional setup."
+    # the FTS index finds the candidates faster than a list of drug ids can be bound to the query
+    prefix_refinement: bool = False
+
+    def _check_db_support(self) -> bool:
+        if get_db_type(config.SQL_DATABASE_URL) != "sqlite":
+            log.error(
+                "The 'SQLiteFTS5DrugSearch' drug search engine only works with SQLite databases. "
+                f"Choose another search engine in config var 'DRUG_SEARCHENGINE_CLASS'."
+            )
+            return False
+        return True
+
+    async def disable(self):
+        if not self._check_db_support():
+            return
+        async with get_async_session_context() as session:
+            for table_name in (FTS_TABLE_NAME, FTS_SHADOW_TABLE_NAME):
+                await session.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+            await session.commit()
+
+    async def _create_fts_table_if_not_exists(
+        self, session: AsyncSession, table_name: str = FTS_TABLE_NAME
+    ):
+        await session.execute(
+            text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table_name} "
+                f"USING fts5({', '.join(FTS_COLUMNS)}, {FTS_TABLE_OPTIONS})"
+            )
+        )
+
+    def _insert_fts_rows_sql(
+        self,
+        where_clause: str = "",
+        table_name: str = FTS_TABLE_NAME,
+        cache_table_name: str = GenericSQLDrugSearchCache.__tablename__,
+    ) -> str:
+        return (
+            f"INSERT INTO {table_name}(rowid, {', '.join(FTS_COLUMNS)}) "
+            f"SELECT rowid, {', '.join(FTS_COLUMNS)} FROM {cache_table_name} {where_clause}"
+        )
+
+    async def _fts_index_in_sync(self) -> bool:
+        """The generic search cache can be rebuild without us (e.g. while the 'GenericSQLDrugSearch'-engine was configured).
+        The FTS index is in sync if it contains exactly as many documents as the cache table."""
+        async with get_async_session_context() as session:
+            res = await session.execute(
+                text(
+                    "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+                ),
+                {"name": FTS_TABLE_NAME},
+            )
+            fts_table_sql = res.scalar_one_or_none()
+            if fts_table_sql is None or any(
+                part not in fts_table_sql for part in FTS_COLUMNS + (FTS_TABLE_OPTIONS,)
+            ):
+                # missing or created by an older MedLog version with another definition
+                return False
+            res = await session.execute(
+                text(f"SELECT count(*) FROM {FTS_TABLE_NAME}_docsize")
+            )
+            fts_doc_count = res.scalar_one()
+            cache_item_count = await self._count_cache_items(session=session)
+        return fts_doc_count == cache_item_count
+
+    async def build_index(self, force_rebuild: bool = False):
+        if not self._check_db_support():
+            return
+        if not force_rebuild and not await self._fts_index_in_sync():
+            force_rebuild = True
+        await super().build_index(force_rebuild=force_rebuild)
+
+    async def _clear_shadow_index(self, session: AsyncSession):
+        # Also replaces an FTS table of an older MedLog version with another definition, that was swapped out.
+        await session.execute(text(f"DROP TABLE IF EXISTS {FTS_SHADOW_TABLE_NAME}"))
+        await super()._clear_shadow_index(session=session)
+
+    async def _build_shadow_index(self, session: AsyncSession):
+        await super()._build_shadow_index(session=session)
+        log.info("[INDEX BUILD UP] Build SQLite FTS5 index...")
+        await self._create_fts_table_if_not_exists(session, FTS_SHADOW_TABLE_NAME)
+        await session.execute(
+            text(
+                self._insert_fts_rows_sql(
+                    table_name=FTS_SHADOW_TABLE_NAME,
+                    cache_table_name=GenericSQLDrugSearchCacheShadow.__tablename__,
+                )
+            )
+        )
+        # the swap needs a table to rename
+        await self._create_fts_table_if_not_exists(session)
+        await session.commit()
+        log.info("[INDEX BUILD UP] SQLite FTS5 index complete.")
+
+    def _get_index_tables(self) -> List[Tuple[str, str]]:
+        return super()._get_index_tables() + [(FTS_TABLE_NAME, FTS_SHADOW_TABLE_NAME)]
+
+    async def _build_index(self, session: AsyncSession):
+        await super()._build_index(session=session)
+        # The custom drugs copied over from the previous generation got the highest rowids of the cache table
+        await session.execute(
+            text(
+                self._insert_fts_rows_sql(
+                    f"WHERE rowid > COALESCE((SELECT rowid FROM {FTS_TABLE_NAME} ORDER BY rowid DESC LIMIT 1), 0)"
+                )
+            )
+        )
+
+    async def index_ready(self) -> bool:
+        if get_db_type(config.SQL_DATABASE_URL) != "sqlite":
+            return False
+        return await super().index_ready()
+
+    async def insert_drug_to_index(self, drug: DrugData):
+        """Adhoc insert a single drug into the index. this is needed for user defined custom drugs.
+
+        Args:
+            drug (Drug): _description_
+        """
+        await super().insert_drug_to_index(drug)
+        async with get_async_session_context() as session:
+            await session.execute(
+                text(self._insert_fts_rows_sql("WHERE id = :drug_id")).bindparams(
+                    bindparam("drug_id", value=drug.id, type_=SA_UUID())
+                )
+            )
+            await session.commit()
+
+    def _fts_match_expression(self, search_term_tokens: List[str]) -> str:
+        # every token is a phrase for FTS5. Any token may match, scoring sorts out the best hits.
+        # The indexed columns are normalized, so are the tokens.
+        return " OR ".join(
+            '"' + normalize_search_text(token).replace('"', '""') + '"'
+            for token in search_term_tokens
+        )
+
+    def _build_search_query(
+        self,
+        search_term: str = None,
+        market_accessable: Optional[bool] = None,
+        filter_ref_vals: Dict[str, int | str | bool] | None = None,
+        drug_ids: Optional[Sequence[uuid.UUID]] = None,
+    ) -> Select:
+        if filter_ref_vals is None:
+            filter_ref_vals = {}
+        filter_ref_vals = {
+            k: v for k, v in filter_ref_vals.items() if v != "" and v is not None
+        }
+        search_term, search_term_tokens = tokenize_search_term(search_term)
+        search_term = search_term.replace('"', "")
+        if not search_term_tokens:
+            # The trigram tokenizer can not match anything shorter than 3 chars (and empty search terms list everything).
+            # Fall back to the plain SQL scoring.
+            return super()._build_search_query(
+                search_term=search_term,
+                market_accessable=market_accessable,
+                filter_ref_vals=filter_ref_vals,
+                drug_ids=drug_ids,
+            )
+        log.debug(f"search_term_tokens: {search_term_tokens}")
+
+        fts_table_clause = table(FTS_TABLE_NAME, column("rowid"))
+        fts_table = literal_column(FTS_TABLE_NAME)
+        # FTS5 auxiliary functions like bm25() can only be used in a plain query on the FTS table,
+        # not together with joins and window functions. We rank the matches in a materialized CTE first.
+        fts_matches = (
+            select(
+                fts_table_clause.c.rowid.label("fts_rowid"),
+                # bm25() is "lower is better" and negative
+                (-func.bm25(fts_table, *BM25_WEIGHTS)).label("bm25_score"),
+            )
+            .select_from(fts_table_clause)
+            .where(
+                fts_table.op("MATCH")(
+                    literal(self._fts_match_expression(search_term_tokens))
+                )
+            )
+            .cte("fts_matches")
+            .prefix_with("MATERIALIZED")
+        )
+        search_term_normalized = normalize_search_text(search_term)
+        score: ColumnElement = fts_matches.c.bm25_score + case(
+            (
+                self._starts_with(
+                    GenericSQLDrugSearchCache.search_index_content, search_term
+                ),
+                2.3,
+            ),
+            (
+                self._starts_with(
+                    GenericSQLDrugSearchCache.search_index_content_normalized,
+                    search_term_normalized,
+                ),
+                2.2,
+            ),
+            else_=0,
+        )
+        for token_pos, search_token in enumerate(search_term_tokens):
+            # first token (pos 0) gets the heighest weight of 1
+            token_input_position_weight = max(0.2, 1.0 - (token_pos * 0.15))
+            search_token_normalized = normalize_search_text(search_token)
+            score = score + case(
+                (
+                    self._position(
+                        GenericSQLDrugSearchCache.search_cache_codes_normalized,
+                        search_token_normalized,
+                    )
+                    > 0,
+                    3.0,
+                ),
+                (
+                    self._starts_with(
+                        GenericSQLDrugSearchCache.search_index_content_normalized,
+                        search_token_normalized,
+                    ),
+                    1.2 * token_input_position_weight,
+                ),
+                else_=0,
+            )
+
+        query = (
+            select(
+                GenericSQLDrugSearchCache.id,
+                score.label("score"),
+            )
+            .select_from(fts_matches)
+            .join(
+                GenericSQLDrugSearchCache,
+                onclause=fts_matches.c.fts_rowid
+                == literal_column(f"{GenericSQLDrugSearchCache.__tablename__}.rowid"),
+            )
+        )
+        return self._append_search_filters(
+            query,
+            market_accessable=market_accessable,
+            filter_ref_vals=filter_ref_vals,
+            drug_ids=drug_ids,
+        )
@@ -0,0 +1,183 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import time
+from pydantic import BaseModel, Field
+
+from medlogserver.config import Config
+from medlogserver.log import get_logger
+
+log = get_logger()
+config = Config()
+
+
+class DrugSearchResultCacheStats(BaseModel):
+    max_size: int = Field(description="Maximum number of cached search results.")
+    ttl_sec: int = Field(description="Seconds a cached search result stays valid.")
+    size: int = Field(description="Number of currently cached search results.")
+    hits: int = Field(description="Searches answered from the cache.")
+    misses: int = Field(
+        description="Searches that were not in the cache (or expired)."
+    )
+    coalesced: int = Field(
+        description="Cache misses that joined an identical search already running in this process instead of running their own. Search engine executions saved in total: `hits` + `coalesced`."
+    )
+    in_flight: int = Field(
+        description="Number of distinct searches currently running."
+    )
+    searches: int = Field(description="All search requests, cached or not.")
+    abandoned: int = Field(
+        description="Search requests cancelled before their result was ready, e.g. because the client disconnected. Cancellation rate: `abandoned` / `searches`."
+    )
+    cancelled: int = Field(
+        description="Running searches that were aborted, because all requests waiting for them were cancelled."
+    )
+    evictions: int = Field(
+        description="Cached results that were dropped because the cache was full."
+    )
+    invalidations: int = Field(
+        description="How often the whole cache was cleared because the search index changed."
+    )
+
+
+class DrugSearchResultCache:
+    """Process local LRU cache for drug search results. Entries expire after `ttl_sec`.
+
+    The cache must be invalidated whenever the content of the search index changes (index build, custom drug insert).
+    Changes made by other processes (e.g. an index build in the background worker) are covered by the
+    drug dataset version being part of the key and by the TTL.
+
+    `get_or_run()` also coalesces concurrent identical searches (single flight): While a search runs, further requests
+    with the same key wait for its result instead of running the search again.
+    """
+
+    def __init__(self, max_size: int, ttl_sec: int):
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self._entries: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        # key -> running search and the count of requests waiting for it
+        self._in_flight: Dict[Hashable, Tuple[asyncio.Task, List[int]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.searches = 0
+        self.abandoned = 0
+        self.cancelled = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl_sec > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() > entry[0]:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        if not self.enabled:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_sec, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_run(
+        self,
+        key: Hashable,
+        run: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        """The cached result for `key` or the result of `run()`, which is cached if `cacheable(result)`.
+        Concurrent calls with the same key share one execution of `run()`.
+        It is only cancelled if all requests waiting for it are cancelled.
+        """
+        self.searches += 1
+        value = self.get(key)
+        if value is not None:
+            return value
+        in_flight = self._in_flight.get(key)
+        if in_flight is None:
+            in_flight = (
+                asyncio.create_task(self._run(key, run, cacheable)),
+                [0],
+            )
+            self._in_flight[key] = in_flight
+        else:
+            self.coalesced += 1
+        task, waiter_count = in_flight
+        waiter_count[0] += 1
+        try:
+            # shielded, a cancelled request must not cancel the search of the other waiting requests
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            self.abandoned += 1
+            if waiter_count[0] == 1 and not task.done():
+                task.cancel()
+                # the search may take a moment to abort. Later requests must not join it.
+                if self._in_flight.get(key) is in_flight:
+                    del self._in_flight[key]
+                self.cancelled += 1
+            raise
+        finally:
+            waiter_count[0] -= 1
+
+    async def _run(
+        self,
+        key: Hashable,
+        run: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool],
+    ) -> Any:
+        invalidations = self.invalidations
+        try:
+            value = await run()
+            # a result computed while the cache was invalidated may already be outdated
+            if invalidations == self.invalidations and cacheable(value):
+                self.put(key, value)
+            return value
+        finally:
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None and in_flight[0] is asyncio.current_task():
+                del self._in_flight[key]
+
+    def invalidate(self):
+        if self._entries:
+            log.debug(
+                f"Invalidate drug search result cache ({len(self._entries)} entries)"
+            )
+        self._entries.clear()
+        # running searches may see the old index state. Later requests must not join them.
+        self._in_flight.clear()
+        self.invalidations += 1
+
+    def stats(self) -> DrugSearchResultCacheStats:
+        return DrugSearchResultCacheStats(
+            max_size=self.max_size,
+            ttl_sec=self.ttl_sec,
+            size=len(self._entries),
+            hits=self.hits,
+            misses=self.misses,
+            coalesced=self.coalesced,
+            in_flight=len(self._in_flight),
+            searches=self.searches,
+            abandoned=self.abandoned,
+            cancelled=self.cancelled,
+            evictions=self.evictions,
+            invalidations=self.invalidations,
+        )
+
+
+drug_search_result_cache = DrugSearchResultCache(
+    max_size=config.DRUG_SEARCH_RESULT_CACHE_SIZE,
+    ttl_sec=config.DRUG_SEARCH_RESULT_CACHE_TTL_SEC,
+)
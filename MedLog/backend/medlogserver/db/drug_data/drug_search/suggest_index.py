@@ -0,0 +1,460 @@
+from typing import List, Dict, Optional, Tuple, Iterable, Literal
+from array import array
+from bisect import bisect_left
+import asyncio
+import datetime
+import heapq
+import re
+import time
+import uuid
+from pydantic import BaseModel, Field
+from sqlmodel import select, col
+
+from medlogserver.db._session import get_async_session_context
+from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
+from medlogserver.model.drug_data.drug import DrugData
+from medlogserver.model.drug_data.drug_code import DrugCode
+from medlogserver.config import Config
+from medlogserver.log import get_logger
+
+log = get_logger(modulename="DRUG_SEARCH_INDEX")
+config = Config()
+
+# Key types. The lower, the more relevant the match.
+KEY_TRADE_NAME = 0
+KEY_WORD = 1
+KEY_CODE = 2
+MATCH_NAMES = ("trade_name", "word", "code")
+# Upper bound of keys looked at per suggestion request. Keeps one char prefixes as fast as longer ones.
+MAX_SCANNED_KEYS = 1000
+# Later words of trade names are suggested as well (e.g. "ratiopharm" in "Ibuprofen AbZ ratiopharm"). Dosages and short words are left out.
+WORD_PATTERN = re.compile(r"[^\W\d_]{3,}")
+
+# Market exit day (`date.toordinal()`) of drugs without market exit date
+NO_MARKET_EXIT = 2**31 - 1
+# Latest dataset drug market exit day of trade names without drugs from the drug dataset (custom drugs only)
+NO_DATASET_DRUG = -1
+
+# (drug id, trade name, market exit date, is custom drug, [(code system id, code), ...])
+SuggestDrug = Tuple[
+    uuid.UUID, str, Optional[datetime.date], bool, List[Tuple[str, str]]
+]
+
+
+class DrugSuggestion(BaseModel):
+    drug_id: uuid.UUID = Field(
+        description="The most relevant drug with this trade name. Drugs on the market and from the drug dataset are preferred.",
+        examples=["ff16fc08-6484-4097-bd51-f8c17c640a06"],
+    )
+    trade_name: str = Field(examples=["Ibuprofen AbZ 400 mg"])
+    match: Literal["trade_name", "word", "code"] = Field(
+        description="Where the prefix matched: At the start of the trade name, at the start of a later word of the trade name or at the start of a drug code (e.g. a PZN). In order of relevance."
+    )
+    code_system_id: Optional[str] = Field(
+        default=None,
+        description="Code system of the matched code, if `match` is `code`",
+        examples=["PZN"],
+    )
+    code: Optional[str] = Field(
+        default=None, description="The matched code, if `match` is `code`"
+    )
+    drug_count: int = Field(
+        description="Count of matching drugs with this trade name (e.g. different package sizes). Always 1 for code matches."
+    )
+    market_accessable: bool
+    is_custom_drug: bool
+
+
+class DrugSuggestIndex:
+    """Sorted array of case folded keys for typeahead suggestions: trade names, the later words of trade names and drug codes.
+
+    A lookup is a binary search for the first key starting with the prefix and a scan over the following keys until
+    one does not start with it anymore. Drugs sharing a trade name (e.g. package sizes) share its keys.
+    Keys of trade names point to the name number (`key_targets[i] >= 0`), keys of codes to the document number of the drug
+    (`key_targets[i] == -(doc_no + 1)`).
+    """
+
+    def __init__(self, generation: Tuple):
+        self.generation = generation
+        # The document number of a drug is its list index.
+        self.drug_ids: List[uuid.UUID] = []
+        self.doc_no_by_drug_id: Dict[uuid.UUID, int] = {}
+        self.market_exit_days = array("i")
+        self.is_custom_drug: List[bool] = []
+        self.name_no_of_doc = array("i")
+        # The name number of a distinct trade name is its list index.
+        self.names: List[str] = []
+        self.name_doc_nos: List[List[int]] = []
+        # Latest market exit day of all drugs and of the drug dataset drugs with the name.
+        # Ranking a name by market accessibility needs no look at its single drugs.
+        self.name_last_exit_days = array("i")
+        self.name_last_dataset_exit_days = array("i")
+        self.name_no_by_folded_name: Dict[str, int] = {}
+        self.code_system_ids: List[str] = []
+        # Sorted keys and their type, target and code system number (-1 for non code keys)
+        self.keys: List[str] = []
+        self.key_types = array("b")
+        self.key_targets = array("i")
+        self.key_code_systems = array("b")
+
+    def __len__(self) -> int:
+        return len(self.drug_ids)
+
+    def contains(self, drug_id: uuid.UUID) -> bool:
+        return drug_id in self.doc_no_by_drug_id
+
+    def _code_system_no(self, code_system_id: str) -> int:
+        try:
+            return self.code_system_ids.index(code_system_id)
+        except ValueError:
+            self.code_system_ids.append(code_system_id)
+            return len(self.code_system_ids) - 1
+
+    def _register_drug(self, drug: SuggestDrug) -> List[Tuple[str, int, int, int]]:
+        """Add the drug to the documents and return its new keys as `(key, type, target, code system number)`, unsorted."""
+        drug_id, trade_name, market_exit_date, is_custom_drug, codes = drug
+        doc_no = len(self.drug_ids)
+        self.drug_ids.append(drug_id)
+        self.doc_no_by_drug_id[drug_id] = doc_no
+        market_exit_day = (
+            market_exit_date.toordinal()
+            if market_exit_date is not None
+            else NO_MARKET_EXIT
+        )
+        self.market_exit_days.append(market_exit_day)
+        self.is_custom_drug.append(is_custom_drug)
+        keys = []
+        trade_name = trade_name or ""
+        folded_name = trade_name.casefold()
+        name_no = self.name_no_by_folded_name.get(folded_name)
+        if name_no is None:
+            name_no = len(self.names)
+            self.names.append(trade_name)
+            self.name_doc_nos.append([])
+            self.name_last_exit_days.append(market_exit_day)
+            self.name_last_dataset_exit_days.append(NO_DATASET_DRUG)
+            self.name_no_by_folded_name[folded_name] = name_no
+            keys.append((folded_name, KEY_TRADE_NAME, name_no, -1))
+            for word_match in WORD_PATTERN.finditer(folded_name):
+                if word_match.start() > 0:
+                    keys.append(
+                        (folded_name[word_match.start() :], KEY_WORD, name_no, -1)
+                    )
+        self.name_doc_nos[name_no].append(doc_no)
+        self.name_last_exit_days[name_no] = max(
+            self.name_last_exit_days[name_no], market_exit_day
+        )
+        if not is_custom_drug:
+            self.name_last_dataset_exit_days[name_no] = max(
+                self.name_last_dataset_exit_days[name_no], market_exit_day
+            )
+        self.name_no_of_doc.append(name_no)
+        for code_system_id, code in codes:
+            if code:
+                keys.append(
+                    (
+                        code.casefold(),
+                        KEY_CODE,
+                        -doc_no - 1,
+                        self._code_system_no(code_system_id),
+                    )
+                )
+        return keys
+
+    def add_drugs(self, drugs: Iterable[SuggestDrug]):
+        """Bulk add drugs and sort all keys once."""
+        keys = list(
+            zip(self.keys, self.key_types, self.key_targets, self.key_code_systems)
+        )
+        for drug in drugs:
+            if drug[0] not in self.doc_no_by_drug_id:
+                keys.extend(self._register_drug(drug))
+        keys.sort(key=lambda key: key[0])
+        self.keys = [key[0] for key in keys]
+        self.key_types = array("b", [key[1] for key in keys])
+        self.key_targets = array("i", [key[2] for key in keys])
+        self.key_code_systems = array("b", [key[3] for key in keys])
+
+    def add_drug(self, drug: SuggestDrug):
+        """Add a single drug (e.g. a new custom drug) by inserting its keys into the sorted arrays."""
+        if drug[0] in self.doc_no_by_drug_id:
+            return
+        for key, key_type, target, code_system_no in self._register_drug(drug):
+            position = bisect_left(self.keys, key)
+            self.keys.insert(position, key)
+            self.key_types.insert(position, key_type)
+            self.key_targets.insert(position, target)
+            self.key_code_systems.insert(position, code_system_no)
+
+    def suggest(
+        self,
+        prefix: str,
+        limit: int = 10,
+        market_accessable: Optional[bool] = None,
+    ) -> List[DrugSuggestion]:
+        """Trade names and codes starting with `prefix`, case insensitive.
+        Trade name matches come before word matches before code matches. Within these, drugs on the market, drugs of the
+        drug dataset and shorter trade names come first.
+        """
+        prefix = (prefix or "").strip().casefold()
+        if not prefix or limit <= 0:
+            return []
+        today = datetime.date.today().toordinal()
+        market_exit_days = self.market_exit_days
+
+        # target -> position of its most relevant matching key
+        matched_positions: Dict[int, int] = {}
+        keys = self.keys
+        key_types = self.key_types
+        key_targets = self.key_targets
+        position = bisect_left(keys, prefix)
+        end = min(position + MAX_SCANNED_KEYS, len(keys))
+        while position < end and keys[position].startswith(prefix):
+            target = key_targets[position]
+            previous_position = matched_positions.get(target)
+            if (
+                previous_position is None
+                or key_types[position] < key_types[previous_position]
+            ):
+                matched_positions[target] = position
+            position += 1
+
+        ranked: List[Tuple[Tuple, int, int]] = []
+        for target, position in matched_positions.items():
+            if target < 0:
+                doc_no = -target - 1
+                name_no = self.name_no_of_doc[doc_no]
+                on_market = market_exit_days[doc_no] > today
+                if market_accessable is not None and on_market != market_accessable:
+                    continue
+                is_custom_drug = self.is_custom_drug[doc_no]
+            elif market_accessable is False:
+                name_no = target
+                doc_no, _ = self._best_doc(self.name_doc_nos[name_no], today, False)
+                if doc_no is None:
+                    continue
+                on_market = False
+                is_custom_drug = self.is_custom_drug[doc_no]
+            else:
+                name_no = target
+                on_market = self.name_last_exit_days[name_no] > today
+                if market_accessable and not on_market:
+                    continue
+                last_dataset_exit_day = self.name_last_dataset_exit_days[name_no]
+                # the drug the suggestion will point to, see `_best_doc()`
+                is_custom_drug = (
+                    last_dataset_exit_day <= today
+                    if on_market
+                    else last_dataset_exit_day == NO_DATASET_DRUG
+                )
+            rank = (
+                key_types[position],
+                not on_market,
+                is_custom_drug,
+                len(self.names[name_no]),
+                keys[position],
+            )
+            ranked.append((rank, position, target))
+
+        # Only the returned suggestions are resolved to a drug and turned into response models
+        suggestions = []
+        for rank, position, target in heapq.nsmallest(
+            limit, ranked, key=lambda item: item[0]
+        ):
+            if target < 0:
+                doc_no, drug_count = -target - 1, 1
+                name_no = self.name_no_of_doc[doc_no]
+            else:
+                name_no = target
+                doc_no, drug_count = self._best_doc(
+                    self.name_doc_nos[name_no], today, market_accessable
+                )
+            key_type = rank[0]
+            code_system_no = self.key_code_systems[position]
+            suggestions.append(
+                DrugSuggestion(
+                    drug_id=self.drug_ids[doc_no],
+                    trade_name=self.names[name_no],
+                    match=MATCH_NAMES[key_type],
+                    code_system_id=(
+                        self.code_system_ids[code_system_no]
+                        if code_system_no >= 0
+                        else None
+                    ),
+                    code=keys[position] if key_type == KEY_CODE else None,
+                    drug_count=drug_count,
+                    market_accessable=not rank[1],
+                    is_custom_drug=rank[2],
+                )
+            )
+        return suggestions
+
+    def _best_doc(
+        self, doc_nos: List[int], today: int, market_accessable: Optional[bool]
+    ) -> Tuple[Optional[int], int]:
+        """The drug a trade name suggestion points to: Drugs on the market first, drugs of the drug dataset before custom drugs.
+
+        Returns:
+            Tuple[Optional[int], int]: document number of the drug (None if no drug matches `market_accessable`) and the count of matching drugs
+        """
+        if market_accessable is not None:
+            doc_nos = [
+                doc_no
+                for doc_no in doc_nos
+                if (self.market_exit_days[doc_no] > today) == market_accessable
+            ]
+            if not doc_nos:
+                return None, 0
+        best_doc_no = min(
+            doc_nos,
+            key=lambda doc_no: (
+                self.market_exit_days[doc_no] <= today,
+                self.is_custom_drug[doc_no],
+            ),
+        )
+        return best_doc_no, len(doc_nos)
+
+
+class _SuggestIndexHolder:
+    # The index lives on module level and is shared by all requests of the process.
+    index: Optional[DrugSuggestIndex] = None
+    build_in_process: bool = False
+    background_task: Optional[asyncio.Task] = None
+
+
+_holder = _SuggestIndexHolder()
+
+
+def get_suggest_index(generation: Optional[Tuple] = None) -> Optional[DrugSuggestIndex]:
+    """The current suggest index. None if it is not built (yet) or disabled.
+    With `generation`, also None if the index was built for another search index generation (e.g. while a new one builds after an import)."""
+    if generation is not None and (
+        _holder.index is None or _holder.index.generation != generation
+    ):
+        return None
+    return _holder.index
+
+
+def ensure_suggest_index(
+    generation: Tuple,
+    dataset_version: DrugDataSetVersion,
+    custom_dataset_version: Optional[DrugDataSetVersion],
+):
+    """Start a background build of the suggest index, if there is none for the search index `generation`.
+    The previous index keeps answering until the new one is complete.
+    If the index is current, custom drugs created by other MedLog processes are added to it."""
+    if not config.DRUG_SEARCH_SUGGEST_INDEX_ENABLED:
+        _holder.index = None
+        return
+    if _holder.build_in_process:
+        return
+    if _holder.index is not None and _holder.index.generation == generation:
+        if custom_dataset_version is not None:
+            _holder.build_in_process = True
+            _holder.background_task = asyncio.create_task(
+                _sync_custom_drugs_in_background(
+                    _holder.index, custom_dataset_version.id
+                )
+            )
+        return
+    dataset_version_ids = [dataset_version.id]
+    if custom_dataset_version is not None:
+        dataset_version_ids.append(custom_dataset_version.id)
+    _holder.build_in_process = True
+    # keep a reference to the task, otherwise it may be garbage collected while running
+    _holder.background_task = asyncio.create_task(
+        _build_suggest_index_in_background(generation, dataset_version_ids)
+    )
+
+
+async def _build_suggest_index_in_background(
+    generation: Tuple, dataset_version_ids: List[uuid.UUID]
+):
+    try:
+        _holder.index = await build_suggest_index(generation, dataset_version_ids)
+    except Exception:
+        log.exception("Building drug suggest index failed")
+    finally:
+        _holder.build_in_process = False
+
+
+async def _sync_custom_drugs_in_background(
+    index: DrugSuggestIndex, custom_dataset_version_id: uuid.UUID
+):
+    try:
+        # custom drugs are few, loading all of them is cheap
+        drugs = await _load_suggest_drugs([custom_dataset_version_id])
+        for drug in drugs:
+            if not index.contains(drug[0]):
+                index.add_drug(drug)
+    except Exception:
+        log.exception("Syncing custom drugs into drug suggest index failed")
+    finally:
+        _holder.build_in_process = False
+
+
+def suggest_drug_of(drug: DrugData) -> SuggestDrug:
+    return (
+        drug.id,
+        drug.trade_name,
+        drug.market_exit_date,
+        drug.is_custom_drug,
+        [(code.code_system_id, code.code) for code in drug.codes],
+    )
+
+
+async def _load_suggest_drugs(
+    dataset_version_ids: List[uuid.UUID],
+) -> List[SuggestDrug]:
+    async with get_async_session_context() as session:
+        result = await session.exec(
+            select(
+                DrugData.id,
+                DrugData.trade_name,
+                DrugData.market_exit_date,
+                DrugData.is_custom_drug,
+            ).where(col(DrugData.source_dataset_id).in_(dataset_version_ids))
+        )
+        drug_rows = result.all()
+        result = await session.exec(
+            select(DrugCode.drug_id, DrugCode.code_system_id, DrugCode.code).where(
+                col(DrugCode.drug_id).in_(
+                    select(DrugData.id).where(
+                        col(DrugData.source_dataset_id).in_(dataset_version_ids)
+                    )
+                )
+            )
+        )
+        codes_by_drug_id: Dict[uuid.UUID, List[Tuple[str, str]]] = {}
+        for drug_id, code_system_id, code in result.all():
+            codes_by_drug_id.setdefault(drug_id, []).append((code_system_id, code))
+    return [
+        (
+            drug_id,
+            trade_name,
+            market_exit_date,
+            is_custom_drug,
+            codes_by_drug_id.get(drug_id, []),
+        )
+        for drug_id, trade_name, market_exit_date, is_custom_drug in drug_rows
+    ]
+
+
+async def build_suggest_index(
+    generation: Tuple, dataset_version_ids: List[uuid.UUID]
+) -> DrugSuggestIndex:
+    log.info("Build drug suggest index...")
+    start_time = time.monotonic()
+    drugs = await _load_suggest_drugs(dataset_version_ids)
+
+    def _fill_index() -> DrugSuggestIndex:
+        index = DrugSuggestIndex(generation=generation)
+        index.add_drugs(drugs)
+        return index
+
+    # Filling the index is pure python work. Keep the event loop responsive for other requests meanwhile.
+    index = await asyncio.to_thread(_fill_index)
+    log.info(
+        f"...building drug suggest index done. Indexed {len(index)} drugs with {len(index.keys)} keys in {time.monotonic() - start_time:.1f}s."
+    )
+    return index
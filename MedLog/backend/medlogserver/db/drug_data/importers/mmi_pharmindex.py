@@ -1,5 +1,6 @@
 from typing import (
     List,
+    Iterable,
     Callable,
     Dict,
     Optional,
@@ -8,10 +9,13 @@ from typing import (
     Type,
     Union,
     AsyncGenerator,
+    Iterator,
     Self,
 )
 import uuid
+import sys
 import time
+import asyncio
 from pathlib import Path
 import datetime
 import csv
@@ -21,7 +25,8 @@ from medlogserver.db._session import (
     get_async_session_context,
     AsyncSession,
 )
-from sqlalchemy import insert, text
+from sqlalchemy import insert, update, text, bindparam
+from sqlalchemy.dialects import postgresql
 import polars as pl
 from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
 from medlogserver.model.drug_data.drug_attr import (
@@ -62,6 +67,33 @@ config = Config()
 log = get_logger(modulename="DRUGIMPORT")
 importername = "MMIPharmindex1_32"
 
+# Approximate memory one package takes while its batch is transformed and written to the database, and the memory
+# the streaming CSV scans and the per product lookup tables take besides the batches (see `DRUG_IMPORTER_MEMORY_BUDGET_MB`).
+# Measured with synthetic MMI data, with some headroom.
+BATCH_BYTES_PER_PACKAGE_VECTORIZED = 4 * 1024
+BATCH_BYTES_PER_PACKAGE_ROW_BY_ROW = 12 * 1024
+STREAMING_OVERHEAD_BYTES = 64 * 1024 * 1024
+MIN_BATCH_SIZE = 1000
+
+# PostgreSQL types of the drug table columns, as psycopg names them for the binary COPY (see `DRUG_IMPORTER_PG_COPY_FORMAT`)
+PG_BINARY_COPY_TYPES = {
+    "UUID": "uuid",
+    "VARCHAR": "varchar",
+    "DATE": "date",
+    "BOOLEAN": "bool",
+    "INTEGER": "int4",
+}
+
+# Tables a drug import bulk loads, their indexes and foreign keys are deferred with `DRUG_IMPORTER_DEFER_INDEXES`
+DRUG_DATA_TABLES = [
+    DrugData,
+    DrugCode,
+    DrugVal,
+    DrugValRef,
+    DrugValMulti,
+    DrugValMultiRef,
+]
+
 
 @dataclass
 class MmiPiDrugAttrRefFieldLovImportDefinition:
@@ -77,6 +109,14 @@ class MmiPiDrugAttrRefFieldLovImportDefinition:
     )
 
 
+@dataclass
+class CopyStats:
+    """Rows written per table and the time the COPY streams took for them, summed over an import."""
+
+    rows: int = 0
+    seconds: float = 0.0
+
+
 @dataclass
 class SourceAttrMapping:
     filename: str
@@ -86,6 +126,8 @@ class SourceAttrMapping:
     )
     map2: str = None
     cast_func: Optional[Callable] = None
+    # polars equivalent of `cast_func` for the vectorized transformation (see `DRUG_IMPORTER_VECTORIZED_TRANSFORM`)
+    cast_expr: Optional[Callable[[pl.Expr], pl.Expr]] = None
     filter_colname: str = None
     filter_colval: str = None
 
@@ -148,12 +190,14 @@ mmi_rohdaten_r3_mappings = {
         "ONMARKETDATE",
         map2="market_access_date",
         cast_func=lambda x: datetime.datetime.strptime(x, "%d.%m.%Y").date(),
+        cast_expr=lambda col: col.str.strptime(pl.Date, "%d.%m.%Y"),
     ),
     "market_exit_date": SourceAttrMapping(
         "ARCHIVE_PACKAGE.CSV",
         "OFFMARKETDATE",
         map2="market_exit_date",
         cast_func=lambda x: datetime.datetime.strptime(x, "%d.%m.%Y").date(),
+        cast_expr=lambda col: col.str.strptime(pl.Date, "%d.%m.%Y"),
     ),
     # codes
     "codes.PZN": SourceAttrMapping(
@@ -184,6 +228,7 @@ mmi_rohdaten_r3_mappings = {
         source_path="PACKAGE.CSV[PRODUCTID]/PRODUCT_FLAG.CSV[PRODUCTID]",
         map2="attrs.ist_verhuetungsmittel",
         cast_func=lambda x: bool(int(x)) if x is not None else None,
+        cast_expr=lambda col: col.cast(pl.Int64).cast(pl.Boolean),
     ),
     "attrs.ist_kosmetikum": SourceAttrMapping(
         "PRODUCT_FLAG.CSV",
@@ -191,6 +236,7 @@ mmi_rohdaten_r3_mappings = {
         source_path="PACKAGE.CSV[PRODUCTID]/PRODUCT_FLAG.CSV[PRODUCTID]",
         map2="attrs.ist_kosmetikum",
         cast_func=lambda x: bool(int(x)) if x is not None else None,
+        cast_expr=lambda col: col.cast(pl.Int64).cast(pl.Boolean),
     ),
     "attrs.ist_nahrungsergaenzungsmittel": SourceAttrMapping(
         "PRODUCT_FLAG.CSV",
@@ -198,6 +244,7 @@ mmi_rohdaten_r3_mappings = {
         source_path="PACKAGE.CSV[PRODUCTID]/PRODUCT_FLAG.CSV[PRODUCTID]",
         map2="attrs.ist_nahrungsergaenzungsmittel",
         cast_func=lambda x: bool(int(x)) if x is not None else None,
+        cast_expr=lambda col: col.cast(pl.Int64).cast(pl.Boolean),
     ),
     "attrs.ist_pflanzlich": SourceAttrMapping(
         "PRODUCT_FLAG.CSV",
@@ -205,6 +252,7 @@ mmi_rohdaten_r3_mappings = {
         source_path="PACKAGE.CSV[PRODUCTID]/PRODUCT_FLAG.CSV[PRODUCTID]",
         map2="attrs.ist_pflanzlich",
         cast_func=lambda x: bool(int(x)) if x is not None else None,
+        cast_expr=lambda col: col.cast(pl.Int64).cast(pl.Boolean),
     ),
     "attrs.ist_generikum": SourceAttrMapping(
         "PRODUCT_FLAG.CSV",
@@ -212,6 +260,7 @@ mmi_rohdaten_r3_mappings = {
         source_path="PACKAGE.CSV[PRODUCTID]/PRODUCT_FLAG.CSV[PRODUCTID]",
         map2="attrs.ist_generikum",
         cast_func=lambda x: bool(int(x)) if x is not None else None,
+        cast_expr=lambda col: col.cast(pl.Int64).cast(pl.Boolean),
     ),
     "attrs.ist_homoeopathisch": SourceAttrMapping(
         "PRODUCT_FLAG.CSV",
@@ -219,6 +268,7 @@ mmi_rohdaten_r3_mappings = {
         source_path="PACKAGE.CSV[PRODUCTID]/PRODUCT_FLAG.CSV[PRODUCTID]",
         map2="attrs.ist_homoeopathisch",
         cast_func=lambda x: bool(int(x)) if x is not None else None,
+        cast_expr=lambda col: col.cast(pl.Int64).cast(pl.Boolean),
     ),
     # ref attrs
     "attrs_ref.darreichungsform": SourceAttrMapping(
@@ -290,6 +340,17 @@ root_props_mapping = {
 }
 
 
+def get_source_columns(filename: str) -> List[str]:
+    """Columns of a source file the mappings read. Other columns are not loaded."""
+    return list(
+        dict.fromkeys(
+            mapping.colname
+            for mapping in mmi_rohdaten_r3_mappings.values()
+            if mapping.filename == filename
+        )
+    )
+
+
 def get_code_attr_definitions() -> List[DrugAttrFieldDefinitionContainer]:
     return [
         DrugAttrFieldDefinitionContainer(
@@ -710,6 +771,63 @@ def get_attr_multi_ref_definitions() -> List[DrugAttrFieldDefinitionContainer]:
     ]
 
 
+async def _restore_drug_table_indexes(
+    session: AsyncSession,
+    drug_dataset_version_id: uuid.UUID,
+    restore_statements: List[str],
+):
+    """Create the indexes and foreign keys `MMIPharmindex1_32._drop_drug_table_indexes` dropped, each in one pass over the loaded
+    tables, and ANALYZE the tables so the planner knows the new dataset before it is activated.
+    The stored statements of the dataset version are cleared in the same transaction."""
+    start_time = time.monotonic()
+    # a failed import may have left the session in a failed transaction
+    await session.rollback()
+    log.info(
+        f" Build {len(restore_statements)} indexes and foreign keys of the drug tables..."
+    )
+    try:
+        sa_conn = await session.connection()
+        for statement in restore_statements:
+            log.debug(f" {statement}")
+            await sa_conn.exec_driver_sql(statement)
+        for table_type in DRUG_DATA_TABLES:
+            await sa_conn.exec_driver_sql(f"ANALYZE {table_type.__tablename__}")
+        await session.execute(
+            update(DrugDataSetVersion)
+            .where(DrugDataSetVersion.id == drug_dataset_version_id)
+            .values(deferred_index_restore_statements=None)
+        )
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    log.info(
+        f" Built indexes and foreign keys and analyzed the drug tables in {time.monotonic() - start_time:.1f}s"
+    )
+
+
+async def restore_deferred_drug_table_indexes():
+    """Create the indexes and foreign keys of the drug tables that an interrupted import dropped (see `DRUG_IMPORTER_DEFER_INDEXES`)
+    and did not restore, e.g. because the process was killed during the bulk load. Runs on worker start and before an import."""
+    async with get_async_session_context() as session:
+        result = await session.exec(
+            select(DrugDataSetVersion).where(
+                DrugDataSetVersion.deferred_index_restore_statements.is_not(None)
+            )
+        )
+        pending = [
+            (dataset_version.id, dataset_version.deferred_index_restore_statements)
+            for dataset_version in result.all()
+        ]
+        for drug_dataset_version_id, restore_statements in pending:
+            log.warning(
+                f" An import of drug dataset version '{drug_dataset_version_id}' did not restore the indexes and foreign keys of the drug tables. Restore them now."
+            )
+            await _restore_drug_table_indexes(
+                session, drug_dataset_version_id, restore_statements
+            )
+
+
 class MMIPharmindex1_32(DrugDataSetImporterBase):
     def __init__(self):
         self.dataset_name = "MMI Pharmindex"
@@ -725,9 +843,29 @@ class MMIPharmindex1_32(DrugDataSetImporterBase):
             )
         )
         self._ensured_dataset_version: DrugDataSetVersion = None
-        self.batch_size = config.DRUG_IMPORTER_BATCH_SIZE
+        self.batch_size = self._get_batch_size()
         self._attr_def_cache = {}
         self._db_session: AsyncSession | None = None
+        self._copy_stats: Dict[str, CopyStats] = {}
+
+    def _get_batch_size(self) -> int:
+        """`DRUG_IMPORTER_BATCH_SIZE`, reduced if a batch of that many packages would not fit into `DRUG_IMPORTER_MEMORY_BUDGET_MB`."""
+        bytes_per_package = (
+            BATCH_BYTES_PER_PACKAGE_VECTORIZED
+            if config.DRUG_IMPORTER_VECTORIZED_TRANSFORM
+            else BATCH_BYTES_PER_PACKAGE_ROW_BY_ROW
+        )
+        batch_budget_bytes = (
+            config.DRUG_IMPORTER_MEMORY_BUDGET_MB * 1024 * 1024
+            - STREAMING_OVERHEAD_BYTES
+        )
+        return max(
+            MIN_BATCH_SIZE,
+            min(
+                config.DRUG_IMPORTER_BATCH_SIZE,
+                batch_budget_bytes // bytes_per_package,
+            ),
+        )
 
     def _get_ftp_client_for_remote_drug_data_source(self) -> FTPClient | None:
         ftp_client: FTPClient | None = None
@@ -927,10 +1065,13 @@ class MMIPharmindex1_32(DrugDataSetImporterBase):
         ]
 
     async def run_import(self):
+        # an earlier import may have been interrupted before it restored the indexes it deferred
+        await restore_deferred_drug_table_indexes()
         async with get_async_session_context() as db_session:
             self._db_session = db_session
             is_sqlite = config.SQL_DATABASE_URL.startswith("sqlite")
             is_pg = config.SQL_DATABASE_URL.startswith("postgresql")
+            restore_statements: List[str] = []
             try:
                 if is_sqlite:
                     # Reduce fsync overhead during bulk import.
@@ -969,24 +1110,51 @@ class MMIPharmindex1_32(DrugDataSetImporterBase):
                 self._attr_def_cache.clear()
                 gc.collect()
 
-                drug_data_objs: dict[type, List[dict]] = {}
-                async for i, drug_obj in async_enumerate(
-                    self._parse_drug_data(drug_dataset)
-                ):
-                    for table_type, data in drug_obj.items():
-                        if table_type not in drug_data_objs:
-                            drug_data_objs[table_type] = []
-                        drug_data_objs[table_type].extend(data)
-                    if i > 0 and i % self.batch_size == 0:
-                        await self.add_and_flush(table_data=drug_data_objs)
+                if config.DRUG_IMPORTER_DEFER_INDEXES:
+                    restore_statements = await self._drop_drug_table_indexes(
+                        drug_dataset
+                    )
 
-                if drug_data_objs:
-                    await self.add_and_flush(table_data=drug_data_objs)
+                if config.DRUG_IMPORTER_VECTORIZED_TRANSFORM:
+                    async for table_frames in self._transform_drug_data(
+                        drug_dataset
+                    ):
+                        await self.add_and_flush(table_frames=table_frames)
+                else:
+                    drug_data_objs: dict[type, List[dict]] = {}
+                    async for i, drug_obj in async_enumerate(
+                        self._parse_drug_data(drug_dataset)
+                    ):
+                        for table_type, data in drug_obj.items():
+                            if table_type not in drug_data_objs:
+                                drug_data_objs[table_type] = []
+                            drug_data_objs[table_type].extend(data)
+                        if i > 0 and i % self.batch_size == 0:
+                            await self.add_and_flush(table_data=drug_data_objs)
+
+                    if drug_data_objs:
+                        await self.add_and_flush(table_data=drug_data_objs)
 
                 # safety-net commit for any pending ORM state (e.g. if no drug rows)
                 await self.commit()
+                self._log_copy_stats()
 
             finally:
+                if restore_statements:
+                    # also when the import failed, the tables are shared with the active dataset
+                    import_error = sys.exc_info()[1]
+                    try:
+                        await _restore_drug_table_indexes(
+                            db_session, drug_dataset.id, restore_statements
+                        )
+                    except Exception:
+                        if import_error is None:
+                            raise
+                        # do not hide the import error. The statements stay stored on the dataset version
+                        # and are applied again on the next worker start or import.
+                        log.exception(
+                            " Failed to build the indexes and foreign keys of the drug tables after the failed import"
+                        )
                 try:
                     if is_sqlite:
                         await db_session.exec(text("PRAGMA synchronous=FULL"))
@@ -1000,41 +1168,100 @@ class MMIPharmindex1_32(DrugDataSetImporterBase):
                         f"Failed to reset session settings after import (session may be in a broken state): {cleanup_err}"
                     )
 
-    def _build_joined_dataframe(self) -> pl.DataFrame:
-        """Load all required CSV files and join them into one wide DataFrame.
+    async def _drop_drug_table_indexes(
+        self, drug_dataset: DrugDataSetVersion
+    ) -> List[str]:
+        """Drop the secondary indexes and foreign keys of the drug tables before the bulk load (see `DRUG_IMPORTER_DEFER_INDEXES`).
 
-        Resolves all cross-file attribute paths (documented in source_path fields
-        of mmi_rohdaten_r3_mappings) upfront with polars joins. The result is a
-        single DataFrame where each row is one PACKAGE with all its attributes
-        as flat columns (scalar) or list columns (multi-value).
+        Primary keys and unique indexes stay. Returns the statements that create the dropped indexes and foreign keys again.
+        The statements are stored on `drug_dataset` in the same transaction as the drops,
+        see `restore_deferred_drug_table_indexes` for an import that is interrupted before it restores them.
         """
-        src = self.source_dir
-        log.info(" Loading and joining CSV source files...")
-
-        package_df = pl.read_csv(
-            Path(src, "PACKAGE.CSV"),
-            separator=";",
-            infer_schema_length=0,
+        session = self._db_session
+        table_names = bindparam(
+            "table_names",
+            [table_type.__tablename__ for table_type in DRUG_DATA_TABLES],
+            expanding=True,
         )
-
-        product_cols = pl.read_csv(
-            Path(src, "PRODUCT.CSV"),
-            separator=";",
-            infer_schema_length=0,
-        ).select(
-            [
-                "ID",
-                "DISPENSINGTYPECODE",
-                "PRODUCTFOODTYPECODE",
-                "PRODUCTDIETETICSTYPECODE",
-            ]
+        drop_statements: List[str] = []
+        restore_statements: List[str] = []
+        if config.SQL_DATABASE_URL.startswith("postgresql"):
+            indexes = await session.execute(
+                text(
+                    "SELECT quote_ident(i.relname), pg_get_indexdef(ix.indexrelid) "
+                    "FROM pg_index ix "
+                    "JOIN pg_class t ON t.oid = ix.indrelid "
+                    "JOIN pg_class i ON i.oid = ix.indexrelid "
+                    "WHERE t.relname IN :table_names AND pg_table_is_visible(t.oid) "
+                    "AND NOT ix.indisprimary AND NOT ix.indisunique"
+                ).bindparams(table_names)
+            )
+            for index_name, index_def in indexes.all():
+                drop_statements.append(f"DROP INDEX {index_name}")
+                restore_statements.append(index_def)
+            foreign_keys = await session.execute(
+                text(
+                    "SELECT quote_ident(t.relname), quote_ident(c.conname), pg_get_constraintdef(c.oid) "
+                    "FROM pg_constraint c "
+                    "JOIN pg_class t ON t.oid = c.conrelid "
+                    "WHERE t.relname IN :table_names AND pg_table_is_visible(t.oid) "
+                    "AND c.contype = 'f'"
+                ).bindparams(table_names)
+            )
+            for table_name, constraint_name, constraint_def in foreign_keys.all():
+                drop_statements.append(
+                    f"ALTER TABLE {table_name} DROP CONSTRAINT {constraint_name}"
+                )
+                restore_statements.append(
+                    f"ALTER TABLE {table_name} ADD CONSTRAINT {constraint_name} {constraint_def}"
+                )
+        elif config.SQL_DATABASE_URL.startswith("sqlite"):
+            # SQLite does not enforce the foreign keys of the drug tables (see `enable_foreign_keys_on_sqlite`)
+            # and can not drop them, only the indexes are deferred.
+            indexes = await session.execute(
+                text(
+                    "SELECT name, sql FROM sqlite_master "
+                    "WHERE type = 'index' AND tbl_name IN :table_names "
+                    "AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%'"
+                ).bindparams(table_names)
+            )
+            for index_name, index_def in indexes.all():
+                drop_statements.append(f'DROP INDEX "{index_name}"')
+                restore_statements.append(index_def)
+        log.info(
+            f" Drop {len(drop_statements)} indexes and foreign keys of the drug tables until the import is loaded..."
         )
-
-        product_flag_cols = pl.read_csv(
-            Path(src, "PRODUCT_FLAG.CSV"),
+        await session.execute(
+            update(DrugDataSetVersion)
+            .where(DrugDataSetVersion.id == drug_dataset.id)
+            .values(deferred_index_restore_statements=restore_statements)
+        )
+        sa_conn = await session.connection()
+        for statement in drop_statements:
+            log.debug(f" {statement}")
+            await sa_conn.exec_driver_sql(statement)
+        await session.commit()
+        return restore_statements
+
+    def _scan_source_csv(
+        self, filename: str, columns: List[str], skip_missing_columns: bool = False
+    ) -> pl.LazyFrame:
+        """Lazy scan of a source CSV file. Only `columns` are read, all of them as strings."""
+        scan = pl.scan_csv(
+            Path(self.source_dir, filename),
             separator=";",
-            infer_schema_length=0,
-        ).select(
+            infer_schema=False,
+        )
+        if skip_missing_columns:
+            existing_columns = scan.collect_schema().names()
+            columns = [col for col in columns if col in existing_columns]
+        return scan.select(columns)
+
+    def _collect_product_attrs(self) -> List[pl.DataFrame]:
+        """Per product attributes shared by active and archived packages, each with one row per PRODUCTID.
+        Multi value attributes are aggregated to list columns."""
+        product_flag_cols = self._scan_source_csv(
+            "PRODUCT_FLAG.CSV",
             [
                 "PRODUCTID",
                 "CONTRACEPTIVE_FLAG",
@@ -1043,32 +1270,11 @@ class MMIPharmindex1_32(DrugDataSetImporterBase):
                 "HERBAL_FLAG",
                 "GENERIC_FLAG",
                 "HOMOEOPATHIC_FLAG",
-            ]
-        )
-
-        # One manufacturer per product — keep the first M-type company entry
-        manufacturer_cols = (
-            pl.read_csv(
-                Path(src, "PRODUCT_COMPANY.CSV"),
-                separator=";",
-                infer_schema_length=0,
-            )
-            .filter(pl.col("PRODUCTCOMPANYTYPECODE") == "M")
-            .select(["PRODUCTID", "COMPANYID"])
-            .unique("PRODUCTID")
+            ],
         )
 
-        item_df = pl.read_csv(
-            Path(src, "ITEM.CSV"),
-            separator=";",
-            infer_schema_length=0,
-        ).select(["ID", "PRODUCTID", "ITEMROACODE"])
-
-        item_atc_df = pl.read_csv(
-            Path(src, "ITEM_ATC.CSV"),
-            separator=";",
-            infer_schema_length=0,
-        ).select(["ITEMID", "ATCCODE"])
+        item_df = self._scan_source_csv("ITEM.CSV", ["ID", "PRODUCTID", "ITEMROACODE"])
+        item_atc_df = self._scan_source_csv("ITEM_ATC.CSV", ["ITEMID", "ATCCODE"])
 
         # Resolve PACKAGE→ITEM→ITEM_ATC; collect ATC codes as list per PRODUCTID
         atc_per_product = (
@@ -1087,164 +1293,142 @@ class MMIPharmindex1_32(DrugDataSetImporterBase):
         )
 
         keywords_per_product = (
-            pl.read_csv(
-                Path(src, "PRODUCT_KEYWORD.CSV"),
-                separator=";",
-                infer_schema_length=0,
-            )
-            .select(["PRODUCTID", "CODE"])
+            self._scan_source_csv("PRODUCT_KEYWORD.CSV", ["PRODUCTID", "CODE"])
             .filter(pl.col("CODE").is_not_null() & (pl.col("CODE") != ""))
             .group_by("PRODUCTID")
             .agg(pl.col("CODE").unique())
         )
 
         icd_per_product = (
-            pl.read_csv(
-                Path(src, "PRODUCT_ICD.CSV"),
-                separator=";",
-                infer_schema_length=0,
-            )
-            .select(["PRODUCTID", "ICDCODE"])
+            self._scan_source_csv("PRODUCT_ICD.CSV", ["PRODUCTID", "ICDCODE"])
             .filter(pl.col("ICDCODE").is_not_null() & (pl.col("ICDCODE") != ""))
             .group_by("PRODUCTID")
             .agg(pl.col("ICDCODE").unique())
         )
-
-        return (
-            package_df.join(
-                product_cols, left_on="PRODUCTID", right_on="ID", how="left"
-            )
-            .join(product_flag_cols, on="PRODUCTID", how="left")
-            .join(manufacturer_cols, on="PRODUCTID", how="left")
-            .join(atc_per_product, on="PRODUCTID", how="left")
-            .join(roa_per_product, on="PRODUCTID", how="left")
-            .join(keywords_per_product, on="PRODUCTID", how="left")
-            .join(icd_per_product, on="PRODUCTID", how="left")
-            .with_columns(pl.lit(None).alias("OFFMARKETDATE"))
-        )
-
-    def _build_archive_joined_dataframe(self) -> pl.DataFrame:
-        """Load ARCHIVE_* CSVs and join supporting tables into the same wide shape
-        as _build_joined_dataframe so both can be concatenated and processed by the
-        same _parse_drug_data_row logic.
-
-        Archive packages have OFFMARKETDATE set. Columns absent from the archive
-        schema (AMOUNTTEXT, IFAPHARMFORMCODE, etc.) are left as nulls via
-        diagonal_relaxed concat and polars fills them in automatically.
-        """
-        src = self.source_dir
-        log.info(" Loading and joining ARCHIVE CSV source files...")
-
-        archive_package_df = pl.read_csv(
-            Path(src, "ARCHIVE_PACKAGE.CSV"),
-            separator=";",
-            infer_schema_length=0,
-        )
-
-        # ARCHIVE_PRODUCT carries DISPENSINGTYPECODE and COMPANYID directly
-        # (no separate PRODUCT_COMPANY join needed)
-        archive_product_cols = pl.read_csv(
-            Path(src, "ARCHIVE_PRODUCT.CSV"),
-            separator=";",
-            infer_schema_length=0,
-        ).select(["ID", "DISPENSINGTYPECODE", "COMPANYID"])
-
-        product_flag_cols = pl.read_csv(
-            Path(src, "PRODUCT_FLAG.CSV"),
-            separator=";",
-            infer_schema_length=0,
-        ).select(
-            [
-                "PRODUCTID",
-                "CONTRACEPTIVE_FLAG",
-                "COSMETICS_FLAG",
-                "DIETARYSUPPLEMENT_FLAG",
-                "HERBAL_FLAG",
-                "GENERIC_FLAG",
-                "HOMOEOPATHIC_FLAG",
+        return [
+            lookup.collect()
+            for lookup in [
+                product_flag_cols,
+                atc_per_product,
+                roa_per_product,
+                keywords_per_product,
+                icd_per_product,
             ]
-        )
-
-        item_df = pl.read_csv(
-            Path(src, "ITEM.CSV"),
-            separator=";",
-            infer_schema_length=0,
-        ).select(["ID", "PRODUCTID", "ITEMROACODE"])
-
-        item_atc_df = pl.read_csv(
-            Path(src, "ITEM_ATC.CSV"),
-            separator=";",
-            infer_schema_length=0,
-        ).select(["ITEMID", "ATCCODE"])
-
-        atc_per_product = (
-            item_df.select(["ID", "PRODUCTID"])
-            .join(item_atc_df, left_on="ID", right_on="ITEMID", how="left")
-            .group_by("PRODUCTID")
-            .agg(pl.col("ATCCODE").drop_nulls().unique())
-        )
+        ]
 
-        roa_per_product = (
-            item_df.select(["PRODUCTID", "ITEMROACODE"])
-            .filter(pl.col("ITEMROACODE").is_not_null() & (pl.col("ITEMROACODE") != ""))
-            .group_by("PRODUCTID")
-            .agg(pl.col("ITEMROACODE").unique())
-        )
+    def _collect_product_cols(self) -> List[pl.DataFrame]:
+        """Per product columns of active packages, each with one row per PRODUCTID."""
+        product_cols = self._scan_source_csv(
+            "PRODUCT.CSV",
+            [
+                "ID",
+                "DISPENSINGTYPECODE",
+                "PRODUCTFOODTYPECODE",
+                "PRODUCTDIETETICSTYPECODE",
+            ],
+        ).rename({"ID": "PRODUCTID"})
 
-        keywords_per_product = (
-            pl.read_csv(
-                Path(src, "PRODUCT_KEYWORD.CSV"),
-                separator=";",
-                infer_schema_length=0,
+        # One manufacturer per product — keep the first M-type company entry
+        manufacturer_cols = (
+            self._scan_source_csv(
+                "PRODUCT_COMPANY.CSV",
+                ["PRODUCTID", "COMPANYID", "PRODUCTCOMPANYTYPECODE"],
             )
-            .select(["PRODUCTID", "CODE"])
-            .filter(pl.col("CODE").is_not_null() & (pl.col("CODE") != ""))
-            .group_by("PRODUCTID")
-            .agg(pl.col("CODE").unique())
+            .filter(pl.col("PRODUCTCOMPANYTYPECODE") == "M")
+            .select(["PRODUCTID", "COMPANYID"])
+            .unique("PRODUCTID")
         )
+        return [product_cols.collect(), manufacturer_cols.collect()]
 
-        icd_per_product = (
-            pl.read_csv(
-                Path(src, "PRODUCT_ICD.CSV"),
-                separator=";",
-                infer_schema_length=0,
+    def _collect_archive_product_cols(self) -> List[pl.DataFrame]:
+        """Per product columns of archived packages. ARCHIVE_PRODUCT carries DISPENSINGTYPECODE and COMPANYID
+        directly (no separate PRODUCT_COMPANY join needed)."""
+        return [
+            self._scan_source_csv(
+                "ARCHIVE_PRODUCT.CSV", ["ID", "DISPENSINGTYPECODE", "COMPANYID"]
             )
-            .select(["PRODUCTID", "ICDCODE"])
-            .filter(pl.col("ICDCODE").is_not_null() & (pl.col("ICDCODE") != ""))
-            .group_by("PRODUCTID")
-            .agg(pl.col("ICDCODE").unique())
-        )
+            .rename({"ID": "PRODUCTID"})
+            .collect()
+        ]
 
-        return (
-            archive_package_df.join(
-                archive_product_cols, left_on="PRODUCTID", right_on="ID", how="left"
+    def _count_drug_packages(self) -> int:
+        package_count = (
+            pl.concat(
+                [
+                    self._scan_source_csv(filename, ["PRODUCTID"])
+                    for filename in ["PACKAGE.CSV", "ARCHIVE_PACKAGE.CSV"]
+                ]
             )
-            .join(product_flag_cols, on="PRODUCTID", how="left")
-            .join(atc_per_product, on="PRODUCTID", how="left")
-            .join(roa_per_product, on="PRODUCTID", how="left")
-            .join(keywords_per_product, on="PRODUCTID", how="left")
-            .join(icd_per_product, on="PRODUCTID", how="left")
+            .select(pl.len())
+            .collect()
+            .item()
         )
+        if config.DRUG_DATA_IMPORT_MAX_ROWS:
+            return min(package_count, config.DRUG_DATA_IMPORT_MAX_ROWS)
+        return package_count
 
-    async def _parse_drug_data(
-        self, drug_dataset_version: DrugDataSetVersion
-    ) -> AsyncGenerator[Dict[type, List[Dict]], None]:
-        log.info(" Building joined drug DataFrame...")
-        joined_df = self._build_joined_dataframe()
-        log.info(" Building joined archive drug DataFrame...")
-        archive_df = self._build_archive_joined_dataframe()
-        log.info(
-            f" Combining {len(joined_df)} active and {len(archive_df)} archived drug packages..."
-        )
-        joined_df = pl.concat([joined_df, archive_df], how="diagonal_relaxed")
+    def _iter_drug_package_batches(self) -> Iterator[pl.DataFrame]:
+        """All active and archived packages to import, streamed in batches of `self.batch_size` packages.
 
-        if config.DRUG_DATA_IMPORT_MAX_ROWS:
+        Each row is one PACKAGE with all its attributes as flat columns (scalar) or
+        list columns (multi-value). The cross-file attribute paths (documented in
+        source_path fields of mmi_rohdaten_r3_mappings) are resolved by joining each
+        batch of PACKAGE.CSV (then ARCHIVE_PACKAGE.CSV) rows with the per product
+        lookup tables. Only the columns the field definitions need are read, and
+        only the lookup tables and the current batch are held in memory.
+
+        Archive packages have OFFMARKETDATE set. Columns absent from the archive
+        schema (AMOUNTTEXT, IFAPHARMFORMCODE, etc.) are missing in their batches
+        and imported as empty values.
+        """
+        log.info(" Loading per product source files...")
+        product_attrs = self._collect_product_attrs()
+        package_sources = [
+            (
+                self._scan_source_csv("PACKAGE.CSV", get_source_columns("PACKAGE.CSV")),
+                self._collect_product_cols() + product_attrs,
+            ),
+            (
+                self._scan_source_csv(
+                    "ARCHIVE_PACKAGE.CSV",
+                    get_source_columns("PACKAGE.CSV")
+                    + get_source_columns("ARCHIVE_PACKAGE.CSV"),
+                    skip_missing_columns=True,
+                ),
+                self._collect_archive_product_cols() + product_attrs,
+            ),
+        ]
+        remaining_rows = config.DRUG_DATA_IMPORT_MAX_ROWS or None
+        if remaining_rows:
             log.warning(
                 f" Config var 'DRUG_DATA_IMPORT_MAX_ROWS' is set to {config.DRUG_DATA_IMPORT_MAX_ROWS}. We may not import all drug entries."
             )
-            joined_df = joined_df.head(config.DRUG_DATA_IMPORT_MAX_ROWS)
+        log.info(
+            f" Stream drug packages in batches of {self.batch_size} packages..."
+        )
+        for package_scan, product_lookups in package_sources:
+            if remaining_rows is not None:
+                package_scan = package_scan.head(remaining_rows)
+            for packages_df in package_scan.collect_batches(
+                chunk_size=self.batch_size
+            ):
+                for product_lookup in product_lookups:
+                    packages_df = packages_df.join(
+                        product_lookup,
+                        on="PRODUCTID",
+                        how="left",
+                        maintain_order="left",
+                    )
+                if remaining_rows is not None:
+                    remaining_rows -= len(packages_df)
+                yield packages_df
+            if remaining_rows is not None and remaining_rows <= 0:
+                return
 
-        row_count_processing_max = len(joined_df)
+    async def _parse_drug_data(
+        self, drug_dataset_version: DrugDataSetVersion
+    ) -> AsyncGenerator[Dict[type, List[Dict]], None]:
+        row_count_processing_max = self._count_drug_packages()
 
         # Cache definitions once — not per-row
         code_defs = get_code_attr_definitions()
@@ -1256,18 +1440,23 @@ class MMIPharmindex1_32(DrugDataSetImporterBase):
         log.info(f" Parse drug data ({row_count_processing_max} packages)...")
         debug_perf_start = time.time()
 
-        for index, row in enumerate(joined_df.iter_rows(named=True)):
-            if index % 10000 == 0:
-                log.info(f" Processed {index} of {row_count_processing_max} packages")
-            yield self._parse_drug_data_row(
-                drug_dataset_version,
-                row,
-                code_defs,
-                attr_defs,
-                attr_ref_defs,
-                attr_multi_defs,
-                attr_multi_ref_defs,
-            )
+        index = 0
+        for packages_df in self._iter_drug_package_batches():
+            for row in packages_df.iter_rows(named=True):
+                if index % 10000 == 0:
+                    log.info(
+                        f" Processed {index} of {row_count_processing_max} packages"
+                    )
+                yield self._parse_drug_data_row(
+                    drug_dataset_version,
+                    row,
+                    code_defs,
+                    attr_defs,
+                    attr_ref_defs,
+                    attr_multi_defs,
+                    attr_multi_ref_defs,
+                )
+                index += 1
 
         total_time_sec = time.time() - debug_perf_start
         log.info(
@@ -1388,6 +1577,209 @@ class MMIPharmindex1_32(DrugDataSetImporterBase):
 
         return drug_objs
 
+    async def _transform_drug_data(
+        self, drug_dataset_version: DrugDataSetVersion
+    ) -> AsyncGenerator[Dict[type, List[pl.DataFrame]], None]:
+        """Vectorized alternative to `_parse_drug_data`. Yields the rows of the drug tables as polars DataFrames,
+        one batch of packages at a time (see `_iter_drug_package_batches`)."""
+        row_count_processing_max = self._count_drug_packages()
+
+        code_defs = get_code_attr_definitions()
+        attr_defs = get_attr_definitions()
+        attr_ref_defs = get_attr_ref_definitions()
+        attr_multi_defs = get_attr_multi_definitions()
+        attr_multi_ref_defs = get_attr_multi_ref_definitions()
+
+        log.info(
+            f" Transform drug data ({row_count_processing_max} packages, vectorized)..."
+        )
+        debug_perf_start = time.time()
+        processed_count = 0
+        for packages_df in self._iter_drug_package_batches():
+            yield self._transform_drug_data_batch(
+                drug_dataset_version,
+                packages_df,
+                code_defs,
+                attr_defs,
+                attr_ref_defs,
+                attr_multi_defs,
+                attr_multi_ref_defs,
+            )
+            processed_count += len(packages_df)
+            log.info(
+                f" Processed {processed_count} of {row_count_processing_max} packages"
+            )
+
+        total_time_sec = time.time() - debug_perf_start
+        log.info(
+            f" Time needed: {total_time_sec:.1f}s for {row_count_processing_max} drug entries."
+        )
+
+    def _transform_drug_data_batch(
+        self,
+        drug_dataset_version: DrugDataSetVersion,
+        packages_df: pl.DataFrame,
+        code_defs: List[DrugAttrFieldDefinitionContainer],
+        attr_defs: List[DrugAttrFieldDefinitionContainer],
+        attr_ref_defs: List[DrugAttrFieldDefinitionContainer],
+        attr_multi_defs: List[DrugAttrFieldDefinitionContainer],
+        attr_multi_ref_defs: List[DrugAttrFieldDefinitionContainer],
+    ) -> Dict[type, List[pl.DataFrame]]:
+        """The rows `_parse_drug_data_row` creates for all packages of `packages_df`, built with column expressions.
+
+        The attribute tables get one DataFrame per field (the field column unpivoted to rows, list columns exploded),
+        so the values keep their type, e.g. the flags stay booleans like in the per row path.
+        UUIDs are `pl.Object` columns of `uuid.UUID`s, as the SQL writers expect them.
+        """
+        package_count = len(packages_df)
+        drug_ids = pl.Series(
+            "drug_id", [uuid.uuid4() for _ in range(package_count)], dtype=pl.Object
+        )
+        packages_df = packages_df.with_row_index("drug_no")
+
+        def uuid_column(name: str, values: List[uuid.UUID]) -> pl.Series:
+            return pl.Series(name, values, dtype=pl.Object)
+
+        def cast(expr: pl.Expr, mapping: SourceAttrMapping) -> pl.Expr:
+            # like `_cast_raw_csv_value_if_needed`: empty strings are missing values
+            expr = pl.when(expr != "").then(expr)
+            if mapping.cast_func is None:
+                return expr
+            if mapping.cast_expr is None:
+                return expr.map_elements(mapping.cast_func, return_dtype=pl.Object)
+            return mapping.cast_expr(expr)
+
+        def source_col(mapping: SourceAttrMapping) -> pl.Expr:
+            # `row.get()` of the per row path. A column missing in the source files is empty.
+            if mapping.colname not in packages_df.columns:
+                return pl.lit(None, dtype=pl.String)
+            return pl.col(mapping.colname).cast(pl.String)
+
+        def with_drug_ids(values_df: pl.DataFrame) -> pl.DataFrame:
+            return values_df.with_columns(
+                drug_ids.gather(values_df["drug_no"])
+            ).drop("drug_no")
+
+        def scalar_values(
+            definition: DrugAttrFieldDefinitionContainer, skip_missing: bool
+        ) -> pl.DataFrame:
+            mapping = definition.source_mapping
+            values_df = packages_df.select(
+                "drug_no", cast(source_col(mapping), mapping).alias("value")
+            )
+            if skip_missing:
+                values_df = values_df.filter(pl.col("value").is_not_null())
+            return with_drug_ids(values_df)
+
+        def multi_values(
+            definition: DrugAttrFieldDefinitionContainer, skip_missing: bool
+        ) -> pl.DataFrame:
+            mapping = definition.source_mapping
+            if mapping.colname not in packages_df.columns:
+                return with_drug_ids(
+                    pl.DataFrame(
+                        schema={
+                            "drug_no": pl.UInt32,
+                            "value": pl.String,
+                            "value_index": pl.Int64,
+                        }
+                    )
+                )
+            # one row per list element. The index is the position in the source list, skipped values count as well.
+            values_df = (
+                packages_df.select(
+                    "drug_no",
+                    pl.col(mapping.colname).alias("value"),
+                    pl.int_ranges(0, pl.col(mapping.colname).list.len()).alias(
+                        "value_index"
+                    ),
+                )
+                .filter(pl.col("value").list.len() > 0)
+                .explode("value", "value_index")
+                .with_columns(cast(pl.col("value"), mapping).alias("value"))
+            )
+            if skip_missing:
+                values_df = values_df.filter(pl.col("value").is_not_null())
+            return with_drug_ids(values_df)
+
+        drug_df = packages_df.select(
+            [
+                cast(source_col(mapping), mapping).alias(root_prop_name)
+                for root_prop_name, mapping in root_props_mapping.items()
+            ]
+        ).with_columns(
+            drug_ids.alias("id"),
+            uuid_column(
+                "source_dataset_id", [drug_dataset_version.id] * package_count
+            ),
+            pl.lit(False).alias("is_custom_drug"),
+            pl.lit(None).alias("custom_drug_notes"),
+            pl.lit(None).alias("custom_created_by"),
+        )
+        table_frames: Dict[type, List[pl.DataFrame]] = {
+            DrugData: [drug_df],
+            DrugCode: [],
+            DrugVal: [],
+            DrugValRef: [],
+            DrugValMulti: [],
+            DrugValMultiRef: [],
+        }
+
+        for code_def in code_defs:
+            codes_df = scalar_values(code_def, skip_missing=True).rename(
+                {"value": "code"}
+            )
+            table_frames[DrugCode].append(
+                codes_df.with_columns(
+                    uuid_column("id", [uuid.uuid4() for _ in range(len(codes_df))]),
+                    pl.lit(code_def.field.id).alias("code_system_id"),
+                )
+            )
+
+        for attr_def in attr_defs:
+            table_frames[DrugVal].append(
+                scalar_values(attr_def, skip_missing=False).with_columns(
+                    pl.lit(attr_def.field.field_name).alias("field_name"),
+                    pl.lit(importername).alias("importer_name"),
+                )
+            )
+
+        for attr_ref_def in attr_ref_defs:
+            values_df = scalar_values(attr_ref_def, skip_missing=True)
+            table_frames[DrugValRef].append(
+                values_df.with_columns(
+                    pl.lit(attr_ref_def.field.field_name).alias("field_name"),
+                    pl.lit(importername).alias("importer_name"),
+                    uuid_column(
+                        "drug_dataset_version_fk",
+                        [drug_dataset_version.id] * len(values_df),
+                    ),
+                )
+            )
+
+        for attr_multi_def in attr_multi_defs:
+            table_frames[DrugValMulti].append(
+                multi_values(attr_multi_def, skip_missing=False).with_columns(
+                    pl.lit(attr_multi_def.field.field_name).alias("field_name"),
+                    pl.lit(importername).alias("importer_name"),
+                )
+            )
+
+        for attr_multi_ref_def in attr_multi_ref_defs:
+            values_df = multi_values(attr_multi_ref_def, skip_missing=True)
+            table_frames[DrugValMultiRef].append(
+                values_df.with_columns(
+                    pl.lit(attr_multi_ref_def.field.field_name).alias("field_name"),
+                    pl.lit(importername).alias("importer_name"),
+                    uuid_column(
+                        "drug_dataset_version_fk",
+                        [drug_dataset_version.id] * len(values_df),
+                    ),
+                )
+            )
+
+        return table_frames
+
     def _cast_raw_csv_value_if_needed(self, value: Any, mapping: SourceAttrMapping):
         if value == "" or value is None:
             return None
@@ -1395,7 +1787,9 @@ class MMIPharmindex1_32(DrugDataSetImporterBase):
             return mapping.cast_func(value)
         return str(value)
 
-    async def _pg_copy_table(self, pg_conn, table_type: type, data: list[dict]) -> None:
+    async def _pg_copy_table(
+        self, pg_conn, table_type: type, data: Iterable[dict]
+    ) -> None:
         """Bulk-load a batch into a single PostgreSQL table via the COPY protocol.
 
         psycopg3 3.3+ exposes COPY on Cursor, not Connection. We open a cursor on
@@ -1435,8 +1829,165 @@ class MMIPharmindex1_32(DrugDataSetImporterBase):
                 if buf:
                     await copy.write("".join(buf).encode("utf-8"))
 
+    async def _pg_copy_frame_binary(
+        self, pg_conn, table_type: type, frame: pl.DataFrame
+    ) -> None:
+        """Bulk-load a frame into a single PostgreSQL table via binary COPY.
+
+        The values are taken column wise from the frame and psycopg encodes them by the
+        PostgreSQL type of their column, without building a text line per row.
+        Falls back to the text COPY of `_pg_copy_table` for tables with other column types.
+        """
+        table = table_type.__table__
+        pg_types = [
+            PG_BINARY_COPY_TYPES.get(col.type.compile(dialect=postgresql.dialect()))
+            for col in table.columns
+        ]
+        if None in pg_types:
+            await self._pg_copy_table(
+                pg_conn, table_type, frame.iter_rows(named=True)
+            )
+            return
+        cols = [col.name for col in table.columns]
+        columns = [
+            self._pg_binary_copy_values(frame, col_name, pg_type)
+            for col_name, pg_type in zip(cols, pg_types)
+        ]
+        col_list = ", ".join(cols)
+        copy_stmt = f"COPY {table.name} ({col_list}) FROM STDIN (FORMAT BINARY)"
+        async with pg_conn.cursor() as cursor:
+            async with cursor.copy(copy_stmt) as copy:
+                copy.set_types(pg_types)
+                for row in zip(*columns):
+                    await copy.write_row(row)
+
+    def _pg_binary_copy_values(
+        self, frame: pl.DataFrame, col_name: str, pg_type: str
+    ) -> List[Any]:
+        """The values of a frame column as the binary COPY of a column of type `pg_type` takes them.
+
+        Values of VARCHAR columns are written like `_pg_copy_table` does: booleans as 't'/'f', everything else via `str()`.
+        """
+        if col_name not in frame.columns:
+            return [None] * len(frame)
+        series = frame.get_column(col_name)
+        if pg_type != "varchar" or series.dtype in (pl.String, pl.Null):
+            return series.to_list()
+        if series.dtype == pl.Boolean:
+            return pl.select(
+                pl.when(series).then(pl.lit("t")).when(~series).then(pl.lit("f"))
+            ).to_series().to_list()
+        if series.dtype == pl.Object:
+            return [None if val is None else str(val) for val in series.to_list()]
+        return series.cast(pl.String).to_list()
+
+    async def _pg_copy_tables(
+        self, table_chunks: Dict[type, List[List[dict] | pl.DataFrame]]
+    ) -> None:
+        """Bulk-load a batch of rows of all drug tables into PostgreSQL.
+
+        The drug rows are copied and committed on the import session first (together with
+        the pending list of values items), as the rows of all other tables reference them.
+        The attr, ref and code rows are independent of each other and are copied as
+        parallel COPY streams, each on its own pooled connection and in its own transaction,
+        at most `DRUG_IMPORTER_PARALLEL_COPY_STREAMS` at a time.
+        """
+        start_time = time.monotonic()
+        session = self._db_session
+        sa_conn = await session.connection()
+        raw_conn = await sa_conn.get_raw_connection()
+        await session.execute(text("SET CONSTRAINTS ALL DEFERRED"))
+        for chunk in self._split_copy_chunks(table_chunks.get(DrugData, [])):
+            await self._pg_copy_chunk(raw_conn.driver_connection, DrugData, chunk)
+        await session.commit()
+
+        copy_stream_slots = asyncio.Semaphore(
+            max(1, config.DRUG_IMPORTER_PARALLEL_COPY_STREAMS)
+        )
+        async with asyncio.TaskGroup() as task_group:
+            for table_type, chunks in table_chunks.items():
+                if table_type is DrugData:
+                    continue
+                for chunk in self._split_copy_chunks(chunks):
+                    task_group.create_task(
+                        self._pg_copy_chunk_on_own_connection(
+                            table_type, chunk, copy_stream_slots
+                        )
+                    )
+
+        row_count = sum(
+            len(chunk) for chunks in table_chunks.values() for chunk in chunks
+        )
+        duration = time.monotonic() - start_time
+        log.info(
+            f" Copied {row_count} rows in {duration:.1f}s ({row_count / max(duration, 1e-6):.0f} rows/s, "
+            f"up to {config.DRUG_IMPORTER_PARALLEL_COPY_STREAMS} parallel COPY streams)"
+        )
+
+    def _split_copy_chunks(
+        self, chunks: List[List[dict] | pl.DataFrame]
+    ) -> Iterator[List[dict] | pl.DataFrame]:
+        """The non empty chunks, split into COPY streams of at most `DRUG_IMPORTER_COPY_CHUNK_ROWS` rows."""
+        chunk_rows = config.DRUG_IMPORTER_COPY_CHUNK_ROWS
+        for chunk in chunks:
+            if len(chunk) == 0:
+                continue
+            if not chunk_rows or len(chunk) <= chunk_rows:
+                yield chunk
+            elif isinstance(chunk, pl.DataFrame):
+                yield from chunk.iter_slices(chunk_rows)
+            else:
+                for chunk_start in range(0, len(chunk), chunk_rows):
+                    yield chunk[chunk_start : chunk_start + chunk_rows]
+
+    async def _pg_copy_chunk_on_own_connection(
+        self,
+        table_type: type,
+        chunk: List[dict] | pl.DataFrame,
+        copy_stream_slots: asyncio.Semaphore,
+    ) -> None:
+        async with copy_stream_slots:
+            async with get_async_session_context() as session:
+                # LOCAL: the pooled connection is reused by others after the commit
+                await session.execute(text("SET LOCAL synchronous_commit = OFF"))
+                await session.execute(text("SET CONSTRAINTS ALL DEFERRED"))
+                sa_conn = await session.connection()
+                raw_conn = await sa_conn.get_raw_connection()
+                await self._pg_copy_chunk(raw_conn.driver_connection, table_type, chunk)
+                await session.commit()
+
+    async def _pg_copy_chunk(
+        self, pg_conn, table_type: type, chunk: List[dict] | pl.DataFrame
+    ) -> None:
+        start_time = time.monotonic()
+        if not isinstance(chunk, pl.DataFrame):
+            await self._pg_copy_table(pg_conn, table_type, chunk)
+        elif config.DRUG_IMPORTER_PG_COPY_FORMAT == "binary":
+            await self._pg_copy_frame_binary(pg_conn, table_type, chunk)
+        else:
+            await self._pg_copy_table(
+                pg_conn, table_type, chunk.iter_rows(named=True)
+            )
+        stats = self._copy_stats.setdefault(table_type.__tablename__, CopyStats())
+        stats.rows += len(chunk)
+        stats.seconds += time.monotonic() - start_time
+        log.debug(
+            f" COPY {len(chunk)} '{table_type.__name__}' rows ({time.monotonic() - start_time:.2f}s)"
+        )
+
+    def _log_copy_stats(self):
+        """Throughput per table, to tune `DRUG_IMPORTER_BATCH_SIZE` and `DRUG_IMPORTER_PARALLEL_COPY_STREAMS`."""
+        for table_name, stats in self._copy_stats.items():
+            log.info(
+                f" COPY '{table_name}': {stats.rows} rows in {stats.seconds:.1f}s "
+                f"({stats.rows / max(stats.seconds, 1e-6):.0f} rows/s per stream)"
+            )
+
     async def add_and_flush(
-        self, objs: List[SQLModel] = None, table_data: dict[type, list[dict]] = None
+        self,
+        objs: List[SQLModel] = None,
+        table_data: dict[type, list[dict]] = None,
+        table_frames: dict[type, list[pl.DataFrame]] = None,
     ):
         session = self._db_session
         is_pg = config.SQL_DATABASE_URL.startswith("postgresql")
@@ -1447,18 +1998,28 @@ class MMIPharmindex1_32(DrugDataSetImporterBase):
             await session.flush()
             objs.clear()
 
+        if table_frames:
+            log.debug(" Write row frames to database...")
+            if is_pg:
+                await self._pg_copy_tables(table_frames)
+            else:
+                for table_type, frames in table_frames.items():
+                    for frame in frames:
+                        if frame.is_empty():
+                            continue
+                        log.debug(
+                            f" Write {len(frame)} '{table_type.__name__}' rows..."
+                        )
+                        await session.execute(insert(table_type), frame.to_dicts())
+                await session.commit()
+            table_frames.clear()
+
         if table_data:
             log.debug(" Write rows to database...")
             if is_pg:
-                sa_conn = await session.connection()
-                raw_conn = await sa_conn.get_raw_connection()
-                pg_conn = raw_conn.driver_connection
-                await session.execute(text("SET CONSTRAINTS ALL DEFERRED"))
-                for table_type, data in table_data.items():
-                    if not data:
-                        continue
-                    log.debug(f" COPY {len(data)} '{table_type.__name__}' rows...")
-                    await self._pg_copy_table(pg_conn, table_type, data)
+                await self._pg_copy_tables(
+                    {table_type: [data] for table_type, data in table_data.items()}
+                )
             else:
                 for table_type, data in table_data.items():
                     if not data:
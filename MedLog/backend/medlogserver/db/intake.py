@@ -22,11 +22,8 @@ from medlogserver.model.intake import (
     IntakeUpdate,
     IntakeDetailListItem,
 )
-from medlogserver.model.drug_data.drug import DrugData
-from medlogserver.model.drug_data.api_drug_model_factory import (
-    DrugAPIRead,
-    drug_to_drugAPI_obj,
-)
+from medlogserver.model.drug_data.api_drug_model_factory import DrugAPIRead
+from medlogserver.db.drug_data.drug_api_read_document import DrugAPIReadDocumentCRUD
 from medlogserver.db._base_crud import create_crud_base
 from medlogserver.api.paginator import QueryParamsInterface
 
@@ -124,21 +121,22 @@ class IntakeCRUD(
             query = query.where(Intake.interview_id == filter_interview_id)
         if pagination:
             query = pagination.append_to_query(query)
-        results = await self.session.exec(statement=query)
+        results = (await self.session.exec(statement=query)).all()
+        async with DrugAPIReadDocumentCRUD.crud_context(
+            session=self.session
+        ) as drug_doc_crud:
+            drug_doc_crud: DrugAPIReadDocumentCRUD = drug_doc_crud  # typing hint help
+            drugs_read: Dict[UUID, DrugAPIRead] = await drug_doc_crud.get_multiple(
+                ids=list({intake.drug_id for intake, _, _ in results})
+            )
         detailed_intakes: List[IntakeDetailListItem] = []
         for intake, interview, event in results:
-            drug_read: DrugAPIRead = None
-            drug_result = await self.session.exec(
-                select(DrugData).where(DrugData.id == intake.drug_id)
-            )
-            drug = drug_result.one()
-            drug_read = await drug_to_drugAPI_obj(drug)
             detailed_intakes.append(
                 IntakeDetailListItem(
                     **intake.model_dump(),
                     event=event,
                     interview=interview,
-                    drug=drug_read,
+                    drug=drugs_read[intake.drug_id],
                 )
             )
 
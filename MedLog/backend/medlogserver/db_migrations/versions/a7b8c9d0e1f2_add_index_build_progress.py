@@ -0,0 +1,53 @@
+"""Add index build progress to drug_search_generic_sql_state
+
+The search index can be aggregated in several drug id ranges
+(see DRUG_SEARCH_INDEX_BUILD_PARTITIONS). The state reports how many are done.
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a7b8c9d0e1f2"
+down_revision: Union[str, Sequence[str], None] = "f6a7b8c9d0e1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NEW_COLUMNS = ["index_build_partition_count", "index_build_partitions_done"]
+
+
+def upgrade():
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+
+    if dialect == "postgresql":
+        for column_name in NEW_COLUMNS:
+            op.add_column(
+                "drug_search_generic_sql_state",
+                sa.Column(column_name, sa.Integer(), nullable=True),
+            )
+    elif dialect == "sqlite":
+        with op.batch_alter_table("drug_search_generic_sql_state") as batch_op:
+            for column_name in NEW_COLUMNS:
+                batch_op.add_column(sa.Column(column_name, sa.Integer(), nullable=True))
+
+
+def downgrade():
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+
+    if dialect == "postgresql":
+        for column_name in NEW_COLUMNS:
+            op.drop_column("drug_search_generic_sql_state", column_name)
+    elif dialect == "sqlite":
+        with op.batch_alter_table("drug_search_generic_sql_state") as batch_op:
+            for column_name in NEW_COLUMNS:
+                batch_op.drop_column(column_name)
@@ -0,0 +1,50 @@
+"""Drop the content indexes of drug_search_generic_sql_cache
+
+A search index rebuild swaps drug_search_generic_sql_cache and drug_search_generic_sql_cache_shadow
+by renaming the tables, so both need the same structure. SQLite can not rename indexes, the named
+indexes on search_index_content and search_cache_codes would end up on the wrong table.
+No search query uses them (searches match infixes on the normalized columns).
+The shadow table is recreated with the foreign key of the cache table on startup.
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "b8c9d0e1f2a3"
+down_revision: Union[str, Sequence[str], None] = "a7b8c9d0e1f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CONTENT_INDEXES = {
+    "ix_drug_search_generic_sql_cache_search_index_content": "search_index_content",
+    "ix_drug_search_generic_sql_cache_search_cache_codes": "search_cache_codes",
+}
+
+
+def upgrade():
+    for index_name in CONTENT_INDEXES:
+        op.drop_index(
+            index_name, table_name="drug_search_generic_sql_cache", if_exists=True
+        )
+    # The shadow table is empty outside of index builds
+    op.execute(sa.text("DROP TABLE IF EXISTS drug_search_generic_sql_cache_shadow"))
+
+
+def downgrade():
+    for index_name, column_name in CONTENT_INDEXES.items():
+        op.create_index(
+            index_name,
+            "drug_search_generic_sql_cache",
+            [column_name],
+            unique=False,
+            if_not_exists=True,
+        )
+    op.execute(sa.text("DROP TABLE IF EXISTS drug_search_generic_sql_cache_shadow"))
@@ -0,0 +1,37 @@
+"""Add deferred_index_restore_statements column to drug_dataset_version table.
+
+A drug import with DRUG_IMPORTER_DEFER_INDEXES drops the indexes and foreign keys of the drug
+tables. The statements that create them again are stored on the dataset version until they are
+applied, so an import interrupted before the restore can be repaired on the next worker start.
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "c9d0e1f2a3b4"
+down_revision: Union[str, Sequence[str], None] = "b8c9d0e1f2a3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column(
+        "drug_dataset_version",
+        sa.Column(
+            "deferred_index_restore_statements",
+            sa.JSON(),
+            nullable=True,
+        ),
+    )
+
+
+def downgrade():
+    op.drop_column("drug_dataset_version", "deferred_index_restore_statements")
@@ -0,0 +1,36 @@
+"""Add a (code_system_id, code) index to drug_code
+
+Exact drug code lookups (e.g. a scanned PZN) had to scan the whole drug_code table.
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "e5f6a7b8c9d0"
+down_revision: Union[str, Sequence[str], None] = "d4e5f6a7b8c9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_drug_code_code_system_id_code",
+        "drug_code",
+        ["code_system_id", "code"],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_drug_code_code_system_id_code", table_name="drug_code", if_exists=True
+    )
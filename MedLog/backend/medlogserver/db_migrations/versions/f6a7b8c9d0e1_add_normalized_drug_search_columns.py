@@ -0,0 +1,120 @@
+"""Add normalized copies of the search content to drug_search_generic_sql_cache
+
+The drug search compared every row with LOWER() on each search. The content is now stored
+lower cased, umlaut/ß normalized and whitespace collapsed at index build time.
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from medlogserver.utils import normalize_search_text, normalize_search_text_pg_sql
+
+
+revision: str = "f6a7b8c9d0e1"
+down_revision: Union[str, Sequence[str], None] = "e5f6a7b8c9d0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NEW_COLUMNS = ["search_index_content_normalized", "search_cache_codes_normalized"]
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade():
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+
+    if dialect == "postgresql":
+        for column_name in NEW_COLUMNS:
+            op.add_column(
+                "drug_search_generic_sql_cache",
+                sa.Column(column_name, sa.String(), nullable=False, server_default=""),
+            )
+    elif dialect == "sqlite":
+        with op.batch_alter_table("drug_search_generic_sql_cache") as batch_op:
+            for column_name in NEW_COLUMNS:
+                batch_op.add_column(
+                    sa.Column(
+                        column_name, sa.String(), nullable=False, server_default=""
+                    )
+                )
+    # The shadow table is empty outside of index builds. It is recreated with the new columns on startup.
+    op.execute(sa.text("DROP TABLE IF EXISTS drug_search_generic_sql_cache_shadow"))
+
+    # Backfill the current index generation, so searches keep finding drugs until the next index build.
+    if dialect == "postgresql":
+        op.execute(
+            sa.text(
+                "UPDATE drug_search_generic_sql_cache SET "
+                "search_index_content_normalized = "
+                + normalize_search_text_pg_sql("search_index_content")
+                + ", search_cache_codes_normalized = "
+                + normalize_search_text_pg_sql("search_cache_codes")
+            )
+        )
+        return
+    cache_table = sa.table(
+        "drug_search_generic_sql_cache",
+        sa.column("id"),
+        sa.column("search_index_content", sa.String()),
+        sa.column("search_cache_codes", sa.String()),
+        sa.column("search_index_content_normalized", sa.String()),
+        sa.column("search_cache_codes_normalized", sa.String()),
+    )
+    update_statement = (
+        cache_table.update()
+        .where(cache_table.c.id == sa.bindparam("row_id"))
+        .values(
+            search_index_content_normalized=sa.bindparam("content_normalized"),
+            search_cache_codes_normalized=sa.bindparam("codes_normalized"),
+        )
+    )
+    # Page through the table by id, a large drug dataset does not fit into memory at once.
+    last_id = None
+    while True:
+        batch_query = (
+            sa.select(
+                cache_table.c.id,
+                cache_table.c.search_index_content,
+                cache_table.c.search_cache_codes,
+            )
+            .order_by(cache_table.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        )
+        if last_id is not None:
+            batch_query = batch_query.where(cache_table.c.id > last_id)
+        rows = bind.execute(batch_query).all()
+        if not rows:
+            break
+        bind.execute(
+            update_statement,
+            [
+                {
+                    "row_id": row_id,
+                    "content_normalized": normalize_search_text(content),
+                    "codes_normalized": normalize_search_text(codes),
+                }
+                for row_id, content, codes in rows
+            ],
+        )
+        last_id = rows[-1][0]
+
+
+def downgrade():
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+
+    if dialect == "postgresql":
+        for column_name in NEW_COLUMNS:
+            op.drop_column("drug_search_generic_sql_cache", column_name)
+    elif dialect == "sqlite":
+        with op.batch_alter_table("drug_search_generic_sql_cache") as batch_op:
+            for column_name in NEW_COLUMNS:
+                batch_op.drop_column(column_name)
+    op.execute(sa.text("DROP TABLE IF EXISTS drug_search_generic_sql_cache_shadow"))
@@ -21,6 +21,7 @@ from medlogserver.model.drug_data.drug_code_system import DrugCodeSystem
 from medlogserver.model.drug_data.drug_code import DrugCode
 from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
 from medlogserver.model.drug_data.drug import DrugData
+from medlogserver.model.drug_data.drug_api_read_document import DrugAPIReadDocument
 from medlogserver.db.drug_data.drug_search.search_module_generic_sql import (
     GenericSQLDrugSearchState,
     GenericSQLDrugSearchCache,
@@ -46,4 +47,5 @@ all_tables = [
     DrugCode,
     DrugDataSetVersion,
     DrugData,
+    DrugAPIReadDocument,
 ]
@@ -9,3 +9,4 @@ from medlogserver.model.drug_data.drug_attr_field_lov_item import (
 from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
 from medlogserver.model.drug_data.drug_code import DrugCode
 from medlogserver.model.drug_data.drug_code_system import DrugCodeSystem
+from medlogserver.model.drug_data.drug_api_read_document import DrugAPIReadDocument
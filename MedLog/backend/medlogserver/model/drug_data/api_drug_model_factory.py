@@ -35,6 +35,7 @@ class DrugApiReadClassFactory:
         self.importer_class = DRUG_IMPORTERS[config.DRUG_IMPORTER_PLUGIN]
         self.ref_value_models: Dict[str, Type[BaseModel]] = {}
         self.all_optional = all_optional
+        self.drug_to_api_obj_converter: Optional[DrugToDrugAPIConverter] = None
 
     def get_drug_api_read_class(
         self,
@@ -69,6 +70,14 @@ class DrugApiReadClassFactory:
                 )
         return self.drug_api_read_class
 
+    def get_drug_to_api_obj_converter(self) -> "DrugToDrugAPIConverter":
+        """A converter from `DrugData` to the drug api read class of this factory, specialized for the field layout of the current drug importer."""
+        if self.drug_to_api_obj_converter is None:
+            self.drug_to_api_obj_converter = DrugToDrugAPIConverter(
+                self.get_drug_api_read_class()
+            )
+        return self.drug_to_api_obj_converter
+
     async def get_drug_api_read_class_asyncio(self) -> Type[BaseModel]:
         """
         Dynamic creation of Pydantic classes für Drugs.
@@ -348,6 +357,98 @@ class DrugApiReadClassFactory:
         return create_model(f"Codes", **attrs)
 
 
+class DrugToDrugAPIConverter:
+    """Converts `DrugData` objects into a dynamic drug api read class (`DrugAPIRead`/`CustomDrugAPIRead`).
+
+    The field names of the generated model are looked up once on init. A conversion groups the drug attributes
+    by field name in one pass over the drug and validates the result with a single `model_validate` call.
+    """
+
+    def __init__(self, drug_api_read_class: Type[BaseModel]):
+        self.drug_api_read_class = drug_api_read_class
+        fields = drug_api_read_class.model_fields
+        self.root_field_names = [
+            name
+            for name in fields.keys()
+            if name in DrugData.model_fields
+            and name
+            not in ["attrs", "attrs_ref", "attrs_multi", "attrs_multi_ref", "codes"]
+        ]
+        self.code_field_names = list(fields["codes"].annotation.model_fields.keys())
+        self.attrs_field_names = list(fields["attrs"].annotation.model_fields.keys())
+        self.attrs_multi_field_names = list(
+            fields["attrs_multi"].annotation.model_fields.keys()
+        )
+        self.attrs_ref_field_names = set(
+            fields["attrs_ref"].annotation.model_fields.keys()
+        )
+        self.attrs_multi_ref_field_names = list(
+            fields["attrs_multi_ref"].annotation.model_fields.keys()
+        )
+
+    def __call__(self, drug: DrugData) -> BaseModel:
+        vals = {name: getattr(drug, name) for name in self.root_field_names}
+
+        # first entry wins, if there are multiple values for a single value field
+        codes = {}
+        for code in drug.codes:
+            codes.setdefault(code.code_system_id, code.code)
+        vals["codes"] = {name: codes.get(name) for name in self.code_field_names}
+
+        attrs = {}
+        for attr in drug.attrs:
+            attrs.setdefault(attr.field_name, attr.value)
+        vals["attrs"] = {name: attrs.get(name) for name in self.attrs_field_names}
+
+        attrs_ref = {}
+        for attr_ref in drug.attrs_ref:
+            if (
+                attr_ref.field_name in self.attrs_ref_field_names
+                and attr_ref.field_name not in attrs_ref
+            ):
+                attrs_ref[attr_ref.field_name] = {
+                    "value": attr_ref.value,
+                    "display": (
+                        attr_ref.lov_item.display
+                        if attr_ref.lov_item is not None
+                        else None
+                    ),
+                }
+        vals["attrs_ref"] = attrs_ref
+
+        attrs_multi: Dict[str, List[DrugValMulti]] = {}
+        for attr_multi in drug.attrs_multi:
+            attrs_multi.setdefault(attr_multi.field_name, []).append(attr_multi)
+        vals["attrs_multi"] = {
+            name: [
+                v.value
+                for v in sorted(attrs_multi.get(name, []), key=lambda o: o.value_index)
+            ]
+            for name in self.attrs_multi_field_names
+        }
+
+        attrs_multi_ref: Dict[str, List[DrugValMultiRef]] = {}
+        for attr_multi_ref in drug.attrs_multi_ref:
+            attrs_multi_ref.setdefault(attr_multi_ref.field_name, []).append(
+                attr_multi_ref
+            )
+        vals["attrs_multi_ref"] = {
+            name: [
+                {
+                    "value": mrval.value,
+                    "display": (
+                        mrval.lov_item.display if mrval.lov_item is not None else None
+                    ),
+                }
+                for mrval in sorted(
+                    attrs_multi_ref.get(name, []), key=lambda o: o.value_index
+                )
+            ]
+            for name in self.attrs_multi_ref_field_names
+        }
+        return self.drug_api_read_class.model_validate(vals)
+
+
 drug_read_api_factory = DrugApiReadClassFactory()
 DrugAPIRead: Type[BaseModel] = drug_read_api_factory.get_drug_api_read_class()
 custom_drug_read_api_factory = DrugApiReadClassFactory(all_optional=True)
@@ -356,115 +457,18 @@ CustomDrugAPIRead: Type[BaseModel] = (
 )
 
 
-# async def drug_to_drugAPI_obj(drug: Drug) -> DrugAPIRead:
+drug_to_drugAPI_converter = drug_read_api_factory.get_drug_to_api_obj_converter()
+custom_drug_to_drugAPI_converter = (
+    custom_drug_read_api_factory.get_drug_to_api_obj_converter()
+)
+
+
 async def drug_to_drugAPI_obj(
     drug: DrugData,
 ) -> DrugAPIRead | CustomDrugAPIRead:
-    # log.debug(f"drug_to_drugAPI_obj drug: {drug}")
-    vals = {}
-    for field_name, field_val in iter(drug):
-        if field_name in [
-            "attrs",
-            "attrs_ref",
-            "attrs_multi",
-            "attrs_multi_ref",
-            "codes",
-        ]:
-            continue
-        if field_name in DrugAPIRead.model_fields.keys():
-            vals[field_name] = field_val
-
-    drug_codes = {}
-    codes_submodel: Type[BaseModel] = DrugAPIRead.model_fields["codes"].annotation
-    for drug_code_field_name in codes_submodel.model_fields.keys():
-        drug_codes[drug_code_field_name] = next(
-            (
-                code.code
-                for code in drug.codes
-                if code.code_system_id == drug_code_field_name
-            ),
-            None,
-        )
-
-    drug_attrs: Dict[str, List[Dict[str, str]]] = {}
-    drug_attrs_submodel: Type[BaseModel] = DrugAPIRead.model_fields["attrs"].annotation
-    for drug_attrs_field_name in drug_attrs_submodel.model_fields.keys():
-        val: DrugVal = next(
-            (attr for attr in drug.attrs if attr.field_name == drug_attrs_field_name),
-            None,
-        )
-        try:
-            drug_attrs[drug_attrs_field_name] = val.value if val is not None else None
-        except AttributeError as e:
-            log.debug(
-                f"drug_attrs_field_name: {drug_attrs_field_name}, drug.attrs: {drug.attrs}"
-            )
-            raise e
-
-    drug_attrs_multi: Dict[str, List[Dict[str, str]]] = {}
-    drug_attrs_multi_submodel: Type[BaseModel] = DrugAPIRead.model_fields[
-        "attrs_multi"
-    ].annotation
-    for drug_attrs_multi_field_name in drug_attrs_multi_submodel.model_fields.keys():
-        multi_vals: List[DrugValMulti] = [
-            attrs_multi
-            for attrs_multi in drug.attrs_multi
-            if attrs_multi.field_name == drug_attrs_multi_field_name
-        ]
-        multi_vals.sort(key=lambda o: o.value_index)
-
-        drug_attrs_multi[drug_attrs_multi_field_name] = [v.value for v in multi_vals]
-
-    drug_attrs_ref: Dict[str, List[Dict[str, str]]] = {}
-    drug_attrs_ref_submodel: Type[BaseModel] = DrugAPIRead.model_fields[
-        "attrs_ref"
-    ].annotation
-    for drug_attrs_ref_field_name in drug_attrs_ref_submodel.model_fields.keys():
-        val: DrugValRef = next(
-            (
-                attr_ref
-                for attr_ref in drug.attrs_ref
-                if attr_ref.field_name == drug_attrs_ref_field_name
-            ),
-            None,
-        )
-        if val is not None:
-            drug_attrs_ref[drug_attrs_ref_field_name] = {
-                "value": val.value,
-                "display": val.lov_item.display if val.lov_item is not None else None,
-            }
-
-    drug_attrs_multi_ref: Dict[str, List] = {}
-    attrs_multi_ref_submodel: Type[BaseModel] = DrugAPIRead.model_fields[
-        "attrs_multi_ref"
-    ].annotation
-
-    for drug_attrs_multi_ref_field_name in attrs_multi_ref_submodel.model_fields.keys():
-        multi_ref_vals: List[DrugValMultiRef] = [
-            attr_m_ref
-            for attr_m_ref in drug.attrs_multi_ref
-            if attr_m_ref.field_name == drug_attrs_multi_ref_field_name
-        ]
-        multi_ref_vals.sort(key=lambda o: o.value_index)
-        drug_attrs_multi_ref[drug_attrs_multi_ref_field_name] = [
-            {
-                "value": mrval.value,
-                "display": (
-                    mrval.lov_item.display if mrval.lov_item is not None else None
-                ),
-            }
-            for mrval in multi_ref_vals
-        ]
-
-    vals["codes"] = drug_codes
-    vals["attrs"] = drug_attrs
-    vals["attrs_ref"] = drug_attrs_ref
-    vals["attrs_multi"] = drug_attrs_multi
-    vals["attrs_multi_ref"] = drug_attrs_multi_ref
-    # log.debug(f"DrugAPIRead.model_validate ->vals {vals}")
     if drug.is_custom_drug:
-        return CustomDrugAPIRead.model_validate(vals)
-    return DrugAPIRead.model_validate(vals)
+        return custom_drug_to_drugAPI_converter(drug)
+    return drug_to_drugAPI_converter(drug)
 
 
 #### UNSED CODE?
@@ -0,0 +1,22 @@
+import uuid
+from sqlmodel import Field
+
+from medlogserver.model.drug_data._base import DrugModelTableBase
+
+
+class DrugAPIReadDocument(DrugModelTableBase, table=True):
+    __tablename__ = "drug_api_read_document"
+    __table_args__ = {
+        "comment": "Precomputed API representation (`DrugAPIRead`/`CustomDrugAPIRead`) of a drug. Saves loading and converting all drug attributes on every read."
+    }
+    drug_id: uuid.UUID = Field(
+        primary_key=True,
+        foreign_key="drug.id",
+        ondelete="CASCADE",
+        description="one to one relation to a drug",
+    )
+    is_custom_drug: bool = Field(default=False)
+    schema_hash: str = Field(
+        description="Hash of the drug API model schema the document was build with. Documents with another hash are outdated and will be ignored.",
+    )
+    document: str = Field(description="The JSON serialized drug API object")
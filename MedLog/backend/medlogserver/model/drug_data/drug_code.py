@@ -1,7 +1,7 @@
 from typing import List, Self, TYPE_CHECKING
 import uuid
 from sqlmodel import Field, SQLModel, Relationship
-from sqlalchemy import String, Integer, Column, SmallInteger
+from sqlalchemy import String, Integer, Column, SmallInteger, Index
 
 from medlogserver.model.drug_data._base import (
     DrugModelTableBase,
@@ -19,9 +19,11 @@ class DrugCodeApi(SQLModel):
 
 class DrugCode(DrugModelTableBase, DrugCodeApi, table=True):
     __tablename__ = "drug_code"
-    __table_args__ = {
-        "comment": "Tracks different version of same drug indexes that were imported"
-    }
+    __table_args__ = (
+        # exact code lookups (e.g. a scanned PZN) -> drug
+        Index("ix_drug_code_code_system_id_code", "code_system_id", "code"),
+        {"comment": "Tracks different version of same drug indexes that were imported"},
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     drug_id: uuid.UUID = Field(
         primary_key=True, foreign_key="drug.id", ondelete="CASCADE"
@@ -2,7 +2,7 @@ from typing import List, Self, Optional, Literal
 import uuid
 import datetime
 from sqlmodel import Field, SQLModel
-from sqlalchemy import String, Integer, Column, SmallInteger
+from sqlalchemy import String, Integer, Column, SmallInteger, JSON
 
 from medlogserver.model.drug_data._base import (
     DrugModelTableBase,
@@ -67,3 +67,8 @@ class DrugDataSetVersion(DrugModelTableBase, table=True):
         default=None,
         description="Datetime when the dataset was cleaned of unused drug data after being disabled.",
     )
+    deferred_index_restore_statements: Optional[List[str]] = Field(
+        default=None,
+        description="While an import of this dataset has the indexes and foreign keys of the drug tables dropped (see `DRUG_IMPORTER_DEFER_INDEXES`), the statements that create them again. Pending statements of an interrupted import are applied on the next worker start or import.",
+        sa_column=Column(JSON(none_as_null=True)),
+    )
@@ -606,6 +606,53 @@ def slugify_string(s: str, spacer_string: str = "-") -> str:
     return s.strip(spacer_string).lower()
 
 
+# The search text normalization is an explicit character mapping, so the SQL version of it (`normalize_search_text_pg_sql()`)
+# gives the same result independent of the locale of the database. Lower casing covers the latin-1 letters.
+SEARCH_TEXT_TRANSLATE_FROM = (
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZÀÁÂÃÅÆÇÈÉÊËÌÍÎÏÐÑÒÓÔÕØÙÚÛÝÞ"
+    # Umlauts match their base vowel, like in the accent insensitive 'PostgresTrgmDrugSearch'-engine (unaccent)
+    "ÄÖÜäöü"
+    # whitespace
+    "\t\n\v\f\r\xa0"
+)
+SEARCH_TEXT_TRANSLATE_TO = (
+    "abcdefghijklmnopqrstuvwxyzàáâãåæçèéêëìíîïðñòóôõøùúûýþ" "aouaou" "      "
+)
+SEARCH_TEXT_REPLACE = {"ß": "ss", "ẞ": "ss"}
+SEARCH_TEXT_TRANSLATION = str.maketrans(
+    SEARCH_TEXT_TRANSLATE_FROM, SEARCH_TEXT_TRANSLATE_TO
+) | str.maketrans(SEARCH_TEXT_REPLACE)
+
+
+def normalize_search_text(s: str) -> str:
+    """Lower case, umlauts and ß replaced (ä -> a, ß -> ss), whitespace collapsed to single spaces.
+    The drug search stores its content normalized like this, so search terms only need to be normalized once per search.
+    """
+    if not s:
+        return ""
+    return " ".join(filter(None, s.translate(SEARCH_TEXT_TRANSLATION).split(" ")))
+
+
+def _pg_string_literal(s: str) -> str:
+    # Escape string, so the whitespace chars are not written raw into the statement
+    return (
+        "E'"
+        + "".join(
+            c if c.isprintable() and c not in "'\\" else f"\\u{ord(c):04x}"
+            for c in s
+        )
+        + "'"
+    )
+
+
+def normalize_search_text_pg_sql(col_expr: str) -> str:
+    """PostgreSQL expression normalizing the text of `col_expr` exactly like `normalize_search_text()`."""
+    expr = f"TRANSLATE({col_expr}, {_pg_string_literal(SEARCH_TEXT_TRANSLATE_FROM)}, {_pg_string_literal(SEARCH_TEXT_TRANSLATE_TO)})"
+    for char, replacement in SEARCH_TEXT_REPLACE.items():
+        expr = f"REPLACE({expr}, {_pg_string_literal(char)}, {_pg_string_literal(replacement)})"
+    return f"BTRIM(REGEXP_REPLACE({expr}, ' {{2,}}', ' ', 'g'))"
+
+
 def get_default_file_data(
     config_APP_PROVISIONING_DEFAULT_DATA_YAML_FILE, raise_error=None
 ) -> dict:
@@ -126,6 +126,30 @@ class DrugDataLoader:
         search_engine: GenericSQLDrugSearchEngine = search_engine_class()
 
         await search_engine.build_index()
+        await self._build_drug_api_documents()
+
+    async def _build_drug_api_documents(self):
+        from medlogserver.db.drug_data.drug_api_read_document import (
+            DrugAPIReadDocumentCRUD,
+        )
+
+        async with get_async_session_context() as session:
+            async with DrugDataSetVersionCRUD.crud_context(
+                session
+            ) as drug_dataset_crud:
+                drug_dataset_crud: DrugDataSetVersionCRUD = drug_dataset_crud
+                dataset_versions = [
+                    await drug_dataset_crud.get_current_active(),
+                    await drug_dataset_crud.get_custom(),
+                ]
+            dataset_version_ids = [d.id for d in dataset_versions if d is not None]
+            if not dataset_version_ids:
+                return
+            async with DrugAPIReadDocumentCRUD.crud_context(session) as drug_doc_crud:
+                drug_doc_crud: DrugAPIReadDocumentCRUD = drug_doc_crud
+                built_count = await drug_doc_crud.build_missing(dataset_version_ids)
+        if built_count:
+            log.info(f"Built {built_count} precomputed drug API documents.")
 
     async def load_new_drug_data_if_available(self):
         await self._create_inital_drugdataset_entry_if_needed()
@@ -1,6 +1,6 @@
 import datetime
 
-from sqlmodel import select, and_, delete, col, func
+from sqlmodel import select, and_, delete, col, func, exists
 from sqlalchemy.sql.operators import is_
 
 
@@ -10,7 +10,11 @@ from medlogserver.worker.task import TaskBase
 from medlogserver.db._session import get_async_session_context
 from medlogserver.config import Config
 from medlogserver.log import get_logger
-from medlogserver.model.drug_data import DrugData, DrugDataSetVersion
+from medlogserver.model.drug_data import (
+    DrugData,
+    DrugDataSetVersion,
+    DrugAPIReadDocument,
+)
 from medlogserver.model.intake import Intake
 
 log = get_logger(modulename="Task:DrugDataSetCleaner")
@@ -71,6 +75,16 @@ class DrugDataRemoveObsoleteDrugDataEntries:
                         )
                     )
                 )
+                if config.SQL_DATABASE_URL.startswith("sqlite"):
+                    # SQLite does not enforce the foreign keys of the drug tables (see `enable_foreign_keys_on_sqlite`).
+                    # The precomputed API document of a deleted drug would still be served by `/drug/id/{drug_id}`.
+                    await session.exec(
+                        delete(DrugAPIReadDocument).where(
+                            ~exists().where(
+                                DrugData.id == DrugAPIReadDocument.drug_id
+                            )
+                        )
+                    )
                 await session.commit()
                 batch_deleted = result.rowcount
                 log.info(
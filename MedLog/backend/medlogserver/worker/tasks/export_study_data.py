@@ -112,6 +112,10 @@ class StudyDataExporter:
         self.target_file = target_file
         self.events: List[Event] = []
         self.interviews: List[Interview] = []
+        # studies document the same drugs over and over. Load every drug only once.
+        self.drug_data: Dict[
+            uuid.UUID, Tuple[List[DrugCodesExport], List[DrugDataExport]]
+        ] = {}
 
     async def run(self) -> str:
         job_result = await self.export_data_and_write_to_file()
@@ -166,6 +170,8 @@ class StudyDataExporter:
     async def _get_drug_data(
         self, drug_id: uuid.UUID
     ) -> Tuple[List[DrugCodesExport], List[DrugDataExport]]:
+        if drug_id in self.drug_data:
+            return self.drug_data[drug_id]
         codes: List[DrugCodesExport] = []
         attrs: List[DrugDataExport] = []
         async with get_async_session_context() as session:
@@ -274,7 +280,7 @@ class StudyDataExporter:
                             drug_attr_reference_code=attr_multi_ref_codes,
                         )
                     )
-
+        self.drug_data[drug_id] = (codes, attrs)
         return codes, attrs
 
     async def _get_interview_data(self, interview_id: uuid.UUID) -> InterviewExport:
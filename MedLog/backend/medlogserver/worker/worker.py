@@ -114,9 +114,28 @@ async def _fence_stale_running_jobs():
                 await worker_job_crud.update(job)
 
 
+async def _restore_deferred_drug_table_indexes():
+    """On worker startup, restore the indexes and foreign keys of the drug tables a killed drug import had dropped.
+
+    With `DRUG_IMPORTER_DEFER_INDEXES` the import drops them for the bulk load. If the worker process was
+    killed before the import restored them, the active drug dataset would be left without them until the next import.
+    """
+    from medlogserver.db.drug_data.importers.mmi_pharmindex import (
+        restore_deferred_drug_table_indexes,
+    )
+
+    try:
+        await restore_deferred_drug_table_indexes()
+    except Exception:
+        log.exception(
+            "Restoring the indexes and foreign keys of the drug tables failed. Will be retried before the next drug import."
+        )
+
+
 async def _inital_setup_scheduled_background_tasks() -> AsyncIOScheduler:
     await _wait_for_datascheme_healthy()
     await _fence_stale_running_jobs()
+    await _restore_deferred_drug_table_indexes()
     log.info("Setup background tasks.....")
     background_jobs: List[WorkerJob] = []
     try:
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Micro benchmark of the conversion of drugs (`DrugData`) into API objects (`DrugAPIRead`).
+
+Compares the per drug cost of the schema specialized converter (`drug_to_drugAPI_obj`)
+with the generic reference conversion (`drug_to_drugAPI_obj_reference` in `tests/tests_drug_api_converter.py`)
+and checks both produce the same objects.
+The drugs are generated in memory with all fields of the configured drug importer set; no database is needed.
+
+Run from MedLog/backend via:
+    python scripts/benchmarks/bench_drug_api_converter.py --drugs 2000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, List, get_args
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = SCRIPT_DIR.parent.parent
+
+# Make medlogserver and the reference converter of the tests importable without a package install
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "tests"))
+
+from medlogserver.model.drug_data.drug import DrugData
+from medlogserver.model.drug_data.drug_attr import (
+    DrugVal,
+    DrugValRef,
+    DrugValMulti,
+    DrugValMultiRef,
+)
+from medlogserver.model.drug_data.drug_attr_field_lov_item import DrugAttrFieldLovItem
+from medlogserver.model.drug_data.drug_code import DrugCode
+from medlogserver.model.drug_data.api_drug_model_factory import (
+    DrugAPIRead,
+    drug_to_drugAPI_obj,
+)
+from tests_drug_api_converter import drug_to_drugAPI_obj_reference
+from pydantic import BaseModel
+
+
+def _ref_value_annotation(annotation: Any) -> Any:
+    """Annotation of `value` in the ref value model wrapped in an annotation like `Optional[List[AttrRefVal...]]`"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation.model_fields["value"].annotation
+    for arg in get_args(annotation):
+        value_annotation = _ref_value_annotation(arg)
+        if value_annotation is not None:
+            return value_annotation
+    return None
+
+
+def _sample_value(annotation: Any, index: int) -> str:
+    """A value, stored as string like in the DB, that validates against `annotation`"""
+    type_repr = str(annotation)
+    if "bool" in type_repr:
+        return "true" if index % 2 else "false"
+    if "int" in type_repr:
+        return str(index)
+    if "float" in type_repr:
+        return f"{index}.5"
+    if "datetime.date" in type_repr:
+        return (datetime.date(2020, 1, 1) + datetime.timedelta(days=index)).isoformat()
+    return f"value {index}"
+
+
+def generate_drugs(count: int, multi_val_count: int = 3) -> List[DrugData]:
+    fields = DrugAPIRead.model_fields
+    source_dataset_id = uuid.uuid4()
+    drugs = []
+    for i in range(count):
+        drug_id = uuid.uuid4()
+        drug = DrugData(
+            id=drug_id,
+            source_dataset_id=source_dataset_id,
+            trade_name=f"Drug {i}",
+            market_access_date=datetime.date(2020, 1, 1),
+            custom_drug_notes=None,
+        )
+        for name, field in fields["attrs"].annotation.model_fields.items():
+            drug.attrs.append(
+                DrugVal(
+                    drug_id=drug_id,
+                    field_name=name,
+                    value=_sample_value(field.annotation, i),
+                    importer_name="bench",
+                )
+            )
+        for name, field in fields["attrs_multi"].annotation.model_fields.items():
+            for value_index in reversed(range(multi_val_count)):
+                drug.attrs_multi.append(
+                    DrugValMulti(
+                        drug_id=drug_id,
+                        field_name=name,
+                        value_index=value_index,
+                        value=_sample_value(field.annotation, i + value_index),
+                        importer_name="bench",
+                    )
+                )
+        for name, field in fields["attrs_ref"].annotation.model_fields.items():
+            value_annotation = _ref_value_annotation(field.annotation)
+            value = _sample_value(value_annotation, i)
+            drug.attrs_ref.append(
+                DrugValRef(
+                    drug_id=drug_id,
+                    field_name=name,
+                    value=value,
+                    importer_name="bench",
+                    drug_dataset_version_fk=source_dataset_id,
+                    lov_item=DrugAttrFieldLovItem(
+                        field_name=name,
+                        importer_name="bench",
+                        value=value,
+                        display=f"Display {value}",
+                        drug_dataset_version_fk=source_dataset_id,
+                    ),
+                )
+            )
+        for name, field in fields["attrs_multi_ref"].annotation.model_fields.items():
+            value_annotation = _ref_value_annotation(field.annotation)
+            for value_index in reversed(range(multi_val_count)):
+                value = _sample_value(value_annotation, i + value_index)
+                drug.attrs_multi_ref.append(
+                    DrugValMultiRef(
+                        drug_id=drug_id,
+                        field_name=name,
+                        value_index=value_index,
+                        value=value,
+                        importer_name="bench",
+                        drug_dataset_version_fk=source_dataset_id,
+                        lov_item=DrugAttrFieldLovItem(
+                            field_name=name,
+                            importer_name="bench",
+                            value=value,
+                            display=f"Display {value}",
+                            drug_dataset_version_fk=source_dataset_id,
+                        ),
+                    )
+                )
+        for name in fields["codes"].annotation.model_fields.keys():
+            drug.codes.append(
+                DrugCode(drug_id=drug_id, code_system_id=name, code=f"{name}-{i}")
+            )
+        drugs.append(drug)
+    return drugs
+
+
+async def _time_per_drug(convert, drugs: List[DrugData], rounds: int) -> float:
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for drug in drugs:
+            await convert(drug)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best / len(drugs)
+
+
+async def _reference(drug: DrugData):
+    return drug_to_drugAPI_obj_reference(drug)
+
+
+async def main(drug_count: int, rounds: int):
+    drugs = generate_drugs(drug_count)
+    for drug in drugs:
+        fast = await drug_to_drugAPI_obj(drug)
+        reference = drug_to_drugAPI_obj_reference(drug)
+        if fast != reference:
+            raise ValueError(
+                f"Converters disagree on drug {drug.trade_name}:\n{fast}\n{reference}"
+            )
+    validated = await _time_per_drug(_reference, drugs, rounds)
+    specialized = await _time_per_drug(drug_to_drugAPI_obj, drugs, rounds)
+    print(f"drugs: {drug_count}, best of {rounds} rounds")
+    print(f"reference conversion:      {validated * 1_000_000:10.1f} µs/drug")
+    print(f"specialized converter:     {specialized * 1_000_000:10.1f} µs/drug")
+    print(f"speedup:                   {validated / specialized:10.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drugs", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.drugs, args.rounds))
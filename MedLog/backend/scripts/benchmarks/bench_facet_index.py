@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Benchmark of the drug facet index (`DrugFacetIndex`) for growing drug counts.
+
+Generates synthetic drugs with the reference fields of the MMI Pharmindex importer, with about as many distinct values
+as in the real dataset and a skewed distribution (few common, many rare values). Compares filtering and facet counting
+of the facet index against python sets of drug ids and reports the memory of the postings, next to what a bitset for
+every value would take. No database is needed.
+
+Run from MedLog/backend via:
+    python scripts/benchmarks/bench_facet_index.py --sizes 10000 100000 300000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Set, Tuple
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = SCRIPT_DIR.parent.parent
+
+# Make medlogserver importable without a package install
+sys.path.insert(0, str(BACKEND_DIR))
+
+import medlogserver.model
+from medlogserver.db.drug_data.drug_search.facet_index import DrugFacetIndex
+
+# field name -> (count of distinct values, values per drug). Roughly the counts of the MMI Pharmindex dataset.
+FIELDS = {
+    "abgabestatus": (4, 1),
+    "vertriebsstatus": (5, 1),
+    "normgroesse": (8, 1),
+    "lebensmittel": (3, 1),
+    "diaetetikum": (3, 1),
+    "darreichungsform": (400, 1),
+    "hersteller": (8000, 1),
+    "applikationsart": (60, 2),
+    "keywords": (5000, 3),
+    "icd10": (15000, 5),
+}
+
+
+def generate_ref_vals(
+    drug_ids: List[uuid.UUID], rng: random.Random
+) -> List[Tuple[uuid.UUID, str, str]]:
+    ref_vals = []
+    for field_name, (value_count, values_per_drug) in FIELDS.items():
+        # zipf like: value i is picked with weight 1/(i+1)
+        values = [str(i) for i in range(value_count)]
+        weights = [1 / (i + 1) for i in range(value_count)]
+        for _ in range(values_per_drug):
+            for drug_id, value in zip(
+                drug_ids, rng.choices(values, weights=weights, k=len(drug_ids))
+            ):
+                ref_vals.append((drug_id, field_name, value))
+    return ref_vals
+
+
+def percentile(values: List[float], p: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(p) - 1]
+
+
+def measure(func: Callable, runs: int) -> List[float]:
+    latencies_us = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        latencies_us.append((time.perf_counter() - start) * 1_000_000)
+    return latencies_us
+
+
+def report(label: str, latencies_us: List[float]):
+    print(
+        f"    {label:<34} p50 {percentile(latencies_us, 50):9.1f}µs"
+        f" p95 {percentile(latencies_us, 95):9.1f}µs"
+        f" p99 {percentile(latencies_us, 99):9.1f}µs"
+    )
+
+
+def run(size: int, runs: int, result_share: float):
+    rng = random.Random(size)
+    drug_ids = [uuid.uuid4() for _ in range(size)]
+    ref_vals = generate_ref_vals(drug_ids, rng)
+
+    start = time.perf_counter()
+    index = DrugFacetIndex(generation=())
+    index.add_ref_vals(ref_vals)
+    build_sec = time.perf_counter() - start
+    all_postings = [
+        postings for values in index.postings.values() for postings in values.values()
+    ]
+    postings_mb = (
+        sum(
+            (
+                postings.bit_length() // 8
+                if isinstance(postings, int)
+                else postings.itemsize * len(postings)
+            )
+            for postings in all_postings
+        )
+        / 1024
+        / 1024
+    )
+    bitmaps_only_mb = len(all_postings) * ((size + 7) // 8) / 1024 / 1024
+    bitmap_count = sum(isinstance(postings, int) for postings in all_postings)
+
+    # the straight forward alternative: (field, value) -> set of drug ids
+    postings: Dict[Tuple[str, str], Set[uuid.UUID]] = {}
+    for drug_id, field_name, value in ref_vals:
+        postings.setdefault((field_name, value), set()).add(drug_id)
+
+    print(
+        f"{size:>9} drugs | {len(ref_vals):>9} ref values | build {build_sec:6.2f}s"
+        f" | postings {postings_mb:6.1f} MB ({bitmap_count} of {len(all_postings)} values as bitset)"
+        f" | bitset for every value {bitmaps_only_mb:8.1f} MB"
+    )
+    filters = {"abgabestatus": "0", "darreichungsform": "1"}
+    rare_filters = {"abgabestatus": "0", "hersteller": "100"}
+    result_drug_ids = rng.sample(drug_ids, int(size * result_share))
+    field_names = list(FIELDS)
+
+    report(
+        "filter (facet index)",
+        measure(lambda: index.drug_ids_of_postings(index.filter(filters)), runs),
+    )
+
+    def _filter_sets(filters: Dict[str, str]):
+        drug_id_sets = [postings[(k, v)] for k, v in filters.items()]
+        return list(set.intersection(*drug_id_sets))
+
+    report("filter (sets)", measure(lambda: _filter_sets(filters), runs))
+    report(
+        "filter rare value (facet index)",
+        measure(lambda: index.drug_ids_of_postings(index.filter(rare_filters)), runs),
+    )
+    report("filter rare value (sets)", measure(lambda: _filter_sets(rare_filters), runs))
+
+    report(
+        f"facets of {len(result_drug_ids)} drugs (facet index)",
+        measure(
+            lambda: index.facet_counts(result_drug_ids, field_names),
+            runs,
+        ),
+    )
+
+    def _facets_sets():
+        result_set = set(result_drug_ids)
+        return {
+            field_name: {
+                value: len(drug_id_set & result_set)
+                for (posting_field_name, value), drug_id_set in postings.items()
+                if posting_field_name == field_name
+            }
+            for field_name in field_names
+        }
+
+    report(f"facets of {len(result_drug_ids)} drugs (sets)", measure(_facets_sets, runs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument(
+        "--result-share",
+        type=float,
+        default=0.05,
+        help="Share of all drugs in the search result to count the facets of",
+    )
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.runs, args.result_share)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Benchmark of the fuzzy drug name index (`DrugNameFuzzyIndex`) for growing dictionary sizes.
+
+Generates synthetic drug name like words, misspells some of them by 1-2 random edits
+and reports build time, lookup latency percentiles and how often the original word was found.
+No database is needed.
+
+Run from MedLog/backend via:
+    python scripts/benchmarks/bench_fuzzy_index.py --sizes 1000 10000 100000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import string
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = SCRIPT_DIR.parent.parent
+
+# Make medlogserver importable without a package install
+sys.path.insert(0, str(BACKEND_DIR))
+
+import medlogserver.model
+from medlogserver.db.drug_data.drug_search.fuzzy_index import DrugNameFuzzyIndex
+
+SYLLABLES = [
+    "met", "for", "min", "ram", "ipr", "il", "ibu", "pro", "fen", "ator", "va",
+    "sta", "tin", "amlo", "di", "pin", "lis", "ino", "pril", "ome", "pra", "zol",
+    "cand", "esar", "tan", "levo", "thy", "rox", "gaba", "pent", "sert", "ral",
+    "oxy", "cod", "one", "pan", "tro", "xin", "dex", "ali", "ver", "mab", "cor",
+]
+
+
+def generate_words(count: int, rng: random.Random) -> List[str]:
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return list(words)
+
+
+def misspell(word: str, edits: int, rng: random.Random) -> str:
+    for _ in range(edits):
+        pos = rng.randrange(len(word))
+        operation = rng.choice(["insert", "delete", "replace", "swap"])
+        if operation == "insert":
+            word = word[:pos] + rng.choice(string.ascii_lowercase) + word[pos:]
+        elif operation == "delete" and len(word) > 4:
+            word = word[:pos] + word[pos + 1 :]
+        elif operation == "swap" and pos < len(word) - 1:
+            word = word[:pos] + word[pos + 1] + word[pos] + word[pos + 2 :]
+        else:
+            word = word[:pos] + rng.choice(string.ascii_lowercase) + word[pos + 1 :]
+    return word
+
+
+def percentile(values: List[float], p: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(p) - 1]
+
+
+def run(size: int, queries: int, max_edit_distance: int, measure_memory: bool):
+    rng = random.Random(size)
+    words = generate_words(size, rng)
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    index = DrugNameFuzzyIndex(generation=(), max_edit_distance=max_edit_distance)
+    for word in words:
+        index.add_word(word)
+    build_sec = time.perf_counter() - start
+    memory_mb = None
+    if measure_memory:
+        memory_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+        tracemalloc.stop()
+
+    latencies_us = []
+    found = 0
+    for _ in range(queries):
+        word = rng.choice(words)
+        query = misspell(word, rng.randint(1, max_edit_distance), rng)
+        start = time.perf_counter()
+        matches = index.lookup(query)
+        latencies_us.append((time.perf_counter() - start) * 1_000_000)
+        if any(match[0] == word for match in matches):
+            found += 1
+    print(
+        f"{size:>9} words | {len(index.prefix_deletes) + len(index.suffix_deletes):>9} deletes | build {build_sec:6.2f}s"
+        + (f" | {memory_mb:7.1f} MB" if memory_mb is not None else "")
+        + f" | lookup p50 {percentile(latencies_us, 50):7.1f}µs"
+        f" p95 {percentile(latencies_us, 95):7.1f}µs"
+        f" p99 {percentile(latencies_us, 99):7.1f}µs"
+        f" | original found {found / queries:6.1%}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--max-edit-distance", type=int, default=2)
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="Measure the memory of the index with tracemalloc (slows down the build)",
+    )
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.queries, args.max_edit_distance, args.memory)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Benchmark of the on-disk snapshot of the in-memory drug search index ('MemoryIndexDrugSearch'-engine).
+
+Builds a `DrugMemoryIndex` of synthetic drugs and writes its snapshot. Then starts fresh processes that either
+build the index again (what every MedLog process did on start before) or map the snapshot, and reports the startup time,
+the private memory (RssAnon, not shared with other processes) and the search latency of both.
+Checks that both return the same search results.
+Needs the usual MedLog configuration environment (e.g. the `.env` file). Memory figures need Linux (/proc).
+
+Run from MedLog/backend via:
+    python scripts/benchmarks/bench_memory_index_snapshot.py --drugs 300000 --searches 200
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = SCRIPT_DIR.parent.parent
+
+# Make medlogserver importable without a package install
+sys.path.insert(0, str(BACKEND_DIR))
+
+import medlogserver.model
+from medlogserver.db.drug_data.drug_search._base import tokenize_search_term
+from medlogserver.db.drug_data.drug_search.search_module_memory_index import (
+    DrugMemoryIndex,
+)
+
+SYLLABLES = ["me", "to", "pro", "lol", "for", "min", "ibu", "fen", "sar", "tan", "cor", "dex", "lin", "va", "xa", "zol"]
+MANUFACTURERS = ["ratiopharm", "AbZ", "Hexal", "STADA", "Aristo", "Heumann", "AL", "1A Pharma"]
+FORMS = ["Tabletten", "Filmtabletten", "Kapseln", "Brausetabletten", "Tropfen"]
+DISPENSING_TYPES = ["0", "1", "2", "3"]
+
+
+def percentile(values: List[float], p: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(p) - 1]
+
+
+def generate_documents(size: int) -> List[Tuple]:
+    rng = random.Random(size)
+    substances = [
+        "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).capitalize()
+        for _ in range(max(1, size // 10))
+    ]
+    documents = []
+    for _ in range(size):
+        substance = rng.choice(substances)
+        content = (
+            f"{substance} {rng.choice(MANUFACTURERS)} {rng.choice([5, 10, 20, 40, 100, 500])} mg "
+            f"{rng.choice(FORMS)} {substance.lower()} {rng.randrange(10**8):08d}"
+        )
+        documents.append(
+            (
+                uuid.UUID(int=rng.getrandbits(128)),
+                content,
+                f"PZN:{rng.randrange(10**8):08d}",
+                None,
+                False,
+                rng.choice(DISPENSING_TYPES),
+            )
+        )
+    return documents
+
+
+def search_terms(documents: List[Tuple], count: int) -> List[str]:
+    rng = random.Random(count)
+    terms = []
+    for _ in range(count):
+        words = rng.choice(documents)[1].split()
+        word = rng.choice(words[:2])
+        terms.append(word[: rng.randint(3, max(3, len(word)))])
+    return terms
+
+
+def build_index(documents: List[Tuple]) -> DrugMemoryIndex:
+    index = DrugMemoryIndex(dataset_version_id=uuid.UUID(int=0))
+    for drug_id, content, codes, market_exit_date, is_custom_drug, dispensing_type in documents:
+        doc_no = index.add_document(drug_id, content, codes, market_exit_date, is_custom_drug)
+        index.add_ref_val(doc_no, "dispensingtype", dispensing_type)
+    return index
+
+
+def private_memory_kb() -> int:
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("RssAnon:"):
+            return int(line.split()[1])
+    return -1
+
+
+def run_child(mode: str, size: int, snapshot_path: Path, search_count: int) -> Dict:
+    """Runs in a fresh process: build or map the index, then search."""
+    documents = generate_documents(size) if mode == "build" else None
+    terms = search_terms(documents or generate_documents(size), search_count)
+    memory_before_kb = private_memory_kb()
+    start = time.perf_counter()
+    if mode == "build":
+        index = build_index(documents)
+        del documents
+    else:
+        index = DrugMemoryIndex.from_snapshot(snapshot_path)
+    startup_sec = time.perf_counter() - start
+    latencies_ms = []
+    checksum = hashlib.md5()
+    for term in terms:
+        search_term, tokens = tokenize_search_term(term)
+        start = time.perf_counter()
+        results = index.search(search_term, tokens, filter_ref_vals={"dispensingtype": "1"} if len(term) % 2 else None)
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+        checksum.update(repr(results).encode())
+    return {
+        "startup_sec": startup_sec,
+        "private_memory_mb": (private_memory_kb() - memory_before_kb) / 1024,
+        "latencies_ms": latencies_ms,
+        "checksum": checksum.hexdigest(),
+    }
+
+
+def main(size: int, search_count: int):
+    snapshot_path = Path(tempfile.mkdtemp(prefix="medlog_bench_")) / "bench.snapshot"
+    documents = generate_documents(size)
+    start = time.perf_counter()
+    index = build_index(documents)
+    build_sec = time.perf_counter() - start
+    start = time.perf_counter()
+    index.write_snapshot(snapshot_path, generation="bench")
+    print(
+        f"{size} drugs, {len(index.words)} words | build {build_sec:.2f}s | write snapshot {time.perf_counter() - start:.2f}s"
+        f" ({snapshot_path.stat().st_size / 2**20:.0f} MB)"
+    )
+    del index, documents
+    checksums = set()
+    for mode in ["build", "map"]:
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--drugs", str(size), "--searches", str(search_count), "--snapshot", str(snapshot_path)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        latencies_ms = result["latencies_ms"]
+        print(
+            f"  {mode:<5} startup {result['startup_sec']:7.3f}s | private memory {result['private_memory_mb']:7.1f} MB"
+            f" | search p50 {percentile(latencies_ms, 50):7.2f}ms p95 {percentile(latencies_ms, 95):7.2f}ms"
+            f" p99 {percentile(latencies_ms, 99):7.2f}ms"
+        )
+        checksums.add(result["checksum"])
+    snapshot_path.unlink()
+    if len(checksums) != 1:
+        raise ValueError("The mapped snapshot returned other search results than the built index")
+    print("  results identical")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drugs", type=int, default=300000)
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--child", choices=["build", "map"], help=argparse.SUPPRESS)
+    parser.add_argument("--snapshot", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(run_child(args.child, args.drugs, args.snapshot, args.searches)))
+    else:
+        main(args.drugs, args.searches)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Benchmark of the row by row and the vectorized transformation of the MMI Pharmindex drug importer.
+
+Writes synthetic MMI Pharmindex source files (`write_source_files` of `tests/drug_import_utils.py`),
+joins them once like the importer does and transforms the packages into the rows of the drug tables, once with
+`_parse_drug_data` (row by row) and once with `_transform_drug_data` (polars expressions, see `DRUG_IMPORTER_VECTORIZED_TRANSFORM`).
+Reports the throughput of both and checks that both create the same rows (the generated UUIDs aside).
+Needs the usual MedLog configuration environment (e.g. the `.env` file).
+
+Run from MedLog/backend via:
+    python scripts/benchmarks/bench_mmi_transform.py --packages 300000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = SCRIPT_DIR.parent.parent
+
+# Make medlogserver and the drug import helpers of the tests importable without a package install
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "tests"))
+
+import polars as pl
+
+import medlogserver.model
+from medlogserver.db.drug_data.importers.mmi_pharmindex import MMIPharmindex1_32
+from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
+from drug_import_utils import (
+    write_source_files,
+    canonical_rows,
+    transform_row_by_row,
+    transform_vectorized,
+    frame_rows,
+)
+
+
+def report(name: str, duration: float, package_count: int, row_count: int):
+    print(
+        f"  {name:<21} {duration:7.2f}s | {package_count / duration:9.0f} packages/s | {row_count / duration:9.0f} rows/s"
+    )
+
+
+async def main(package_count: int, batch_size: int):
+    source_dir = Path(tempfile.mkdtemp(prefix="medlog_bench_"))
+    start = time.perf_counter()
+    write_source_files(source_dir, package_count, random.Random(package_count))
+    print(f"{package_count} packages written to {source_dir} ({time.perf_counter() - start:.1f}s)")
+
+    importer = MMIPharmindex1_32()
+    importer.source_dir = source_dir
+    importer.batch_size = batch_size
+    start = time.perf_counter()
+    joined_df = pl.concat(list(importer._iter_drug_package_batches()), how="diagonal_relaxed")
+    print(f"  join source files     {time.perf_counter() - start:7.2f}s")
+    # The list columns are aggregated with `unique()`, which does not keep an order. Transform the same joined rows twice.
+    importer._iter_drug_package_batches = lambda: joined_df.iter_slices(batch_size)
+    importer._count_drug_packages = lambda: len(joined_df)
+    dataset_version = DrugDataSetVersion(dataset_version="bench", dataset_source_name=importer.dataset_name)
+
+    start = time.perf_counter()
+    table_rows = await transform_row_by_row(importer, dataset_version)
+    row_count = sum(len(rows) for rows in table_rows.values())
+    report("row by row", time.perf_counter() - start, len(joined_df), row_count)
+    expected_rows = canonical_rows(table_rows)
+    del table_rows
+
+    start = time.perf_counter()
+    batches = await transform_vectorized(importer, dataset_version)
+    transform_duration = time.perf_counter() - start
+    report("vectorized", transform_duration, len(joined_df), row_count)
+    start = time.perf_counter()
+    table_rows = frame_rows(batches)
+    report("vectorized + iter_rows", transform_duration + time.perf_counter() - start, len(joined_df), row_count)
+    print(f"  {row_count} rows")
+    if canonical_rows(table_rows) != expected_rows:
+        raise ValueError("The vectorized transformation created other rows than the row by row transformation")
+    print("  rows identical")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--packages", type=int, default=300000)
+    parser.add_argument("--batch-size", type=int, default=50000)
+    args = parser.parse_args()
+    asyncio.run(main(args.packages, args.batch_size))
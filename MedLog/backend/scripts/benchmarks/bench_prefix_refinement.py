@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Benchmark of drug searches while typing, with and without prefix refinement (`DrugSearchCandidateCache`).
+
+Fills a temporary SQLite database with synthetic drugs in the search cache table of the 'GenericSQLDrugSearch'-engine
+(the table the SQL based engines score), then replays keystroke sequences ("me", "met", "metf", ...) against the engine.
+Once with every keystroke searching all drugs, once with keystrokes that narrow the previous search term down
+scoring only the drugs the previous keystroke found. Reports the latency per keystroke and checks both return the same results.
+With `--engine SQLiteFTS5DrugSearch` it shows why engines with their own candidate index do not use prefix refinement.
+Needs the usual MedLog configuration environment (e.g. the `.env` file); `SQL_DATABASE_URL` is replaced by the temporary database.
+
+Run from MedLog/backend via:
+    python scripts/benchmarks/bench_prefix_refinement.py --drugs 100000 --sequences 50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = SCRIPT_DIR.parent.parent
+
+# Make medlogserver importable without a package install
+sys.path.insert(0, str(BACKEND_DIR))
+
+DB_FILE = Path(tempfile.mkdtemp(prefix="medlog_bench_")) / "bench.sqlite"
+os.environ["SQL_DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_FILE}"
+
+import medlogserver.model
+from sqlmodel import SQLModel, insert, text
+from medlogserver.db._session import _get_engine, get_async_session_context
+from medlogserver.db.drug_data.drug_search import SEARCH_ENGINES
+from medlogserver.db.drug_data.drug_search.search_module_generic_sql import (
+    GenericSQLDrugSearchCache,
+)
+from medlogserver.db.drug_data.drug_search.search_module_sqlite_fts5 import (
+    FTS_TABLE_NAME,
+    SQLiteFTS5DrugSearchEngine,
+)
+from medlogserver.db.drug_data.drug_search.search_candidate_cache import (
+    DrugSearchCandidateCache,
+)
+from medlogserver.api.paginator import create_query_params_class
+from medlogserver.model.drug_data.drug import DrugData
+from medlogserver.utils import normalize_search_text
+
+SYLLABLES = ["me", "to", "pro", "lol", "for", "min", "ibu", "fen", "sar", "tan", "cor", "dex", "lin", "va", "xa", "zol"]
+MANUFACTURERS = ["ratiopharm", "AbZ", "Hexal", "STADA", "Aristo", "Heumann", "AL", "1A Pharma"]
+FORMS = ["Tabletten", "Filmtabletten", "Kapseln", "Brausetabletten", "Tropfen"]
+SUBSTANCES_PER_DRUG = 10
+
+Pagination = create_query_params_class(DrugData)
+
+
+def generate_cache_rows(size: int, rng: random.Random) -> List[Dict]:
+    substances = [
+        "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).capitalize()
+        for _ in range(max(1, size // SUBSTANCES_PER_DRUG))
+    ]
+    rows = []
+    for _ in range(size):
+        substance = rng.choice(substances)
+        trade_name = f"{substance} {rng.choice(MANUFACTURERS)} {rng.choice([5, 10, 20, 40, 100, 500])} mg {rng.choice(FORMS)}"
+        content = f"{trade_name} {substance.lower()}"
+        codes = f"{rng.randrange(10**8):08d}"
+        rows.append(
+            {
+                "id": uuid.uuid4(),
+                "search_index_content": content,
+                "search_cache_codes": codes,
+                "search_index_content_normalized": normalize_search_text(content),
+                "search_cache_codes_normalized": normalize_search_text(codes),
+                "market_exit_date": None,
+                "is_custom_drug": False,
+            }
+        )
+    return rows
+
+
+def keystroke_sequences(rows: List[Dict], count: int, rng: random.Random) -> List[List[str]]:
+    """Search terms typed char by char, from the first char to the whole first word of a trade name."""
+    sequences = []
+    for _ in range(count):
+        word = rng.choice(rows)["search_index_content"].split()[0]
+        sequences.append([word[:end] for end in range(1, len(word) + 1)])
+    return sequences
+
+
+def percentile(values: List[float], p: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(p) - 1]
+
+
+async def fill_database(rows: List[Dict], engine_name: str):
+    async with _get_engine().begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    async with get_async_session_context() as session:
+        await session.execute(insert(GenericSQLDrugSearchCache), rows)
+        if engine_name == "SQLiteFTS5DrugSearch":
+            await SQLiteFTS5DrugSearchEngine()._create_fts_table_if_not_exists(session)
+            await session.execute(
+                text(f"INSERT INTO {FTS_TABLE_NAME}({FTS_TABLE_NAME}) VALUES('rebuild')")
+            )
+        await session.commit()
+
+
+async def replay(engine, sequences: List[List[str]], candidate_cache: DrugSearchCandidateCache, refine: bool):
+    """Returns the latencies (ms) per keystroke position and the results of all searches."""
+    latencies_ms: Dict[int, List[float]] = {}
+    results = []
+    for sequence in sequences:
+        for keystroke, search_term in enumerate(sequence, start=1):
+            start = time.perf_counter()
+            candidate_drug_ids = candidate_cache.get((), search_term) if refine else None
+            search_results, result_drug_ids = await engine.search_with_drug_ids(
+                search_term=search_term,
+                pagination=Pagination(offset=0, limit=20, order_by=None, order_desc=False),
+                drug_ids=candidate_drug_ids,
+                max_result_drug_ids=candidate_cache.max_drug_ids,
+            )
+            if result_drug_ids is not None:
+                candidate_cache.put((), search_term, result_drug_ids)
+            latencies_ms.setdefault(keystroke, []).append((time.perf_counter() - start) * 1000)
+            # The drug documents do not exist in the benchmark database, the result pages are empty.
+            # Small results come with all drug ids. Compared unordered, the order of equally ranked drugs is not defined.
+            results.append(
+                (
+                    search_term,
+                    search_results.total_count,
+                    frozenset(result_drug_ids) if result_drug_ids is not None else None,
+                )
+            )
+    return latencies_ms, results
+
+
+async def main(size: int, engine_name: str, sequence_count: int, max_drug_ids: int):
+    rng = random.Random(size)
+    rows = generate_cache_rows(size, rng)
+    start = time.perf_counter()
+    await fill_database(rows, engine_name)
+    print(f"{size} drugs in {DB_FILE} ({time.perf_counter() - start:.1f}s), engine {engine_name}")
+    engine = SEARCH_ENGINES[engine_name]()
+    sequences = keystroke_sequences(rows, sequence_count, rng)
+
+    runs = {}
+    for label, refine in (("full search", False), ("refinement", True)):
+        cache = DrugSearchCandidateCache(max_drug_ids=max_drug_ids, ttl_sec=60)
+        start = time.perf_counter()
+        latencies_ms, results = await replay(engine, sequences, cache, refine=refine)
+        runs[label] = results
+        print(
+            f"  {label:<12} total {time.perf_counter() - start:7.2f}s | candidate sets reused {cache.hits}"
+        )
+        for keystroke in sorted(latencies_ms):
+            values = latencies_ms[keystroke]
+            if len(values) < 2:
+                continue
+            print(
+                f"    keystroke {keystroke:>2}: p50 {percentile(values, 50):8.2f}ms"
+                f" p95 {percentile(values, 95):8.2f}ms"
+                f" p99 {percentile(values, 99):8.2f}ms"
+                f" ({len(values)} searches)"
+            )
+    if runs["full search"] != runs["refinement"]:
+        raise ValueError("Searches with prefix refinement found other drugs than full searches")
+    print("  results identical")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drugs", type=int, default=100000)
+    parser.add_argument(
+        "--engine",
+        default="GenericSQLDrugSearch",
+        choices=["GenericSQLDrugSearch", "SQLiteFTS5DrugSearch"],
+    )
+    parser.add_argument("--sequences", type=int, default=50)
+    parser.add_argument("--max-drug-ids", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.drugs, args.engine, args.sequences, args.max_drug_ids))
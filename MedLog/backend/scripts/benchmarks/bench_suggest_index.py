@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Benchmark of the drug typeahead index (`DrugSuggestIndex`) for growing drug counts.
+
+Generates synthetic drugs with trade names like real drug datasets (several package sizes and strengths per name,
+a manufacturer word) and an 8 digit PZN each, then measures the build time and the suggestion latency per prefix length.
+No database is needed.
+
+Run from MedLog/backend via:
+    python scripts/benchmarks/bench_suggest_index.py --sizes 10000 100000 300000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import List
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = SCRIPT_DIR.parent.parent
+
+# Make medlogserver importable without a package install
+sys.path.insert(0, str(BACKEND_DIR))
+
+import medlogserver.model
+from medlogserver.db.drug_data.drug_search.suggest_index import (
+    DrugSuggestIndex,
+    SuggestDrug,
+)
+
+SYLLABLES = ["me", "to", "pro", "lol", "for", "min", "ibu", "fen", "sar", "tan", "cor", "dex", "lin", "va", "xa", "zol"]
+MANUFACTURERS = ["ratiopharm", "AbZ", "Hexal", "STADA", "Aristo", "Heumann", "AL", "1A Pharma"]
+
+
+def generate_drugs(size: int, rng: random.Random) -> List[SuggestDrug]:
+    drugs = []
+    while len(drugs) < size:
+        substance = "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).capitalize()
+        manufacturer = rng.choice(MANUFACTURERS)
+        for strength in rng.sample([5, 10, 20, 40, 100, 200, 400, 800], k=rng.randint(1, 4)):
+            trade_name = f"{substance} {manufacturer} {strength} mg Tabletten"
+            # package sizes share the trade name
+            for _ in range(rng.randint(1, 3)):
+                drugs.append(
+                    (
+                        uuid.uuid4(),
+                        trade_name,
+                        None,
+                        False,
+                        [("PZN", f"{rng.randrange(10**8):08d}")],
+                    )
+                )
+    return drugs[:size]
+
+
+def percentile(values: List[float], p: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(p) - 1]
+
+
+def run(size: int, runs: int, limit: int):
+    rng = random.Random(size)
+    drugs = generate_drugs(size, rng)
+
+    start = time.perf_counter()
+    index = DrugSuggestIndex(generation=())
+    index.add_drugs(drugs)
+    build_sec = time.perf_counter() - start
+    print(
+        f"{size:>9} drugs | {len(index.names):>8} trade names | {len(index.keys):>9} keys | build {build_sec:6.2f}s"
+    )
+
+    for prefix_length in (1, 2, 3, 5, 8):
+        latencies_us = []
+        result_count = 0
+        for _ in range(runs):
+            drug = rng.choice(drugs)
+            # every second lookup types a code instead of a name
+            text = drug[1] if rng.random() < 0.5 else drug[4][0][1]
+            prefix = text[:prefix_length]
+            start = time.perf_counter()
+            result_count += len(index.suggest(prefix, limit=limit))
+            latencies_us.append((time.perf_counter() - start) * 1_000_000)
+        print(
+            f"    prefix length {prefix_length}: p50 {percentile(latencies_us, 50):8.1f}µs"
+            f" p95 {percentile(latencies_us, 95):8.1f}µs"
+            f" p99 {percentile(latencies_us, 99):8.1f}µs"
+            f" | avg {result_count / runs:4.1f} suggestions"
+        )
+
+    start = time.perf_counter()
+    for drug in generate_drugs(100, rng):
+        index.add_drug(drug)
+    print(f"    add 100 single drugs (custom drugs): {(time.perf_counter() - start) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument("--runs", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.runs, args.limit)
@@ -2,6 +2,7 @@ import os
 import sys
 import json
 import time
+import tempfile
 import threading
 import subprocess
 import logging
@@ -69,6 +70,10 @@ def set_config_for_test_env():
         DRUG_IMPORTER_ALLOW_MANUAL_UPDATE_DRUG_DB
     )
     os.environ["SYSTEM_ANNOUNCEMENTS"] = json.dumps(SYSTEM_ANNOUNCEMENTS)
+    # Fresh drug search index snapshots per test run, outside of the repo
+    os.environ["DRUG_SEARCH_INDEX_SNAPSHOT_DIR"] = tempfile.mkdtemp(
+        prefix="medlog_tests_search_index_snapshots_"
+    )
 
 
 # Set env vars at module level so they're in place before any test module is
@@ -93,6 +98,21 @@ def pytest_addoption(parser):
         help="Database backend: 'postgres' (default, Docker) or 'sqlite'",
     )
 
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "postgres: test needs the PostgreSQL backend (skipped with --db sqlite)"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--db") == "postgres":
+        return
+    skip_postgres = pytest.mark.skip(reason="needs --db postgres")
+    for item in items:
+        if "postgres" in item.keywords:
+            item.add_marker(skip_postgres)
+
 _OIDC_TEST_USERS = [
     {
         "sub": "oidc-role-test-user",
@@ -412,3 +432,130 @@ def live_server(database):
     worker_proc.wait(timeout=5)
     _stop_oidc_mock()
     logger.info("Test session complete — server shut down.")
+
+
+# ── Drug search engines ───────────────────────────────────────────────────────
+
+# Drug search engines the search tests (fixture `drug_search_engine`) run against, per database backend.
+# The main test server answers with the configured default engine, every other engine gets its own server process.
+_DEFAULT_DRUG_SEARCH_ENGINE = "GenericSQLDrugSearch"
+_DRUG_SEARCH_TEST_ENGINES = {
+    "sqlite": [
+        _DEFAULT_DRUG_SEARCH_ENGINE,
+        "MemoryIndexDrugSearch",
+        "SQLiteFTS5DrugSearch",
+    ],
+    "postgres": [
+        _DEFAULT_DRUG_SEARCH_ENGINE,
+        "MemoryIndexDrugSearch",
+        "PostgresTrgmDrugSearch",
+    ],
+}
+_BUILD_DRUG_SEARCH_INDEX_SCRIPT = (
+    "import asyncio, sys\n"
+    "import medlogserver.model\n"
+    "from medlogserver.db.drug_data.drug_search import SEARCH_ENGINES\n"
+    "asyncio.run(SEARCH_ENGINES[sys.argv[1]]().build_index())\n"
+)
+
+
+def pytest_generate_tests(metafunc):
+    if "drug_search_engine_server" in metafunc.fixturenames:
+        metafunc.parametrize(
+            "drug_search_engine_server",
+            _DRUG_SEARCH_TEST_ENGINES[metafunc.config.getoption("--db")],
+            indirect=True,
+            scope="session",
+        )
+
+
+def _get_free_port() -> int:
+    import socket
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def drug_search_engine_server(request, live_server):
+    """Name and base URL of a MedLog server using the drug search engine of the param, started once per test session.
+    The base URL is None for the main test server."""
+    import requests
+    from utils import MEDLOG_BASE_URL_ENV_NAME, req
+
+    engine_name = request.param
+    if engine_name == _DEFAULT_DRUG_SEARCH_ENGINE:
+        yield engine_name, None
+        return
+
+    # Build the index like the worker does after a drug data load. Some engines can not serve searches without.
+    logger.info("Build drug search index for '%s'...", engine_name)
+    subprocess.run(
+        [sys.executable, "-c", _BUILD_DRUG_SEARCH_INDEX_SCRIPT, engine_name],
+        env=dict(os.environ, PYTHONPATH=str(BACKEND_DIR)),
+        cwd=str(GIT_ROOT),
+        check=True,
+    )
+    port = _get_free_port()
+    server_env = {
+        "DRUG_SEARCHENGINE_CLASS": engine_name,
+        "SERVER_LISTENING_PORT": str(port),
+        "BACKGROUND_WORKER_START_IN_EXTRA_PROCESS": "False",
+    }
+    previous_env = {name: os.environ.get(name) for name in server_env}
+    os.environ.update(server_env)
+    try:
+        logger.info("Starting MedLog server subprocess for '%s'...", engine_name)
+        server_proc = _start_subprocess(
+            f"server-{engine_name}", [sys.executable, str(MEDLOG_MAIN)]
+        )
+    finally:
+        for name, value in previous_env.items():
+            if value is None:
+                os.environ.pop(name)
+            else:
+                os.environ[name] = value
+    base_url = f"http://localhost:{port}"
+    try:
+        timeout_sec = 60
+        deadline = time.monotonic() + timeout_sec
+        while True:
+            if server_proc.poll() is not None:
+                pytest.fail(
+                    f"Server process for '{engine_name}' exited unexpectedly with code {server_proc.returncode}"
+                )
+            if time.monotonic() > deadline:
+                pytest.fail(
+                    f"Server for '{engine_name}' did not get its drug search ready within {timeout_sec}s"
+                )
+            os.environ[MEDLOG_BASE_URL_ENV_NAME] = base_url
+            try:
+                if req("api/health/report")["drug_search_index_working"]:
+                    break
+            except requests.ConnectionError:
+                pass
+            finally:
+                os.environ.pop(MEDLOG_BASE_URL_ENV_NAME)
+            time.sleep(1)
+        yield engine_name, base_url
+    finally:
+        server_proc.terminate()
+        server_proc.wait(timeout=5)
+
+
+@pytest.fixture
+def drug_search_engine(drug_search_engine_server):
+    """Name of the drug search engine the test runs against. Requests of `utils.req()` go to a MedLog server using this engine,
+    for the duration of the test only."""
+    from utils import MEDLOG_BASE_URL_ENV_NAME
+
+    engine_name, base_url = drug_search_engine_server
+    if base_url is None:
+        yield engine_name
+        return
+    os.environ[MEDLOG_BASE_URL_ENV_NAME] = base_url
+    try:
+        yield engine_name
+    finally:
+        os.environ.pop(MEDLOG_BASE_URL_ENV_NAME)
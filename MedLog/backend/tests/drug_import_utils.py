@@ -0,0 +1,312 @@
+"""Synthetic MMI Pharmindex source files and helpers to compare the rows the drug importer creates from them,
+or writes to PostgreSQL with COPY. Shared by the drug import tests and the drug import benchmarks in `scripts/benchmarks`."""
+
+from typing import Dict, List, TYPE_CHECKING
+from collections import Counter
+from pathlib import Path
+import csv
+import random
+
+import polars as pl
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+import medlogserver.model
+from medlogserver.db.drug_data.importers.mmi_pharmindex import MMIPharmindex1_32
+from medlogserver.model.drug_data.drug import DrugData
+from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
+
+WORDS = [
+    "metfo",
+    "ibupro",
+    "amlo",
+    "sartan",
+    "pril",
+    "olol",
+    "statin",
+    "dexa",
+    "cortison",
+    "zolam",
+    "mycin",
+    "cillin",
+]
+ATC_CODES = [
+    f"{group}{number:02d}AA{sub:02d}"
+    for group in "ACDGJMNR"
+    for number in range(1, 6)
+    for sub in range(1, 6)
+]
+ICD_CODES = [
+    f"{letter}{number:02d}.{sub}"
+    for letter in "EIJKM"
+    for number in range(10, 30)
+    for sub in range(3)
+]
+ARCHIVE_SHARE = 0.2
+# Formats of `DRUG_IMPORTER_PG_COPY_FORMAT`
+PG_COPY_FORMATS = ["text", "binary"]
+
+if TYPE_CHECKING:
+    # only needed with PostgreSQL
+    import psycopg
+
+
+def write_csv(path: Path, header: List[str], rows: List[List]):
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file, delimiter=";")
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def synthetic_date(rng: random.Random) -> str:
+    return f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1990, 2024)}"
+
+
+def write_source_files(source_dir: Path, package_count: int, rng: random.Random):
+    """MMI Pharmindex shaped source files (PACKAGE.CSV, PRODUCT.CSV, ITEM.CSV, ... and their ARCHIVE_* counterparts).
+    Some products have no items, flags, keywords etc. to cover missing values."""
+    product_count = max(1, package_count // 3)
+    archive_package_count = int(package_count * ARCHIVE_SHARE)
+    products = range(1, product_count + 1)
+    write_csv(
+        source_dir / "PRODUCT.CSV",
+        [
+            "ID",
+            "NAME",
+            "DISPENSINGTYPECODE",
+            "PRODUCTFOODTYPECODE",
+            "PRODUCTDIETETICSTYPECODE",
+        ],
+        [
+            [
+                product_id,
+                f"Product {product_id}",
+                rng.randint(0, 3),
+                rng.choice(["", "1", "2"]),
+                rng.choice(["", "", "1"]),
+            ]
+            for product_id in products
+        ],
+    )
+    write_csv(
+        source_dir / "ARCHIVE_PRODUCT.CSV",
+        ["ID", "NAME", "DISPENSINGTYPECODE", "COMPANYID"],
+        [
+            [
+                product_id,
+                f"Product {product_id}",
+                rng.randint(0, 3),
+                rng.randint(1, 500),
+            ]
+            for product_id in products
+        ],
+    )
+    write_csv(
+        source_dir / "PRODUCT_FLAG.CSV",
+        [
+            "PRODUCTID",
+            "CONTRACEPTIVE_FLAG",
+            "COSMETICS_FLAG",
+            "DIETARYSUPPLEMENT_FLAG",
+            "HERBAL_FLAG",
+            "GENERIC_FLAG",
+            "HOMOEOPATHIC_FLAG",
+        ],
+        [
+            [product_id] + [rng.choice(["0", "0", "1", ""]) for _ in range(6)]
+            for product_id in products
+            if rng.random() < 0.9
+        ],
+    )
+    write_csv(
+        source_dir / "PRODUCT_COMPANY.CSV",
+        ["PRODUCTID", "COMPANYID", "PRODUCTCOMPANYTYPECODE"],
+        [
+            [product_id, rng.randint(1, 500), company_type]
+            for product_id in products
+            for company_type in rng.sample(["M", "V", "Z"], rng.randint(1, 3))
+        ],
+    )
+    items = [
+        [item_id, product_id, rng.choice(["", "19", "104", "23"])]
+        for item_id, product_id in enumerate(
+            (
+                product_id
+                for product_id in products
+                for _ in range(rng.randint(0, 2))
+            ),
+            start=1,
+        )
+    ]
+    write_csv(source_dir / "ITEM.CSV", ["ID", "PRODUCTID", "ITEMROACODE"], items)
+    write_csv(
+        source_dir / "ITEM_ATC.CSV",
+        ["ITEMID", "ATCCODE"],
+        [
+            [item[0], atc_code]
+            for item in items
+            for atc_code in rng.sample(ATC_CODES, rng.randint(0, 2))
+        ],
+    )
+    write_csv(
+        source_dir / "PRODUCT_KEYWORD.CSV",
+        ["PRODUCTID", "CODE"],
+        [
+            [product_id, code]
+            for product_id in products
+            for code in rng.sample(range(1, 100), rng.randint(0, 3))
+        ],
+    )
+    write_csv(
+        source_dir / "PRODUCT_ICD.CSV",
+        ["PRODUCTID", "ICDCODE"],
+        [
+            [product_id, icd_code]
+            for product_id in products
+            for icd_code in rng.sample(ICD_CODES, rng.randint(0, 2))
+        ],
+    )
+    package_header = [
+        "ID",
+        "PRODUCTID",
+        "NAME",
+        "ONMARKETDATE",
+        "PZN",
+        "AMOUNTTEXT",
+        "IFAPHARMFORMCODE",
+        "SALESSTATUSCODE",
+        "PACKAGENORMSIZECODE",
+    ]
+
+    def package_row(package_id: int) -> List:
+        return [
+            package_id,
+            rng.randint(1, product_count),
+            f"{''.join(rng.choices(WORDS, k=rng.randint(1, 3))).capitalize()} {rng.choice([5, 10, 20, 100, 500])} mg",
+            rng.choice([synthetic_date(rng), ""]),
+            f"{package_id:08d}",
+            rng.choice(["20 St", "50 ml", "100 St", ""]),
+            rng.choice(["TAB", "FTA", "KAP", "TRO", ""]),
+            rng.choice(["A", "B", "C"]),
+            rng.choice(["N1", "N2", "N3", ""]),
+        ]
+
+    active_package_count = package_count - archive_package_count
+    write_csv(
+        source_dir / "PACKAGE.CSV",
+        package_header,
+        [package_row(package_id) for package_id in range(1, active_package_count + 1)],
+    )
+    write_csv(
+        source_dir / "ARCHIVE_PACKAGE.CSV",
+        package_header + ["OFFMARKETDATE"],
+        [
+            package_row(package_id) + [synthetic_date(rng)]
+            for package_id in range(active_package_count + 1, package_count + 1)
+        ],
+    )
+
+
+def canonical_row(row: Dict, drug_no_by_id: Dict) -> tuple:
+    canonical = dict(row)
+    if "drug_id" in canonical:
+        canonical["drug_id"] = drug_no_by_id[canonical["drug_id"]]
+        # the id of a drug code is generated, the other tables have no id column besides the drug itself
+        canonical.pop("id", None)
+    else:
+        canonical["id"] = drug_no_by_id[canonical["id"]]
+    return tuple(sorted(canonical.items()))
+
+
+def canonical_rows(table_rows: Dict[type, List[Dict]]) -> Dict[str, Counter]:
+    """Rows per table with the generated drug ids replaced by the position of the drug."""
+    drug_no_by_id = {
+        row["id"]: drug_no for drug_no, row in enumerate(table_rows[DrugData])
+    }
+    return {
+        table_type.__name__: Counter(
+            canonical_row(row, drug_no_by_id) for row in rows
+        )
+        for table_type, rows in table_rows.items()
+    }
+
+
+async def transform_row_by_row(
+    importer: MMIPharmindex1_32, dataset_version: DrugDataSetVersion
+) -> Dict[type, List[Dict]]:
+    """The rows of `_parse_drug_data` per table."""
+    table_rows: Dict[type, List[Dict]] = {}
+    async for drug_rows in importer._parse_drug_data(dataset_version):
+        for table_type, rows in drug_rows.items():
+            table_rows.setdefault(table_type, []).extend(rows)
+    return table_rows
+
+
+async def transform_vectorized(
+    importer: MMIPharmindex1_32, dataset_version: DrugDataSetVersion
+) -> List[Dict[type, List[pl.DataFrame]]]:
+    """The batches of frames of `_transform_drug_data`."""
+    return [
+        table_frames
+        async for table_frames in importer._transform_drug_data(dataset_version)
+    ]
+
+
+def frame_rows(batches: List[Dict[type, List[pl.DataFrame]]]) -> Dict[type, List[Dict]]:
+    """The rows of the frames as the writers of `add_and_flush` read them."""
+    table_rows: Dict[type, List[Dict]] = {}
+    for table_frames in batches:
+        for table_type, frames in table_frames.items():
+            rows = table_rows.setdefault(table_type, [])
+            for frame in frames:
+                rows.extend(frame.iter_rows(named=True))
+    return table_rows
+
+
+async def create_pg_temp_tables(
+    conn: "psycopg.AsyncConnection", table_types: List[type]
+):
+    """Temporary tables without foreign keys shadow the MedLog tables of the same name for the COPY statements of this connection."""
+    for table_type in table_types:
+        ddl = str(
+            CreateTable(
+                table_type.__table__, include_foreign_key_constraints=[]
+            ).compile(dialect=postgresql.dialect())
+        )
+        await conn.execute(ddl.replace("CREATE TABLE", "CREATE TEMPORARY TABLE", 1))
+    await conn.commit()
+
+
+async def pg_table_checksums(
+    conn: "psycopg.AsyncConnection", table_types: List[type]
+) -> Dict[str, str]:
+    """md5 of the sorted rows per table. None for an empty table."""
+    checksums = {}
+    for table_type in table_types:
+        name = table_type.__tablename__
+        cursor = await conn.execute(
+            f"SELECT md5(string_agg(t::text, '|' ORDER BY t::text)) FROM {name} t"
+        )
+        checksums[name] = (await cursor.fetchone())[0]
+    return checksums
+
+
+async def pg_copy_frames(
+    importer: MMIPharmindex1_32,
+    conn: "psycopg.AsyncConnection",
+    batches: List[Dict[type, List[pl.DataFrame]]],
+    copy_format: str,
+):
+    """Write the batches of `transform_vectorized` with the COPY writer of the importer for `copy_format`."""
+    for table_frames in batches:
+        for table_type, frames in table_frames.items():
+            for frame in frames:
+                if frame.is_empty():
+                    continue
+                if copy_format == "binary":
+                    await importer._pg_copy_frame_binary(conn, table_type, frame)
+                else:
+                    await importer._pg_copy_table(
+                        conn, table_type, frame.iter_rows(named=True)
+                    )
+    await conn.commit()
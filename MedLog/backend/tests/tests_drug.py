@@ -3,6 +3,8 @@ import json
 import time
 import uuid
 
+import pytest
+
 from utils import (
     req,
     dict_must_contain,
@@ -17,6 +19,7 @@ from statics import (
 )
 
 
+@pytest.mark.usefixtures("drug_search_engine")
 def test_custom_drug_incomplete():
     # import only as IDE Shortcut
     from medlogserver.api.routes.routes_drug import create_custom_drug
@@ -31,7 +34,8 @@ def test_custom_drug_incomplete():
     )
     from medlogserver.model.drug_data.drug import DrugData, DrugValMultiRef, DrugValRef
 
-    search_identifiert_flag = "SEARCHIDENTIFIERT328794623"
+    # unique per run, the test creates a custom drug for every drug search engine
+    search_identifiert_flag = f"SEARCHIDENTIFIERT{uuid.uuid4().hex[:12]}"
     custom_drug_payload = DrugCustomCreate(
         trade_name=f"Look mom, my custom Drug! {search_identifiert_flag}",
         attrs_ref=[DrugValRef(field_name="dispensingtype", value=None)],
@@ -140,6 +144,7 @@ def test_create_custom_drug_with_refs():
     )
 
 
+@pytest.mark.usefixtures("drug_search_engine")
 def test_create_custom_drug_with_multi_values():
     """Test creating a custom drug with multi-value attributes"""
     from medlogserver.model.drug_data.drug import (
@@ -149,11 +154,13 @@ def test_create_custom_drug_with_multi_values():
         DrugMultiValApiCreate,
     )
 
-    search_identifiert_flag = "SEARCHIDENTIFIER23789rgfiewsdh"
+    # unique per run, the test creates a custom drug for every drug search engine
+    search_identifiert_flag = f"SEARCHIDENTIFIER{uuid.uuid4().hex[:12]}"
+    pzn = str(uuid.uuid4().int)[:12]
     custom_drug = DrugCustomCreate(
         custom_drug_notes="Look mom, my custom Drug!",
         trade_name=f"My Custom Drug {search_identifiert_flag}",
-        codes=[DrugCodeApi(code_system_id="PZN", code="654643534534")],
+        codes=[DrugCodeApi(code_system_id="PZN", code=pzn)],
         attrs=[
             DrugValApiCreate(field_name="amount", value="100"),
             DrugValApiCreate(field_name="manufacturer", value="MyHomeLab"),
@@ -221,7 +228,7 @@ def test_create_custom_drug_with_multi_values():
     )
     dict_must_contain(
         custom_drug_created["codes"],
-        required_keys_and_val={"PZN": "654643534534", "ATC": None},
+        required_keys_and_val={"PZN": pzn, "ATC": None},
         exception_dict_identifier="create custom drug object attrs_ref",
     )
 
@@ -237,6 +244,7 @@ def test_create_custom_drug_with_multi_values():
     assert drug_id_from_search == custom_drug_created["id"]
 
 
+@pytest.mark.usefixtures("drug_search_engine")
 def test_endpoint_drug_search():
     """Test GET /api/drug/search endpoint"""
     from medlogserver.api.routes.routes_drug import search_drugs
@@ -287,6 +295,7 @@ def test_endpoint_drug_search():
     assert len(paginated_response["items"]) <= 3
 
 
+@pytest.mark.usefixtures("drug_search_engine")
 def test_endpoint_drug_get():
     """Test GET /api/drug/id/{drug_id} endpoint"""
     # First search for a drug to get an ID
@@ -313,6 +322,36 @@ def test_endpoint_drug_get():
     )
 
 
+@pytest.mark.usefixtures("drug_search_engine")
+def test_endpoint_drug_get_by_code():
+    """Test GET /api/drug/by_code/{code_system_id}/{code} endpoint and the code search fast path"""
+    search_response = req("api/drug/search", method="get", q={"search_term": "Test"})
+    drug_with_pzn = next(
+        item["drug"]
+        for item in search_response["items"]
+        if item["drug"]["codes"].get("PZN")
+    )
+    pzn = drug_with_pzn["codes"]["PZN"]
+
+    drug_by_code = req(f"api/drug/by_code/PZN/{pzn}", method="get")
+    assert drug_by_code == drug_with_pzn
+
+    # a scanned code as search term finds the drug directly
+    code_search_response = req(
+        "api/drug/search", method="get", q={"search_term": pzn}
+    )
+    assert code_search_response["items"][0]["drug"] == drug_with_pzn
+
+    # Test non-existent code
+    req(
+        f"api/drug/by_code/PZN/00000000000",
+        method="get",
+        expected_http_code=404,
+        tolerated_error_codes=[404],
+    )
+
+
+@pytest.mark.usefixtures("drug_search_engine")
 def test_custom_drug_issue():
     """Testcase for bug found by abrain"""
     from medlogserver.api.routes.routes_drug import create_custom_drug
@@ -404,6 +443,7 @@ def test_custom_drug_issue():
     )
 
 
+@pytest.mark.usefixtures("drug_search_engine")
 def test_wrong_count_issue_252():
     paginated_search_response = req(
         "api/drug/search",
@@ -417,6 +457,7 @@ def test_wrong_count_issue_252():
     )
 
 
+@pytest.mark.usefixtures("drug_search_engine")
 def test_custom_drug_ensure_created_by_field_issue_303():
     # import only as IDE Shortcut
     from medlogserver.api.routes.routes_drug import create_custom_drug
@@ -461,3 +502,170 @@ def test_custom_drug_ensure_created_by_field_issue_303():
     print("drug_search_result", drug_search_result)
     custom_drug_creator_uuid = drug_search_result["items"][0]["drug"]["custom_created_by"]
     assert custom_drug_creator_uuid == current_user_uuid
+
+
+@pytest.mark.usefixtures("drug_search_engine")
+def test_endpoint_drug_search_filter_and_facets():
+    """Test reference value filters and facet counts of GET /api/drug/search"""
+    search_query = "Drug"
+    response = req(
+        "api/drug/search",
+        method="get",
+        q={"search_term": search_query, "facets": ["dispensingtype"], "limit": 1},
+    )
+    dict_must_contain(
+        response,
+        required_keys=["total_count", "items", "facets"],
+        exception_dict_identifier="search drugs response with facets",
+    )
+    dispensingtype_counts = response["facets"]["dispensingtype"]
+    # the facets count the whole result, not only the page. Drugs without a dispensing type are not counted.
+    assert dispensingtype_counts
+    assert response["total_count"] > 1
+    assert sum(dispensingtype_counts.values()) <= response["total_count"]
+
+    for value, count in dispensingtype_counts.items():
+        filtered_response = req(
+            "api/drug/search",
+            method="get",
+            q={
+                "search_term": search_query,
+                "filter_dispensingtype": value,
+                "facets": ["dispensingtype"],
+            },
+        )
+        assert filtered_response["total_count"] == count
+        assert filtered_response["facets"]["dispensingtype"] == {value: count}
+        for item in filtered_response["items"]:
+            assert str(item["drug"]["attrs_ref"]["dispensingtype"]["value"]) == value
+
+    # no facets requested, none returned
+    assert (
+        req("api/drug/search", method="get", q={"search_term": search_query})["facets"]
+        is None
+    )
+
+
+def test_endpoint_drug_suggest():
+    """Test GET /api/drug/suggest typeahead endpoint"""
+    search_response = req("api/drug/search", method="get", q={"search_term": "Test"})
+    drug_with_pzn = next(
+        item["drug"]
+        for item in search_response["items"]
+        if item["drug"]["codes"].get("PZN")
+    )
+    trade_name = drug_with_pzn["trade_name"]
+    pzn = drug_with_pzn["codes"]["PZN"]
+
+    # trade name prefix, case insensitive
+    suggestions = req(
+        "api/drug/suggest", method="get", q={"prefix": trade_name[:4].upper()}
+    )
+    assert suggestions
+    for suggestion in suggestions:
+        dict_must_contain(
+            suggestion,
+            required_keys=["drug_id", "trade_name", "match", "drug_count"],
+            exception_dict_identifier="drug suggestion",
+        )
+        assert suggestion["trade_name"].casefold().startswith(trade_name[:4].casefold())
+    assert trade_name in [suggestion["trade_name"] for suggestion in suggestions]
+
+    # code prefix
+    suggestions = req("api/drug/suggest", method="get", q={"prefix": pzn[:-1]})
+    code_suggestion = next(
+        suggestion
+        for suggestion in suggestions
+        if suggestion["match"] == "code" and suggestion["code"] == pzn
+    )
+    assert code_suggestion["drug_id"] == drug_with_pzn["id"]
+    assert code_suggestion["code_system_id"] == "PZN"
+
+    # limit
+    assert len(req("api/drug/suggest", method="get", q={"prefix": "t", "limit": 1})) <= 1
+
+    # no match
+    assert req("api/drug/suggest", method="get", q={"prefix": "zzzzqqqq"}) == []
+
+
+def test_endpoint_drug_search_coalesces_identical_searches():
+    """Concurrent identical searches are answered by one search engine execution (cache hit or joined in-flight search)"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    stats_before = req("api/drug/search/cache", method="get")
+    # a page that no other test requests, so the result is not cached yet
+    q = {"search_term": "Drug", "offset": 1, "limit": 7}
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(
+            executor.map(lambda _: req("api/drug/search", method="get", q=q), range(8))
+        )
+    assert all(response == responses[0] for response in responses)
+
+    stats_after = req("api/drug/search/cache", method="get")
+    dict_must_contain(
+        stats_after,
+        required_keys=[
+            "hits",
+            "misses",
+            "coalesced",
+            "in_flight",
+            "searches",
+            "abandoned",
+            "cancelled",
+        ],
+        exception_dict_identifier="drug search cache stats",
+    )
+    executions_before = stats_before["misses"] - stats_before["coalesced"]
+    executions_after = stats_after["misses"] - stats_after["coalesced"]
+    assert executions_after - executions_before == 1
+    assert (stats_after["hits"] - stats_before["hits"]) + (
+        stats_after["coalesced"] - stats_before["coalesced"]
+    ) == 7
+    assert stats_after["searches"] - stats_before["searches"] == 8
+
+
+@pytest.mark.usefixtures("drug_search_engine")
+def test_endpoint_drug_search_while_typing():
+    """Search terms narrowed down keystroke by keystroke find the same drugs as a fresh search"""
+    search_term = "TestCount"
+    # a page size no other test requests, so the results are not cached yet
+    fresh_search = req(
+        "api/drug/search", method="get", q={"search_term": search_term, "limit": 11}
+    )
+    for end in range(3, len(search_term) + 1):
+        typed_search = req(
+            "api/drug/search",
+            method="get",
+            q={"search_term": search_term[:end], "limit": 10},
+        )
+    assert typed_search["total_count"] == fresh_search["total_count"]
+    assert [item["drug_id"] for item in typed_search["items"]] == [
+        item["drug_id"] for item in fresh_search["items"][:10]
+    ]
+
+
+@pytest.mark.usefixtures("drug_search_engine")
+def test_endpoint_drug_search_normalized():
+    """Search is case, umlaut and whitespace insensitive"""
+    from medlogserver.model.drug_data.drug import DrugCustomCreate, DrugValRef
+
+    custom_drug_payload = DrugCustomCreate(
+        trade_name="Hüstenlöser  Größe SEARCHNORMALIZED4711",
+        attrs_ref=[DrugValRef(field_name="dispensingtype", value=None)],
+    )
+    custom_drug = req(
+        "api/drug/custom",
+        method="post",
+        b=dictyfy(custom_drug_payload),
+    )
+    for search_term in [
+        "hustenloser grosse searchnormalized4711",
+        "HÜSTENLÖSER GRÖSSE",
+        "'Größe   searchNormalized4711'",
+    ]:
+        drug_search_result = req(
+            "api/drug/search", method="get", q={"search_term": search_term}
+        )
+        assert custom_drug["id"] in [
+            item["drug_id"] for item in drug_search_result["items"]
+        ], search_term
@@ -0,0 +1,135 @@
+from typing import Dict, List, Type
+import asyncio
+
+from pydantic import BaseModel
+
+
+def drug_to_drugAPI_obj_reference(drug):
+    """Generic (slow) conversion with a scan of the drug attributes per field of the drug api read class.
+    Reference implementation for `DrugToDrugAPIConverter` (the conversion `drug_to_drugAPI_obj` did before it was specialized).
+    """
+    import medlogserver.model
+    from medlogserver.model.drug_data.api_drug_model_factory import (
+        DrugAPIRead,
+        CustomDrugAPIRead,
+    )
+
+    vals = {}
+    for field_name, field_val in iter(drug):
+        if field_name in [
+            "attrs",
+            "attrs_ref",
+            "attrs_multi",
+            "attrs_multi_ref",
+            "codes",
+        ]:
+            continue
+        if field_name in DrugAPIRead.model_fields.keys():
+            vals[field_name] = field_val
+
+    drug_codes = {}
+    codes_submodel: Type[BaseModel] = DrugAPIRead.model_fields["codes"].annotation
+    for drug_code_field_name in codes_submodel.model_fields.keys():
+        drug_codes[drug_code_field_name] = next(
+            (
+                code.code
+                for code in drug.codes
+                if code.code_system_id == drug_code_field_name
+            ),
+            None,
+        )
+
+    drug_attrs: Dict[str, List[Dict[str, str]]] = {}
+    drug_attrs_submodel: Type[BaseModel] = DrugAPIRead.model_fields["attrs"].annotation
+    for drug_attrs_field_name in drug_attrs_submodel.model_fields.keys():
+        val = next(
+            (attr for attr in drug.attrs if attr.field_name == drug_attrs_field_name),
+            None,
+        )
+        drug_attrs[drug_attrs_field_name] = val.value if val is not None else None
+
+    drug_attrs_multi: Dict[str, List[Dict[str, str]]] = {}
+    drug_attrs_multi_submodel: Type[BaseModel] = DrugAPIRead.model_fields[
+        "attrs_multi"
+    ].annotation
+    for drug_attrs_multi_field_name in drug_attrs_multi_submodel.model_fields.keys():
+        multi_vals = [
+            attrs_multi
+            for attrs_multi in drug.attrs_multi
+            if attrs_multi.field_name == drug_attrs_multi_field_name
+        ]
+        multi_vals.sort(key=lambda o: o.value_index)
+        drug_attrs_multi[drug_attrs_multi_field_name] = [v.value for v in multi_vals]
+
+    drug_attrs_ref: Dict[str, List[Dict[str, str]]] = {}
+    drug_attrs_ref_submodel: Type[BaseModel] = DrugAPIRead.model_fields[
+        "attrs_ref"
+    ].annotation
+    for drug_attrs_ref_field_name in drug_attrs_ref_submodel.model_fields.keys():
+        val = next(
+            (
+                attr_ref
+                for attr_ref in drug.attrs_ref
+                if attr_ref.field_name == drug_attrs_ref_field_name
+            ),
+            None,
+        )
+        if val is not None:
+            drug_attrs_ref[drug_attrs_ref_field_name] = {
+                "value": val.value,
+                "display": val.lov_item.display if val.lov_item is not None else None,
+            }
+
+    drug_attrs_multi_ref: Dict[str, List] = {}
+    attrs_multi_ref_submodel: Type[BaseModel] = DrugAPIRead.model_fields[
+        "attrs_multi_ref"
+    ].annotation
+    for drug_attrs_multi_ref_field_name in attrs_multi_ref_submodel.model_fields.keys():
+        multi_ref_vals = [
+            attr_m_ref
+            for attr_m_ref in drug.attrs_multi_ref
+            if attr_m_ref.field_name == drug_attrs_multi_ref_field_name
+        ]
+        multi_ref_vals.sort(key=lambda o: o.value_index)
+        drug_attrs_multi_ref[drug_attrs_multi_ref_field_name] = [
+            {
+                "value": mrval.value,
+                "display": (
+                    mrval.lov_item.display if mrval.lov_item is not None else None
+                ),
+            }
+            for mrval in multi_ref_vals
+        ]
+
+    vals["codes"] = drug_codes
+    vals["attrs"] = drug_attrs
+    vals["attrs_ref"] = drug_attrs_ref
+    vals["attrs_multi"] = drug_attrs_multi
+    vals["attrs_multi_ref"] = drug_attrs_multi_ref
+    if drug.is_custom_drug:
+        return CustomDrugAPIRead.model_validate(vals)
+    return DrugAPIRead.model_validate(vals)
+
+
+async def _convert_provisioned_drugs() -> int:
+    import medlogserver.model
+    from medlogserver.db._session import get_async_session_context
+    from medlogserver.db.drug_data.drug import DrugCRUD
+    from medlogserver.model.drug_data.api_drug_model_factory import (
+        drug_to_drugAPI_obj,
+    )
+
+    async with get_async_session_context() as session:
+        async with DrugCRUD.crud_context(session) as drug_crud:
+            drugs = await drug_crud.list()
+            for drug in drugs:
+                assert await drug_to_drugAPI_obj(
+                    drug
+                ) == drug_to_drugAPI_obj_reference(drug), drug.trade_name
+    return len(drugs)
+
+
+def test_drug_to_drugAPI_obj():
+    """Test that the specialized drug api converter creates the same objects as the reference conversion, for all provisioned drugs"""
+    drug_count = asyncio.run(_convert_provisioned_drugs())
+    assert drug_count > 0
@@ -0,0 +1,130 @@
+from typing import Set, Tuple
+from pathlib import Path
+import asyncio
+
+import pytest
+
+
+async def _drug_table_indexes(session) -> Set[Tuple[str, str]]:
+    from sqlalchemy import text, bindparam
+    from medlogserver.db.drug_data.importers.mmi_pharmindex import DRUG_DATA_TABLES
+
+    result = await session.execute(
+        text(
+            "SELECT name, sql FROM sqlite_master "
+            "WHERE type = 'index' AND tbl_name IN :table_names AND sql IS NOT NULL"
+        ).bindparams(
+            bindparam(
+                "table_names",
+                [table_type.__tablename__ for table_type in DRUG_DATA_TABLES],
+                expanding=True,
+            )
+        )
+    )
+    return set(result.all())
+
+
+async def _stored_restore_statements(session, dataset_version_id):
+    from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
+
+    dataset_version = await session.get(
+        DrugDataSetVersion, dataset_version_id, populate_existing=True
+    )
+    return dataset_version.deferred_index_restore_statements
+
+
+async def _import_with_deferred_indexes(source_dir: Path, fail_import: bool):
+    """Runs a drug import with `DRUG_IMPORTER_DEFER_INDEXES` on a dataset version that is deleted afterwards.
+    The import fails with the first drug batch, with `fail_import=False` it is killed before it restores the indexes.
+    Returns the indexes of the drug tables before, during and after the import, and the restore statements stored during the import.
+    """
+    import medlogserver.model
+    from medlogserver.db._session import get_async_session_context
+    from medlogserver.db.drug_data.importers import mmi_pharmindex
+    from medlogserver.db.drug_data.importers.mmi_pharmindex import MMIPharmindex1_32
+    from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
+
+    importer = MMIPharmindex1_32()
+    importer.source_dir = source_dir
+    dataset_version = DrugDataSetVersion(
+        dataset_version="deferredindextest",
+        dataset_source_name=importer.dataset_name,
+        dataset_link=None,
+        current_active=False,
+        import_status="failed",
+        import_start_datetime_utc=None,
+    )
+    async with get_async_session_context() as session:
+        session.add(dataset_version)
+        await session.commit()
+        await session.refresh(dataset_version)
+        indexes_before = await _drug_table_indexes(session)
+    importer._ensured_dataset_version = dataset_version
+    during_import = {}
+
+    async def _no_lov_items(*args, **kwargs):
+        return []
+
+    async def _interrupted_drug_data(*args, **kwargs):
+        during_import["indexes"] = await _drug_table_indexes(importer._db_session)
+        async with get_async_session_context() as session:
+            during_import["restore_statements"] = await _stored_restore_statements(
+                session, dataset_version.id
+            )
+        raise RuntimeError("Forced drug import failure")
+        yield
+
+    importer._generate_lov_items = _no_lov_items
+    importer._transform_drug_data = _interrupted_drug_data
+    importer._parse_drug_data = _interrupted_drug_data
+    original_restore = mmi_pharmindex._restore_drug_table_indexes
+    if not fail_import:
+        # the dataset version is left with the stored statements, as if the worker was killed before the restore
+        async def _killed_before_restore(*args, **kwargs):
+            pass
+
+        mmi_pharmindex._restore_drug_table_indexes = _killed_before_restore
+    try:
+        with pytest.raises(RuntimeError):
+            await importer.run_import()
+        mmi_pharmindex._restore_drug_table_indexes = original_restore
+        if not fail_import:
+            await mmi_pharmindex.restore_deferred_drug_table_indexes()
+        async with get_async_session_context() as session:
+            indexes_after = await _drug_table_indexes(session)
+            restore_statements_after = await _stored_restore_statements(
+                session, dataset_version.id
+            )
+    finally:
+        mmi_pharmindex._restore_drug_table_indexes = original_restore
+        async with get_async_session_context() as session:
+            await session.delete(
+                await session.get(DrugDataSetVersion, dataset_version.id)
+            )
+            await session.commit()
+    return indexes_before, during_import, indexes_after, restore_statements_after
+
+
+@pytest.mark.parametrize("fail_import", [True, False], ids=["failed", "killed"])
+def test_drug_import_deferred_indexes_restored(
+    tmp_path: Path, monkeypatch, fail_import: bool
+):
+    """Test that the indexes of the drug tables a drug import with `DRUG_IMPORTER_DEFER_INDEXES` drops are back
+    after the import failed, or after the pending restore of an import that was killed before it restored them"""
+    import medlogserver.model
+    from medlogserver.db.drug_data.importers import mmi_pharmindex
+
+    if not mmi_pharmindex.config.SQL_DATABASE_URL.startswith("sqlite"):
+        pytest.skip("reads the indexes from sqlite_master")
+    monkeypatch.setattr(mmi_pharmindex.config, "DRUG_IMPORTER_DEFER_INDEXES", True)
+    indexes_before, during_import, indexes_after, restore_statements_after = (
+        asyncio.run(_import_with_deferred_indexes(tmp_path, fail_import))
+    )
+
+    assert indexes_before
+    assert during_import["indexes"] == set()
+    assert set(during_import["restore_statements"]) == {
+        index_def for _, index_def in indexes_before
+    }
+    assert indexes_after == indexes_before
+    assert restore_statements_after is None
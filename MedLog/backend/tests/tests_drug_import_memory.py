@@ -0,0 +1,207 @@
+from typing import Dict, List
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+# The import is measured in a fresh process, which runs this file as a script.
+MEMORY_BUDGET_MB = 128
+PACKAGE_COUNT = 300000
+PRODUCT_COUNT = 2000
+
+
+def _write_csv(path: Path, header: List[str], rows: List[List]):
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file, delimiter=";")
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def _write_mmi_source_files(source_dir: Path):
+    """Minimal synthetic MMI Pharmindex source files. Many packages per product, so the packages dominate the size."""
+    rng = random.Random(PACKAGE_COUNT)
+    products = range(1, PRODUCT_COUNT + 1)
+    _write_csv(
+        source_dir / "PRODUCT.CSV",
+        ["ID", "DISPENSINGTYPECODE", "PRODUCTFOODTYPECODE", "PRODUCTDIETETICSTYPECODE"],
+        [[product_id, rng.randint(0, 3), "", ""] for product_id in products],
+    )
+    _write_csv(
+        source_dir / "ARCHIVE_PRODUCT.CSV",
+        ["ID", "DISPENSINGTYPECODE", "COMPANYID"],
+        [
+            [product_id, rng.randint(0, 3), rng.randint(1, 50)]
+            for product_id in products
+        ],
+    )
+    _write_csv(
+        source_dir / "PRODUCT_FLAG.CSV",
+        [
+            "PRODUCTID",
+            "CONTRACEPTIVE_FLAG",
+            "COSMETICS_FLAG",
+            "DIETARYSUPPLEMENT_FLAG",
+            "HERBAL_FLAG",
+            "GENERIC_FLAG",
+            "HOMOEOPATHIC_FLAG",
+        ],
+        [
+            [product_id] + [rng.choice(["0", "1"]) for _ in range(6)]
+            for product_id in products
+        ],
+    )
+    _write_csv(
+        source_dir / "PRODUCT_COMPANY.CSV",
+        ["PRODUCTID", "COMPANYID", "PRODUCTCOMPANYTYPECODE"],
+        [[product_id, rng.randint(1, 50), "M"] for product_id in products],
+    )
+    _write_csv(
+        source_dir / "ITEM.CSV",
+        ["ID", "PRODUCTID", "ITEMROACODE"],
+        [
+            [product_id, product_id, rng.choice(["19", "104"])]
+            for product_id in products
+        ],
+    )
+    _write_csv(
+        source_dir / "ITEM_ATC.CSV",
+        ["ITEMID", "ATCCODE"],
+        [[product_id, f"A{rng.randint(1, 16):02d}AA01"] for product_id in products],
+    )
+    _write_csv(
+        source_dir / "PRODUCT_KEYWORD.CSV",
+        ["PRODUCTID", "CODE"],
+        [[product_id, rng.randint(1, 99)] for product_id in products],
+    )
+    _write_csv(
+        source_dir / "PRODUCT_ICD.CSV",
+        ["PRODUCTID", "ICDCODE"],
+        [[product_id, f"E{rng.randint(10, 14)}.9"] for product_id in products],
+    )
+    package_header = [
+        "ID",
+        "PRODUCTID",
+        "NAME",
+        "ONMARKETDATE",
+        "PZN",
+        "AMOUNTTEXT",
+        "IFAPHARMFORMCODE",
+        "SALESSTATUSCODE",
+        "PACKAGENORMSIZECODE",
+    ]
+
+    def package_row(package_id: int) -> List:
+        return [
+            package_id,
+            rng.randint(1, PRODUCT_COUNT),
+            f"Testdrug {package_id} {rng.choice([5, 10, 20])} mg",
+            "01.02.2020",
+            f"{package_id:08d}",
+            "20 St",
+            "TAB",
+            "A",
+            "N1",
+        ]
+
+    archive_start = PACKAGE_COUNT * 4 // 5
+    _write_csv(
+        source_dir / "PACKAGE.CSV",
+        package_header,
+        [package_row(package_id) for package_id in range(archive_start)],
+    )
+    _write_csv(
+        source_dir / "ARCHIVE_PACKAGE.CSV",
+        package_header + ["OFFMARKETDATE"],
+        [
+            package_row(package_id) + ["01.01.2024"]
+            for package_id in range(archive_start, PACKAGE_COUNT)
+        ],
+    )
+
+
+def _private_memory_mb() -> int:
+    # RssAnon: the CSV files polars maps are page cache and not counted
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("RssAnon:"):
+            return int(line.split()[1]) // 1024
+    raise ValueError("No RssAnon in /proc/self/status")
+
+
+def _measure_import(source_dir: str) -> Dict:
+    """Runs in a fresh process: transform all packages like `run_import` does, without writing them to the database."""
+    import asyncio
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    import medlogserver.model
+    from medlogserver.db.drug_data.importers.mmi_pharmindex import MMIPharmindex1_32
+    from medlogserver.model.drug_data.drug import DrugData
+    from medlogserver.model.drug_data.drug_dataset_version import (
+        DrugDataSetVersion,
+    )
+
+    importer = MMIPharmindex1_32()
+    importer.source_dir = source_dir
+    drug_dataset_version = DrugDataSetVersion(
+        dataset_version="memorytest", dataset_source_name=importer.dataset_name
+    )
+    peak_memory_mb = memory_before_mb = _private_memory_mb()
+    done = threading.Event()
+
+    def sample_memory():
+        nonlocal peak_memory_mb
+        while not done.is_set():
+            peak_memory_mb = max(peak_memory_mb, _private_memory_mb())
+            time.sleep(0.005)
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+
+    async def transform() -> int:
+        drug_count = 0
+        async for table_frames in importer._transform_drug_data(drug_dataset_version):
+            drug_count += sum(len(frame) for frame in table_frames[DrugData])
+            for frames in table_frames.values():
+                for frame in frames:
+                    # the rows as `add_and_flush` hands them to the database
+                    frame.to_dicts()
+        return drug_count
+
+    drug_count = asyncio.run(transform())
+    done.set()
+    sampler.join()
+    return {
+        "drug_count": drug_count,
+        "batch_size": importer.batch_size,
+        "peak_memory_mb": peak_memory_mb - memory_before_mb,
+    }
+
+
+def test_drug_import_memory_budget(tmp_path: Path):
+    """Test that the MMI Pharmindex import streams the source files within DRUG_IMPORTER_MEMORY_BUDGET_MB"""
+    _write_mmi_source_files(tmp_path)
+    env = os.environ | {
+        "DRUG_IMPORTER_MEMORY_BUDGET_MB": str(MEMORY_BUDGET_MB),
+        "DRUG_IMPORTER_VECTORIZED_TRANSFORM": "true",
+    }
+    env.pop("DRUG_DATA_IMPORT_MAX_ROWS", None)
+    output = subprocess.run(
+        [sys.executable, __file__, str(tmp_path)],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    result = json.loads(output.splitlines()[-1])
+    assert result["drug_count"] == PACKAGE_COUNT, result
+    # the budget must have forced more than one batch, otherwise nothing was streamed
+    assert result["batch_size"] < PACKAGE_COUNT, result
+    assert result["peak_memory_mb"] <= MEMORY_BUDGET_MB, result
+
+
+if __name__ == "__main__":
+    print(json.dumps(_measure_import(sys.argv[1])))
@@ -0,0 +1,60 @@
+from pathlib import Path
+import asyncio
+import os
+import random
+
+import pytest
+
+PACKAGE_COUNT = 3000
+BATCH_SIZE = 1000
+
+
+async def _table_contents_per_copy_format(source_dir: Path) -> dict:
+    import psycopg
+    from drug_import_utils import (
+        PG_COPY_FORMATS,
+        write_source_files,
+        create_pg_temp_tables,
+        pg_table_checksums,
+        pg_copy_frames,
+    )
+    from medlogserver.db.drug_data.importers.mmi_pharmindex import MMIPharmindex1_32
+    from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
+
+    write_source_files(source_dir, PACKAGE_COUNT, random.Random(PACKAGE_COUNT))
+    importer = MMIPharmindex1_32()
+    importer.source_dir = source_dir
+    importer.batch_size = BATCH_SIZE
+    dataset_version = DrugDataSetVersion(
+        dataset_version="copytest", dataset_source_name=importer.dataset_name
+    )
+    batches = [
+        table_frames
+        async for table_frames in importer._transform_drug_data(dataset_version)
+    ]
+    table_types = list(batches[0].keys())
+    database_url = os.environ["SQL_DATABASE_URL"].replace(
+        "postgresql+psycopg://", "postgresql://"
+    )
+    contents = {}
+    # temporary tables without foreign keys, nothing is left in the test database
+    async with await psycopg.AsyncConnection.connect(database_url) as conn:
+        await create_pg_temp_tables(conn, table_types)
+        for copy_format in PG_COPY_FORMATS:
+            for table_type in table_types:
+                await conn.execute(f"TRUNCATE {table_type.__tablename__}")
+            await conn.commit()
+            await pg_copy_frames(importer, conn, batches, copy_format)
+            contents[copy_format] = await pg_table_checksums(conn, table_types)
+    return contents
+
+
+@pytest.mark.postgres
+def test_drug_import_pg_copy_formats(tmp_path: Path):
+    """Test that the binary and the text COPY of the drug import write the same table contents"""
+    contents = asyncio.run(_table_contents_per_copy_format(tmp_path))
+    from medlogserver.model.drug_data.drug import DrugData
+
+    # the checksum of an empty table is None
+    assert contents["text"][DrugData.__tablename__] is not None
+    assert contents["binary"] == contents["text"]
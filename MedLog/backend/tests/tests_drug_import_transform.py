@@ -0,0 +1,46 @@
+from pathlib import Path
+import asyncio
+import random
+
+PACKAGE_COUNT = 3000
+BATCH_SIZE = 1000
+
+
+def test_drug_import_vectorized_transform(tmp_path: Path):
+    """Test that the vectorized transformation of the MMI Pharmindex importer creates the same rows as the row by row transformation"""
+    import polars as pl
+    from drug_import_utils import (
+        write_source_files,
+        transform_row_by_row,
+        transform_vectorized,
+        frame_rows,
+        canonical_rows,
+    )
+    from medlogserver.db.drug_data.importers.mmi_pharmindex import MMIPharmindex1_32
+    from medlogserver.model.drug_data.drug import DrugData
+    from medlogserver.model.drug_data.drug_dataset_version import DrugDataSetVersion
+
+    write_source_files(tmp_path, PACKAGE_COUNT, random.Random(PACKAGE_COUNT))
+    importer = MMIPharmindex1_32()
+    importer.source_dir = tmp_path
+    importer.batch_size = BATCH_SIZE
+    joined_df = pl.concat(
+        list(importer._iter_drug_package_batches()), how="diagonal_relaxed"
+    )
+    # The list columns are aggregated with `unique()`, which does not keep an order. Transform the same joined rows twice.
+    importer._iter_drug_package_batches = lambda: joined_df.iter_slices(BATCH_SIZE)
+    importer._count_drug_packages = lambda: len(joined_df)
+    dataset_version = DrugDataSetVersion(
+        dataset_version="transformtest", dataset_source_name=importer.dataset_name
+    )
+
+    expected_table_rows = asyncio.run(transform_row_by_row(importer, dataset_version))
+    table_rows = frame_rows(asyncio.run(transform_vectorized(importer, dataset_version)))
+
+    assert len(table_rows[DrugData]) == len(joined_df)
+    assert set(table_rows) == set(expected_table_rows)
+    # the generated drug ids are replaced by the position of the drug
+    expected_rows = canonical_rows(expected_table_rows)
+    rows = canonical_rows(table_rows)
+    for table_name, table_expected_rows in expected_rows.items():
+        assert rows[table_name] == table_expected_rows, table_name
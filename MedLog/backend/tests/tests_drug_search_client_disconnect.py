@@ -0,0 +1,199 @@
+from typing import Dict, List
+import asyncio
+import time
+import uuid
+
+import pytest
+
+# counts long enough (about half a minute on SQLite) that only an interrupted statement ends in time
+SLOW_SQLITE_STATEMENT = (
+    "WITH RECURSIVE counter(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM counter LIMIT 100000000) "
+    "SELECT count(*) FROM counter"
+)
+
+
+def _request(messages: List[Dict], disconnect_after_sec: float | None):
+    """A starlette request whose client sends `messages` and disconnects `disconnect_after_sec` later (never, if None)."""
+    from fastapi import Request
+
+    async def receive() -> Dict:
+        if messages:
+            return messages.pop(0)
+        if disconnect_after_sec is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(disconnect_after_sec)
+        return {"type": "http.disconnect"}
+
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/drug/search",
+            "query_string": b"",
+            "headers": [],
+        },
+        receive,
+    )
+
+
+async def _run_until_client_disconnects(disconnect_after_sec: float | None):
+    """Run a search that takes 60 sec or returns right away (`disconnect_after_sec=None`).
+    Returns the result or the exception, whether the search was cancelled and the runtime."""
+    from medlogserver.api.client_disconnect import run_until_client_disconnects
+
+    search = {"cancelled": False}
+
+    async def _search():
+        if disconnect_after_sec is None:
+            return "result"
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            search["cancelled"] = True
+            raise
+
+    request = _request(
+        [{"type": "http.request", "body": b"", "more_body": False}],
+        disconnect_after_sec,
+    )
+    start = time.monotonic()
+    try:
+        result = await run_until_client_disconnects(request, _search())
+    except Exception as e:
+        result = e
+    return result, search["cancelled"], time.monotonic() - start
+
+
+def test_run_until_client_disconnects_cancels_on_disconnect():
+    from medlogserver.api.client_disconnect import ClientDisconnectedException
+
+    result, cancelled, runtime = asyncio.run(
+        _run_until_client_disconnects(disconnect_after_sec=0.1)
+    )
+    assert isinstance(result, ClientDisconnectedException), result
+    assert cancelled
+    assert runtime < 5, runtime
+
+
+def test_run_until_client_disconnects_returns_result():
+    result, cancelled, runtime = asyncio.run(
+        _run_until_client_disconnects(disconnect_after_sec=None)
+    )
+    assert result == "result"
+    assert not cancelled
+
+
+async def _search_until_client_disconnects(search_term: str) -> Dict:
+    """Request a drug search that runs `SLOW_SQLITE_STATEMENT` from a client that disconnects after 0.5 sec.
+    Returns the response status, the search cache stats before and after and whether the database connection is usable afterwards.
+    """
+    import medlogserver.model
+    from fastapi import FastAPI, Depends
+    from sqlalchemy import text
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from medlogserver.api.auth.security import get_current_user
+    from medlogserver.api.routes.routes_drug import fast_api_drug_router
+    from medlogserver.db._session import (
+        get_async_session,
+        get_async_session_context,
+    )
+    from medlogserver.db.drug_data.drug_search.search_interface import (
+        DrugSearch,
+        get_drug_search,
+    )
+    from medlogserver.db.drug_data.drug_search.search_result_cache import (
+        drug_search_result_cache,
+    )
+
+    class SlowDrugSearch(DrugSearch):
+        async def _preflight(self):
+            # `_search` needs no search engine
+            pass
+
+        async def _search(self, **kwargs):
+            # own session, like the searches of `DrugSearch`
+            async with get_async_session_context() as session:
+                await session.execute(text(SLOW_SQLITE_STATEMENT))
+
+    async def get_slow_drug_search(
+        session: AsyncSession = Depends(get_async_session),
+    ):
+        yield SlowDrugSearch(session=session)
+
+    app = FastAPI()
+    app.include_router(fast_api_drug_router)
+    app.dependency_overrides[get_current_user] = lambda: None
+    app.dependency_overrides[get_drug_search] = get_slow_drug_search
+
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    sent = []
+
+    async def receive() -> Dict:
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(0.5)
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict):
+        sent.append(message)
+
+    stats_before = drug_search_result_cache.stats()
+    await app(
+        {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/drug/search",
+            "raw_path": b"/drug/search",
+            "root_path": "",
+            "query_string": f"search_term={search_term}".encode(),
+            "headers": [],
+            "client": ("127.0.0.1", 12345),
+            "server": ("127.0.0.1", 80),
+        },
+        receive,
+        send,
+    )
+    stats_after = drug_search_result_cache.stats()
+    async with get_async_session_context() as session:
+        connection_usable = (await session.execute(text("SELECT 1"))).scalar() == 1
+    status_code = next(
+        message["status"]
+        for message in sent
+        if message["type"] == "http.response.start"
+    )
+    return {
+        "status_code": status_code,
+        "stats_before": stats_before,
+        "stats_after": stats_after,
+        "connection_usable": connection_usable,
+    }
+
+
+def test_drug_search_aborted_when_client_disconnects():
+    """A client that closes the connection during a slow search gets a 499, the search and its SQLite statement are aborted"""
+    import medlogserver.model
+    from medlogserver.api.client_disconnect import HTTP_499_CLIENT_CLOSED_REQUEST
+    from medlogserver.db import _session
+
+    if not _session.config.SQL_DATABASE_URL.startswith("sqlite"):
+        pytest.skip("aborts a SQLite statement")
+    start = time.monotonic()
+    # a search term no other request used, so the search is not cached
+    result = asyncio.run(
+        _search_until_client_disconnects(f"disconnect{uuid.uuid4().hex[:12]}")
+    )
+    # also covers the aborted search, `asyncio.run` waits for all tasks to finish
+    runtime = time.monotonic() - start
+
+    assert result["status_code"] == HTTP_499_CLIENT_CLOSED_REQUEST
+    # without the interrupt, the search would wait for the statement to finish
+    assert runtime < 10, runtime
+    assert result["connection_usable"]
+    stats_before, stats_after = result["stats_before"], result["stats_after"]
+    assert stats_after.searches - stats_before.searches == 1
+    assert stats_after.abandoned - stats_before.abandoned == 1
+    assert stats_after.cancelled - stats_before.cancelled == 1
+    assert stats_after.in_flight == 0
@@ -3,6 +3,7 @@ import json
 import time
 import datetime
 
+import pytest
 
 from utils import (
     req,
@@ -12,6 +13,9 @@ from utils import (
     TestDataContainerStudy,
 )
 
+# every test runs against each drug search engine
+pytestmark = pytest.mark.usefixtures("drug_search_engine")
+
 
 def test_endpoint_drug_search_ranking():
     """Test GET /api/drug/search"""
@@ -41,3 +45,13 @@ def test_endpoint_drug_search_ranking():
         first_search_result["relevance_score"],
     )
     assert first_search_result["relevance_score"] > 1
+
+
+def test_endpoint_drug_search_typo_tolerance():
+    """Test GET /api/drug/search with a misspelled trade name"""
+    search_term = "Atehrmax"
+    response: Dict[str, Any] = req(
+        "api/drug/search", method="get", q={"search_term": search_term}
+    )
+    assert response["total_count"] > 0
+    assert response["items"][0]["drug"]["trade_name"] == "Athermax"
@@ -17,6 +17,8 @@ import datetime
 from dataclasses import dataclass
 
 MEDLOG_ACCESS_TOKEN_ENV_NAME = "MEDLOG_ACCESS_TOKEN"
+# Set while a test runs against another MedLog server than the main test server (e.g. one with another drug search engine)
+MEDLOG_BASE_URL_ENV_NAME = "MEDLOG_TESTS_BASE_URL"
 
 
 def get_access_token() -> str | None:
@@ -28,6 +30,9 @@ medlogserver_config = Config()
 
 
 def get_medlogserver_base_url():
+    base_url = os.environ.get(MEDLOG_BASE_URL_ENV_NAME, None)
+    if base_url:
+        return base_url
     return f"http://{medlogserver_config.SERVER_LISTENING_HOST}:{medlogserver_config.SERVER_LISTENING_PORT}"
 
 